@@ -0,0 +1,209 @@
+# Uso: python -m src.analytics.hotspots_gi
+# Significancia estadística de los hotspots: Getis-Ord Gi* y Moran local (LISA) sobre
+# cada nivel de la pirámide de agregacion_hex. Los vecinos salen de los índices enteros
+# (i, j) de las celdas — desplazamientos ±1 y búsqueda binaria del id lineal — y se
+# guardan en una matriz dispersa (scipy.sparse), sin consultas de adyacencia entre
+# polígonos. Los p-valores por permutación condicional se simulan en bloque para
+# todas las celdas, en bloques de BLOQUE permutaciones con semilla propia repartidos
+# entre procesos: el resultado depende de GI_SEED, no de GI_JOBS ni de la máquina.
+#
+# Área de estudio: celdas con eventos + su vecindario (las celdas vacías junto a un
+# hotspot cuentan como ceros; las zonas sin ningún evento cercano quedan fuera).
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from scipy.stats import norm
+
+from src.transform.agregacion_hex import cell_id
+
+ANAL = "data/analytics"
+IN_PIRAMIDE = f"{ANAL}/hotspots_piramide.parquet"
+OUT_GI = f"{ANAL}/hotspots_gi.parquet"
+
+INPUTS = [IN_PIRAMIDE]
+OUTPUTS = [OUT_GI]
+# GI_JOBS no cambia la salida (semillas por bloque), así que no invalida la etapa
+ENV_VARS = ["GI_VAR", "GI_ANILLOS", "GI_PERMUTACIONES", "GI_SEED"]
+
+VAR = os.getenv("GI_VAR", "score")  # comparendos | siniestros | score
+ANILLOS = int(os.getenv("GI_ANILLOS", "1"))  # vecindario: (2k+1)² - 1 celdas (reina)
+PERMUTACIONES = int(os.getenv("GI_PERMUTACIONES", "999"))
+JOBS = int(os.getenv("GI_JOBS", "0")) or os.cpu_count() or 1
+SEED = int(os.getenv("GI_SEED", "12345"))
+BLOQUE = 64  # permutaciones por tarea (cada bloque con su semilla)
+ALPHA = 0.05
+
+# etiquetas de clase por nivel de confianza (signo de Gi* + p por permutación)
+CONFIANZA = [(0.01, "99%"), (0.05, "95%"), (0.10, "90%")]
+
+
+def _offsets(anillos=ANILLOS):
+    d = np.arange(-anillos, anillos + 1)
+    di, dj = (a.ravel() for a in np.meshgrid(d, d))
+    keep = (di != 0) | (dj != 0)
+    return di[keep], dj[keep]
+
+
+def area_estudio(i, j, anillos=ANILLOS):
+    """Celdas con eventos + vecinas (únicas, ordenadas por cell_id)."""
+    di, dj = _offsets(anillos)
+    ai = np.concatenate([i] + [i + a for a in di])
+    aj = np.concatenate([j] + [j + b for b in dj])
+    ids, first = np.unique(cell_id(ai, aj), return_index=True)
+    return ids, ai[first], aj[first]
+
+
+def pesos(i, j, anillos=ANILLOS) -> sparse.csr_matrix:
+    """Matriz binaria de vecindad (sin la diagonal) a partir de índices enteros.
+
+    Las celdas deben venir ordenadas por cell_id; cada desplazamiento se resuelve
+    con np.searchsorted sobre los ids, sin geometría.
+    """
+    ids = cell_id(i, j)
+    n = len(ids)
+    rows, cols = [], []
+    for a, b in zip(*_offsets(anillos)):
+        nb = cell_id(i + a, j + b)
+        pos = np.minimum(np.searchsorted(ids, nb), n - 1)
+        ok = ids[pos] == nb
+        rows.append(np.nonzero(ok)[0])
+        cols.append(pos[ok])
+    rows, cols = np.concatenate(rows), np.concatenate(cols)
+    return sparse.csr_matrix((np.ones(len(rows)), (rows, cols)), shape=(n, n))
+
+
+def _simular(args):
+    """Conteos de sumas vecinas simuladas (>= obs, <= obs) para un bloque de permutaciones.
+
+    Permutación condicional: x_i queda fijo y sus k_i vecinos se sortean entre las
+    demás celdas (con reposición entre vecinos: despreciable con n ≫ k).
+    """
+    x, k, obs, perms, seed = args
+    rng = np.random.default_rng(seed)
+    n, kmax = len(x), int(k.max())
+    # conteos enteros: float32 es exacto y la gather cuesta la mitad
+    xp, obs = np.append(x, 0).astype(np.float32), obs.astype(np.float32)
+    vacio = np.arange(kmax) >= k[:, None]  # huecos de celdas con < kmax vecinos
+    me = np.arange(n, dtype=np.int32)[:, None]
+    ge, le = np.zeros(n, np.int64), np.zeros(n, np.int64)
+    for _ in range(perms):
+        r = rng.integers(0, n - 1, size=(n, kmax), dtype=np.int32)
+        r += r >= me  # nunca la propia celda
+        np.putmask(r, vacio, n)  # → xp[n] = 0
+        sim = xp[r].sum(axis=1)
+        ge += sim >= obs
+        le += sim <= obs
+    return np.stack([ge, le])
+
+
+def p_permutacion(x, w, permutaciones=PERMUTACIONES, jobs=JOBS, seed=SEED):
+    """p-valor (pseudo, de la cola más cercana) de la suma de vecinos de cada celda.
+
+    Gi* y Moran local con pesos binarios son funciones monótonas de esa suma con x_i
+    fijo, así que una misma simulación da el p-valor de ambos.
+    """
+    k = np.asarray(w.sum(axis=1)).ravel().astype(np.int64)
+    obs = w @ x
+    # bloques de tamaño fijo, cada uno con su semilla: los sorteos no dependen de jobs
+    chunks = [min(BLOQUE, permutaciones - b) for b in range(0, permutaciones, BLOQUE)]
+    seeds = np.random.SeedSequence(seed).spawn(len(chunks))
+    args = [(x, k, obs, c, s) for c, s in zip(chunks, seeds)]
+    jobs = max(1, min(jobs, len(args)))
+    if jobs == 1:
+        ge, le = sum(map(_simular, args))
+    else:
+        with ProcessPoolExecutor(jobs) as ex:
+            ge, le = sum(ex.map(_simular, args))
+    # conteos enteros: los empates cuentan en ambas colas (una suma 0 rodeada de
+    # ceros no es un "frío" significativo)
+    p = (np.minimum(ge, le) + 1) / (permutaciones + 1)
+    return np.where(k > 0, p, 1.0)
+
+
+def gi_star(x, w):
+    """z de Getis-Ord Gi* con pesos binarios incluyendo la propia celda."""
+    n = len(x)
+    wi = np.asarray(w.sum(axis=1)).ravel() + 1  # W_i = S1_i (binarios)
+    local = w @ x + x
+    xbar, s = x.mean(), x.std()
+    den = s * np.sqrt(np.clip(n * wi - wi**2, 0, None) / (n - 1))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(den > 0, (local - xbar * wi) / den, 0.0)
+
+
+def moran_local(x, w):
+    """I_i de Moran local con pesos estandarizados por fila."""
+    z = x - x.mean()
+    m2 = (z**2).mean()
+    k = np.asarray(w.sum(axis=1)).ravel()
+    with np.errstate(divide="ignore", invalid="ignore"):
+        lag = np.where(k > 0, (w @ z) / k, 0.0)
+    return (z * lag / m2 if m2 > 0 else np.zeros_like(z)), z, lag
+
+
+def clases(gi_z, p):
+    out = np.full(len(p), "no significativo", dtype=object)
+    for alpha, lab in reversed(CONFIANZA):  # la confianza más alta sobrescribe
+        sig = p <= alpha
+        out[sig & (gi_z > 0)] = f"caliente {lab}"
+        out[sig & (gi_z < 0)] = f"frío {lab}"
+    return out
+
+
+def cuadrantes(z, lag, p, alpha=ALPHA):
+    q = np.select(
+        [(z > 0) & (lag > 0), (z < 0) & (lag < 0), (z > 0) & (lag <= 0)],
+        ["HH", "LL", "HL"],
+        "LH",
+    )
+    return np.where(p <= alpha, q, "ns")
+
+
+def nivel(cells: pd.DataFrame, var=VAR, **kw) -> pd.DataFrame:
+    """Gi*, Moran local y p por permutación para las celdas de un nivel."""
+    ids, i, j = area_estudio(cells["i"].to_numpy(), cells["j"].to_numpy())
+    x = np.zeros(len(ids))
+    x[np.searchsorted(ids, cells["cell_id"].to_numpy())] = cells[var].to_numpy()
+    w = pesos(i, j)
+    p = p_permutacion(x, w, **kw)
+    gi_z = gi_star(x, w)
+    mi, z, lag = moran_local(x, w)
+    return pd.DataFrame(
+        {
+            "cell_id": ids,
+            "i": i.astype(np.int32),
+            "j": j.astype(np.int32),
+            var: x.astype(np.int32),
+            "gi_z": gi_z,
+            "gi_p": 2 * norm.sf(np.abs(gi_z)),
+            "moran_i": mi,
+            "p_sim": p,
+            "clase": clases(gi_z, p),
+            "lisa": cuadrantes(z, lag, p),
+        }
+    )
+
+
+def main():
+    pyr = pd.read_parquet(IN_PIRAMIDE)
+    parts = []
+    for level, cells in pyr.groupby("level", sort=True):
+        res = nivel(cells)
+        res.insert(0, "level", np.int16(level))
+        parts.append(res)
+        hot = res["clase"].str.startswith("caliente").sum()
+        print(
+            f"  {level:>5} m: {len(res)} celdas, {hot} calientes "
+            f"(p ≤ 0.10, {PERMUTACIONES} permutaciones, {JOBS} procesos)"
+        )
+    out = pd.concat(parts, ignore_index=True)
+    out.to_parquet(OUT_GI, index=False)
+    print(f"OK → {OUT_GI} ({len(out)} celdas, variable {VAR})")
+
+
+if __name__ == "__main__":
+    main()
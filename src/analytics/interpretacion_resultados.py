@@ -27,7 +27,7 @@ def main():
     kpi_g = pd.read_parquet(f"{ANAL}/kpi_global.parquet")
     kpi_l = pd.read_parquet(f"{ANAL}/kpi_localidad.parquet")
     panel = pd.read_parquet(f"{ANAL}/panel_localidad_2018.parquet")
-    grid = gpd.read_file(f"{ANAL}/grid_hotspots.geojson")
+    grid = gpd.read_parquet(f"{ANAL}/grid_hotspots.parquet")
     print("Archivos cargados correctamente.\n")
 
     # ---------- 1️⃣ P1 / P2 — Hotspots ----------
@@ -43,6 +43,23 @@ def main():
         "\n➡️  Estas zonas concentran la mayor densidad de infracciones y accidentes, identificadas en el mapa de hotspots.\n"
     )
 
+    # el ranking por score no es una prueba: Gi* dice qué celdas son hotspots
+    # significativos frente a una distribución aleatoria (src.analytics.hotspots_gi)
+    gi_path = f"{ANAL}/hotspots_gi.parquet"
+    if os.path.exists(gi_path):
+        gi = pd.read_parquet(gi_path)
+        niveles = gi["level"].unique()
+        level = niveles[np.abs(niveles - 500).argmin()]
+        gi = gi[gi["level"] == level]
+        print(f"Getis-Ord Gi* (celdas de {level} m, p por permutación):")
+        print(gi["clase"].value_counts().to_string())
+        top_gi = gi[gi["clase"].str.startswith("caliente")].nlargest(10, "gi_z")
+        print("🔥 Hotspots significativos con mayor Gi* (z):")
+        print(top_gi.drop(columns=["level", "i", "j"]).to_string(index=False))
+        print()
+    else:
+        print("ℹ️  Sin hotspots_gi.parquet: ejecuta src.analytics.hotspots_gi.\n")
+
     # ---------- 2️⃣ P3 — Coincidencia espacial ----------
     print("2️⃣ P3: Coincidencia espacial entre comparendos y siniestros\n")
     corr_spatial = grid["comparendos"].corr(grid["siniestros"])
@@ -56,10 +73,15 @@ def main():
 
     # ---------- 3️⃣ P4 — Proximidad a semáforos ----------
     print("3️⃣ P4: Distancia de siniestros a semáforos\n")
-    prox_path = f"{CLEAN}/siniestralidad_2018_dist_semaforos.parquet"
-    if os.path.exists(prox_path):
-        prox = pd.read_parquet(prox_path)
-        dist_counts = prox["dist_bucket"].value_counts(normalize=True).mul(100).round(2)
+    hist_path = f"{CLEAN}/proximidad_buckets_localidad.parquet"
+    if os.path.exists(hist_path):
+        hist = pd.read_parquet(hist_path)
+        sin_b = (
+            hist[hist["dataset"] == "siniestros"]
+            .groupby("dist_bucket", observed=False)["n"]
+            .sum()
+        )
+        dist_counts = sin_b.div(sin_b.sum()).mul(100).round(2)
         print("Distribución de siniestros por rango de distancia:")
         print(dist_counts.to_string())
         print(
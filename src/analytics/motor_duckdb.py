@@ -0,0 +1,115 @@
+# Motor SQL para los agregados de merge_mortalidad y resumen_kpi (KPI_ENGINE=duckdb).
+# DuckDB corre en el proceso (sin servidor) y lee los Parquet directamente: solo las
+# columnas que usa cada consulta, row group por row group y en KPI_THREADS hilos, sin
+# cargar las tablas de eventos en pandas. El resultado es idéntico al motor pandas.
+# duckdb es opcional: solo se importa al pedir este motor (pip install duckdb).
+
+import os
+
+import pandas as pd
+
+from src.analytics.resumen_kpi import _kpi_bucket
+
+THREADS = int(os.getenv("KPI_THREADS", "0")) or os.cpu_count() or 1
+MEMORIA = os.getenv("KPI_MEMORY_LIMIT", "")  # p. ej. "2GB"; vacío = límite de DuckDB
+LOC_COL = "LOCALIDAD_JOIN"
+SIN_COORD = "SIN_COORD"
+
+
+def conectar():
+    try:
+        import duckdb
+    except ImportError:
+        raise SystemExit(
+            "KPI_ENGINE=duckdb requiere el paquete duckdb (pip install duckdb)"
+        )
+    con = duckdb.connect()
+    con.execute(f"SET threads = {THREADS}")
+    if MEMORIA:
+        con.execute(f"SET memory_limit = '{MEMORIA}'")
+    return con
+
+
+def _df(con, sql: str, params=None) -> pd.DataFrame:
+    # vía Arrow: mismos tipos (y nulos) que pd.read_parquet
+    return con.execute(sql, params or []).arrow().read_all().to_pandas()
+
+
+def conteos(con, path) -> pd.DataFrame:
+    """Eventos por LOCALIDAD_JOIN (incluye la localidad nula) de un Parquet."""
+    return _df(
+        con,
+        f"SELECT {LOC_COL}, count(*) AS n FROM read_parquet(?) GROUP BY 1 ORDER BY 1",
+        [str(path)],
+    )
+
+
+def _labels(hist_path) -> list:
+    # buckets en el orden del categórico escrito por calc_proximidad_semaforos
+    b = pd.read_parquet(hist_path, columns=["dist_bucket"])["dist_bucket"]
+    return [str(c) for c in b.cat.categories if c != SIN_COORD]
+
+
+def _pct(labels) -> str:
+    # participación por bucket; el total incluye SIN_COORD, igual que prox_pct
+    return ", ".join(
+        f"coalesce(sum(n) FILTER (WHERE b = '{lbl}') / nullif(sum(n), 0), 0.0)"
+        f" AS {_kpi_bucket(lbl)}"
+        for lbl in labels
+    )
+
+
+def kpis(con, comp, sin, hist, panel):
+    """(kpi_global, kpi_localidad) en SQL sobre los Parquet de entrada."""
+    labels = _labels(hist)
+    params = {
+        "comp": str(comp),
+        "sin": str(sin),
+        "hist": str(hist),
+        "panel": str(panel),
+    }
+    h = f"""
+        h AS (
+            SELECT LOCALIDAD, CAST(dist_bucket AS VARCHAR) AS b, CAST(n AS DOUBLE) AS n
+            FROM read_parquet($hist) WHERE dataset = 'siniestros'
+        )"""
+    kpi_g = _df(
+        con,
+        f"""
+        WITH {h}
+        SELECT
+            (SELECT count(*) FROM read_parquet($comp)) AS comparendos_total,
+            (SELECT count(*) FROM read_parquet($sin)) AS siniestros_total,
+            {_pct(labels)}
+        FROM h
+        """,
+        {k: params[k] for k in ("comp", "sin", "hist")},
+    )
+    # panel (conteos y mortalidad ya unidos por localidad normalizada) + localidades
+    # que solo aparecen en los eventos (con 0) + proximidad por localidad
+    kpi_loc = _df(
+        con,
+        f"""
+        WITH {h},
+        p AS (SELECT * FROM read_parquet($panel)),
+        k AS (
+            SELECT {LOC_COL} AS LOCALIDAD FROM p
+            UNION SELECT {LOC_COL} FROM read_parquet($comp) WHERE {LOC_COL} IS NOT NULL
+            UNION SELECT {LOC_COL} FROM read_parquet($sin) WHERE {LOC_COL} IS NOT NULL
+        ),
+        pct AS (SELECT LOCALIDAD, {_pct(labels)} FROM h GROUP BY 1)
+        SELECT
+            k.LOCALIDAD,
+            CAST(coalesce(p.comparendos_2018, 0) AS BIGINT) AS comparendos_2018,
+            CAST(coalesce(p.siniestros_2018, 0) AS BIGINT) AS siniestros_2018,
+            p.casos, p.poblacion, p.tasa_x_100k, p.tasa_x_100k_calc,
+            {", ".join(_kpi_bucket(lbl) for lbl in labels)}
+        FROM k
+        LEFT JOIN p ON p.{LOC_COL} = k.LOCALIDAD
+        LEFT JOIN pct ON pct.LOCALIDAD = k.LOCALIDAD
+        ORDER BY k.LOCALIDAD
+        """,
+        params,
+    )
+    kpi_loc = kpi_loc.astype({"comparendos_2018": "Int64", "siniestros_2018": "Int64"})
+    return kpi_g, kpi_loc
@@ -1,5 +1,7 @@
 # Uso: python -m src.analytics.resumen_kpi
 # Lee outputs de transform y genera KPIs globales y por localidad.
+# KPI_ENGINE=duckdb calcula lo mismo en SQL sobre los Parquet (src.analytics.motor_duckdb):
+# conteos en streaming y en varios hilos, sin cargar las tablas de eventos en pandas.
 
 import os
 import pandas as pd
@@ -7,6 +9,20 @@ import pandas as pd
 CLEAN, ANAL = "data/clean", "data/analytics"
 os.makedirs(ANAL, exist_ok=True)
 
+IN_COMP = f"{CLEAN}/comparendos_2018_loc.parquet"
+IN_SIN = f"{CLEAN}/siniestralidad_2018_loc.parquet"
+# histograma de buckets de distancia por localidad (no la tabla de eventos completa)
+IN_HIST = f"{CLEAN}/proximidad_buckets_localidad.parquet"
+IN_PANEL = f"{ANAL}/panel_localidad_2018.parquet"  # contiene mortalidad 2018
+OUT_GLOBAL = f"{ANAL}/kpi_global.parquet"
+OUT_LOC = f"{ANAL}/kpi_localidad.parquet"
+
+INPUTS = [IN_COMP, IN_SIN, IN_HIST, IN_PANEL]
+OUTPUTS = [OUT_GLOBAL, OUT_LOC]
+ENV_VARS = ["KPI_ENGINE"]
+
+MOTOR = os.getenv("KPI_ENGINE", "pandas").strip().lower()  # pandas | duckdb
+
 
 def _pick_loc_col(df):
     cands = [c for c in df.columns if "LOCALIDAD" in c.upper()]
@@ -27,24 +43,35 @@ def _pick_loc_col(df):
     return cands[0]
 
 
-def main():
-    comp = pd.read_parquet(f"{CLEAN}/comparendos_2018_loc.parquet")
-    sin = pd.read_parquet(f"{CLEAN}/siniestralidad_2018_loc.parquet")
-    prox = pd.read_parquet(f"{CLEAN}/siniestralidad_2018_dist_semaforos.parquet")
-    panel = pd.read_parquet(
-        f"{ANAL}/panel_localidad_2018.parquet"
-    )  # contiene mortalidad 2018
+def _kpi_bucket(label: str) -> str:
+    # "0-100m" → prox_0_100_pct, ">300m" → prox_mayor_300_pct
+    if label.startswith(">"):
+        return f"prox_mayor_{label[1:-1]}_pct"
+    return "prox_" + label[:-1].replace("-", "_") + "_pct"
+
+
+def prox_pct(hist: pd.DataFrame, by=None) -> pd.DataFrame:
+    """Participación de siniestros por bucket de distancia (global o por `by`)."""
+    h = hist[hist["dataset"] == "siniestros"]
+    keys = [by] if by else []
+    n = h.groupby(keys + ["dist_bucket"], observed=False, dropna=False)["n"].sum()
+    tab = n.unstack("dist_bucket", fill_value=0) if by else n.to_frame().T
+    pct = tab.div(tab.sum(axis=1), axis=0).fillna(0.0)
+    pct = pct.drop(columns="SIN_COORD", errors="ignore")
+    pct.columns = [_kpi_bucket(str(c)) for c in pct.columns]
+    return pct
 
+
+def build_kpis(comp, sin, hist, panel):
+    """(kpi_global, kpi_localidad) a partir de los DataFrames de transform."""
     # KPIs globales
-    buckets = prox["dist_bucket"].value_counts(normalize=True)
     kpi = {
         "comparendos_total": int(len(comp)),
         "siniestros_total": int(len(sin)),
-        "prox_0_100_pct": float(buckets.get("0-100m", 0.0)),
-        "prox_100_300_pct": float(buckets.get("100-300m", 0.0)),
-        "prox_mayor_300_pct": float(buckets.get(">300m", 0.0)),
     }
-    pd.DataFrame([kpi]).to_parquet(f"{ANAL}/kpi_global.parquet", index=False)
+    kpi_g = pd.concat(
+        [pd.DataFrame([kpi]), prox_pct(hist).reset_index(drop=True)], axis=1
+    )
 
     # Por localidad
     comp_loc_col = _pick_loc_col(comp) or "LOCALIDAD"
@@ -123,9 +150,31 @@ def main():
             "siniestros_2018_final": "siniestros_2018",
         }
     )
+    kpi_loc = kpi_loc.merge(
+        prox_pct(hist, "LOCALIDAD").reset_index(), on="LOCALIDAD", how="left"
+    )
 
-    kpi_loc.to_parquet(f"{ANAL}/kpi_localidad.parquet", index=False)
-    print("OK → data/analytics/kpi_global.parquet, kpi_localidad.parquet")
+    return kpi_g, kpi_loc
+
+
+def main():
+    if MOTOR == "duckdb":
+        from src.analytics import motor_duckdb
+
+        kpi_g, kpi_loc = motor_duckdb.kpis(
+            motor_duckdb.conectar(), IN_COMP, IN_SIN, IN_HIST, IN_PANEL
+        )
+    else:
+        kpi_g, kpi_loc = build_kpis(
+            # solo la localidad: sin leer la geometría del GeoParquet
+            pd.read_parquet(IN_COMP, columns=["LOCALIDAD_JOIN"]),
+            pd.read_parquet(IN_SIN, columns=["LOCALIDAD_JOIN"]),
+            pd.read_parquet(IN_HIST),
+            pd.read_parquet(IN_PANEL),
+        )
+    kpi_g.to_parquet(OUT_GLOBAL, index=False)
+    kpi_loc.to_parquet(OUT_LOC, index=False)
+    print(f"OK → {OUT_GLOBAL}, {OUT_LOC}")
 
 
 if __name__ == "__main__":
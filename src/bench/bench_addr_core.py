@@ -0,0 +1,61 @@
+# Uso: python -m src.bench.bench_addr_core [n_filas]
+# Mide _addr_core fila a fila (df.apply) vs _addr_core_vec (columnar) sobre n filas
+# (default 200k). La equivalencia (casos borde + filas reales) está en tests/test_addr_core.py.
+
+import sys
+import time
+import numpy as np
+import pandas as pd
+
+from src.transform.geocode_addresses import (
+    RAW_IN,
+    _addr_core,
+    _addr_core_vec,
+    _in_bbox,
+    _in_bbox_mask,
+)
+
+
+def _iguales(ref: pd.Series, vec: pd.Series) -> bool:
+    # None/NaN cuentan como iguales (df.apply puede convertir None en NaN)
+    return all(a == b or (pd.isna(a) and pd.isna(b)) for a, b in zip(ref, vec))
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+
+    raw = pd.read_parquet(RAW_IN)
+    raw.columns = [c.strip().lower() for c in raw.columns]
+    df = raw.sample(n, replace=True, random_state=42).reset_index(drop=True)
+
+    t0 = time.perf_counter()
+    ref = df.apply(_addr_core, axis=1)
+    t_apply = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    vec = _addr_core_vec(df)
+    t_vec = time.perf_counter() - t0
+    assert _iguales(ref, vec), "addr_core columnar difiere del de referencia"
+    print(
+        f"addr_core  {n:,} filas: apply {t_apply:.2f}s | columnar {t_vec:.2f}s "
+        f"| x{t_apply / t_vec:.1f}"
+    )
+
+    lat = pd.Series(np.random.default_rng(0).uniform(4.3, 5.0, n))
+    lon = pd.Series(np.random.default_rng(1).uniform(-74.4, -73.8, n))
+    lat[::17] = np.nan
+    pts = pd.DataFrame({"lat": lat, "lon": lon})
+    t0 = time.perf_counter()
+    ref = pts.apply(lambda r: _in_bbox(r["lat"], r["lon"]), axis=1)
+    t_apply = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    vec = _in_bbox_mask(pts["lat"], pts["lon"])
+    t_vec = time.perf_counter() - t0
+    assert ref.tolist() == vec.tolist(), "máscara bbox difiere"
+    print(
+        f"bbox mask  {n:,} filas: apply {t_apply:.2f}s | columnar {t_vec:.3f}s "
+        f"| x{t_apply / t_vec:.0f}"
+    )
+
+
+if __name__ == "__main__":
+    main()
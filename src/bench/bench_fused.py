@@ -0,0 +1,103 @@
+# Uso: python -m src.bench.bench_fused [repeticiones]
+# Compara transform + analytics etapa por etapa (un proceso por módulo, releyendo los
+# parquet intermedios, como `make transform analytics`) contra el modo fusionado
+# (src/pipeline_fused.py): tiempo de pared y RSS pico de cada proceso (medido dentro
+# del hijo, src/bench/medir.py), y verifica que ambos modos escriban los mismos
+# artefactos. Las salidas etapa por etapa se copian a un directorio temporal y se leen
+# solo al final, después de todas las corridas medidas.
+
+import os
+import sys
+import shutil
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+from src.bench.medir import correr
+from src.extract import almacen_eventos
+from src.pipeline_fused import STAGES
+from src.pipeline import STAGES as ALL_STAGES, Stage
+
+MODULES = [m for n, m, _ in ALL_STAGES if n in STAGES]
+FUSED = "src.pipeline_fused"
+
+
+def _outputs():
+    return sorted(
+        {o for n, m, g in ALL_STAGES if n in STAGES for o in Stage(n, m, g).outputs}
+    )
+
+
+def _read(p):
+    if p.endswith(".npz"):
+        with np.load(p) as z:
+            return {k: z[k] for k in z.files}
+    if os.path.basename(p) == "_metadata":  # almacén particionado: el dataset entero
+        return almacen_eventos.leer(os.path.dirname(p))
+    return pd.read_parquet(p)  # GeoParquet: geometría WKB comparada byte a byte
+
+
+def _snapshot(paths, base=""):
+    return {p: _read(os.path.join(base, p)) for p in paths}
+
+
+def _copiar(paths, base):
+    # copia en disco (sin cargar nada en este proceso); el almacén, entero
+    for p in paths:
+        dst = os.path.join(base, p)
+        if os.path.basename(p) == "_metadata":
+            shutil.copytree(
+                os.path.dirname(p), os.path.dirname(dst), dirs_exist_ok=True
+            )
+        else:
+            os.makedirs(os.path.dirname(dst), exist_ok=True)
+            shutil.copy2(p, dst)
+
+
+def _same(a, b) -> bool:
+    if isinstance(a, dict):
+        return a.keys() == b.keys() and all(np.array_equal(a[k], b[k]) for k in a)
+    try:
+        pd.testing.assert_frame_equal(a, b, check_like=True)
+        return True
+    except AssertionError as e:
+        print(f"    {str(e).splitlines()[0]}")
+        return False
+
+
+def main():
+    reps = int(sys.argv[1]) if len(sys.argv) > 1 else 1
+    outs = _outputs()
+
+    stage_runs = []
+    for _ in range(reps):
+        runs = [correr(m) for m in MODULES]
+        stage_runs.append((sum(t for t, _ in runs), max(r for _, r in runs)))
+        for m, (t, r) in zip(MODULES, runs):
+            print(f"  {m:45} {t:6.2f} s  {r:7.0f} MB")
+
+    with tempfile.TemporaryDirectory(prefix="bench_fused_") as tmp:
+        _copiar(outs, tmp)
+        fused_runs = [correr(FUSED) for _ in range(reps)]
+        print(f"  {FUSED:45} {fused_runs[-1][0]:6.2f} s  {fused_runs[-1][1]:7.0f} MB")
+        ref = _snapshot(outs, tmp)
+        got = _snapshot(outs)
+
+    bad = [p for p in outs if not _same(ref[p], got[p])]
+    for p in bad:
+        print(f"  ≠ {p}")
+    print(f"Artefactos idénticos: {len(outs) - len(bad)} / {len(outs)}")
+
+    t_st, r_st = min(t for t, _ in stage_runs), max(r for _, r in stage_runs)
+    t_fu, r_fu = min(t for t, _ in fused_runs), max(r for _, r in fused_runs)
+    print(
+        f"etapa por etapa: {t_st:.2f} s, RSS pico {r_st:.0f} MB | "
+        f"fusionado: {t_fu:.2f} s, RSS pico {r_fu:.0f} MB | x{t_st / t_fu:.2f}"
+    )
+    if bad:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
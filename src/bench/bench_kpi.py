@@ -0,0 +1,240 @@
+# Uso: python -m src.bench.bench_kpi [millones_de_filas ...]   (default: 1 5 20)
+# Motor pandas contra KPI_ENGINE=duckdb en las tres rutas de merge_mortalidad y
+# resumen_kpi, sobre tablas sintéticas de varios años (2015–2024) del tamaño pedido:
+#   conteos  read_parquet de la columna + groupby  vs  motor_duckdb.conteos
+#   panel    build_panel                           vs  panel_desde_conteos(conteos SQL)
+#   kpis     build_kpis                            vs  motor_duckdb.kpis
+# Comparendos con n millones de filas, siniestros con n/10, histograma de proximidad y
+# panel sintéticos. Tiempo de pared y RSS pico de cada motor en un proceso nuevo (el
+# pico lo mide el hijo, src/bench/medir.py), y verifica que ambos den el mismo
+# resultado. Las tablas las genera otro proceso y quedan en data/working/bench_kpi/.
+
+import os
+import sys
+import glob
+import subprocess
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from src.bench.medir import correr
+
+OUT_DIR = "data/working/bench_kpi"
+GEOLOC = "data/raw/localidades/localidades.parquet"
+RAW_MORT = "data/raw/mortalidad/mortalidad_raw.parquet"
+HIST = f"{OUT_DIR}/proximidad_buckets_localidad.parquet"
+CHUNK = 1_000_000
+LOC_COL = "LOCALIDAD_JOIN"
+ETAPAS = ("conteos", "panel", "kpis")
+MOTORES = ("pandas", "duckdb")
+
+
+def _localidades():
+    try:
+        from src.extract.geoparquet import read_geoparquet
+
+        locs = read_geoparquet(GEOLOC)
+        col = [c for c in locs.columns if "LOCAL" in c.upper()][0]
+        return sorted(locs[col].astype(str).str.upper().str.strip().unique())
+    except (OSError, IndexError):
+        return [f"LOCALIDAD {i:02d}" for i in range(1, 21)]
+
+
+def _ruta(millones: float, nombre="eventos") -> str:
+    return f"{OUT_DIR}/{nombre}_{millones:g}M.parquet"
+
+
+def generar(millones: float, nombre="eventos", seed=0) -> str:
+    """Tabla de eventos sintética (row groups de CHUNK filas); se reutiliza si existe."""
+    n = int(millones * 1_000_000)
+    path = _ruta(millones, nombre)
+    if os.path.exists(path):
+        return path
+    os.makedirs(OUT_DIR, exist_ok=True)
+    rng = np.random.default_rng(seed)
+    locs = np.array(_localidades() + [None], dtype=object)
+    p = rng.dirichlet(np.ones(len(locs)))  # localidades de distinto tamaño
+    t0 = np.datetime64("2015-01-01T00:00", "ms").astype(np.int64)
+    t1 = np.datetime64("2025-01-01T00:00", "ms").astype(np.int64)
+    tmp = f"{path}.tmp"
+    with pq.ParquetWriter(
+        tmp,
+        pa.schema(
+            [
+                (LOC_COL, pa.string()),
+                ("FECHA_HORA", pa.timestamp("ms")),
+                ("lat", pa.float64()),
+                ("lon", pa.float64()),
+            ]
+        ),
+        compression="zstd",
+    ) as w:
+        for s in range(0, n, CHUNK):
+            m = min(CHUNK, n - s)
+            w.write_table(
+                pa.table(
+                    {
+                        LOC_COL: locs[rng.choice(len(locs), m, p=p)],
+                        "FECHA_HORA": pa.array(
+                            rng.integers(t0, t1, m), pa.timestamp("ms")
+                        ),
+                        "lat": rng.uniform(4.45, 4.83, m),
+                        "lon": rng.uniform(-74.22, -74.01, m),
+                    }
+                )
+            )
+    os.replace(tmp, path)
+    return path
+
+
+def histograma() -> str:
+    """Histograma de proximidad sintético con el esquema de calc_proximidad_semaforos."""
+    from src.transform.calc_proximidad_semaforos import bucket_labels
+
+    path = HIST
+    if os.path.exists(path):
+        return path
+    os.makedirs(OUT_DIR, exist_ok=True)
+    labels = bucket_labels()
+    locs = _localidades()
+    idx = pd.MultiIndex.from_product(
+        [["comparendos", "siniestros"], locs, labels],
+        names=["dataset", "LOCALIDAD", "dist_bucket"],
+    )
+    hist = idx.to_frame(index=False)
+    hist["dataset"] = hist["dataset"].astype("category")
+    hist["dist_bucket"] = pd.Categorical(hist["dist_bucket"], labels, ordered=True)
+    hist["n"] = np.random.default_rng(2).integers(0, 5000, len(hist), dtype=np.int32)
+    hist.to_parquet(path, index=False)
+    return path
+
+
+def _leer_loc(path):
+    # como resumen_kpi/merge_mortalidad: solo la columna de localidad
+    return pd.read_parquet(path, columns=[LOC_COL])
+
+
+def _hijo(motor, etapa, comp, sin, hist, panel, salida) -> None:
+    # una etapa con un motor en un proceso: escribe sus tablas en <salida>_<k>.parquet
+    if motor == "duckdb":
+        from src.analytics import motor_duckdb
+
+        con = motor_duckdb.conectar()
+    if etapa == "conteos":
+        if motor == "duckdb":
+            res = [motor_duckdb.conteos(con, comp)]
+        else:
+            n = _leer_loc(comp).groupby(LOC_COL, dropna=False).size()
+            res = [n.rename("n").reset_index()]
+    elif etapa == "panel":
+        from src.transform.merge_mortalidad import (
+            _group_conteos,
+            build_panel,
+            panel_desde_conteos,
+        )
+
+        mort = pd.read_parquet(RAW_MORT)
+        if motor == "duckdb":
+            res = [
+                panel_desde_conteos(
+                    mort,
+                    _group_conteos(motor_duckdb.conteos(con, comp), "comparendos"),
+                    _group_conteos(motor_duckdb.conteos(con, sin), "siniestros"),
+                )
+            ]
+        else:
+            res = [build_panel(mort, _leer_loc(comp), _leer_loc(sin))]
+    else:
+        from src.analytics.resumen_kpi import build_kpis
+
+        if motor == "duckdb":
+            res = motor_duckdb.kpis(con, comp, sin, hist, panel)
+        else:
+            res = build_kpis(
+                _leer_loc(comp),
+                _leer_loc(sin),
+                pd.read_parquet(hist),
+                pd.read_parquet(panel),
+            )
+    for k, df in enumerate(res):
+        df.to_parquet(f"{salida}_{k}.parquet", index=False)
+
+
+def _entradas(millones: float):
+    # comparendos (n M), siniestros (n/10 M) e histograma, en un proceso aparte: el
+    # que mide no carga las tablas
+    subprocess.run(
+        [sys.executable, "-m", "src.bench.bench_kpi", "--generar", f"{millones:g}"],
+        check=True,
+        env=dict(os.environ, PYTHONPATH="."),
+    )
+    return _ruta(millones), _ruta(millones / 10, "siniestros"), HIST
+
+
+def _generar(millones: str) -> None:
+    millones = float(millones)
+    histograma()
+    generar(millones)
+    generar(millones / 10, "siniestros", seed=1)
+
+
+def _proc(motor: str, etapa: str, args, salida: str):
+    """(segundos, RSS pico en MB, tablas) de una etapa con un motor en un proceso nuevo."""
+    for fn in glob.glob(f"{salida}_*.parquet"):
+        os.remove(fn)  # de una corrida anterior
+    dt, rss = correr(
+        "src.bench.bench_kpi", "--hijo", motor, etapa, *args, salida, stdout=None
+    )
+    k, tablas = 0, []
+    while os.path.exists(f"{salida}_{k}.parquet"):
+        tablas.append(pd.read_parquet(f"{salida}_{k}.parquet"))
+        k += 1
+    return dt, rss, tablas
+
+
+def _iguales(a: pd.DataFrame, b: pd.DataFrame) -> bool:
+    # mismo contenido sin importar el orden de filas ni los tipos enteros/nulos
+    a, b = (
+        t.sort_values(list(t.columns[:1]), na_position="last").reset_index(drop=True)
+        for t in (a, b)
+    )
+    try:
+        pd.testing.assert_frame_equal(a, b, check_dtype=False, check_like=True)
+    except AssertionError:
+        return False
+    return True
+
+
+def main():
+    if sys.argv[1:2] == ["--hijo"]:
+        return _hijo(*sys.argv[2:])
+    if sys.argv[1:2] == ["--generar"]:
+        return _generar(sys.argv[2])
+    tamaños = [float(v) for v in sys.argv[1:]] or [1, 5, 20]
+    print(f"{'filas':>8} {'etapa':8} {'motor':8} {'tiempo':>9} {'RSS pico':>10}")
+    for mill in tamaños:
+        comp, sin, hist = _entradas(mill)
+        # kpis lee el panel que escribe la etapa anterior (motor pandas)
+        panel = f"{OUT_DIR}/panel_pandas_{mill:g}M_0.parquet"
+        for etapa in ETAPAS:
+            res = {
+                m: _proc(
+                    m,
+                    etapa,
+                    [comp, sin, hist, panel],
+                    f"{OUT_DIR}/{etapa}_{m}_{mill:g}M",
+                )
+                for m in MOTORES
+            }
+            for m, (t, rss, _) in res.items():
+                print(f"{mill:>7g}M {etapa:8} {m:8} {t:7.2f} s {rss:7.0f} MB")
+            (tp, _, a), (td, _, b) = res["pandas"], res["duckdb"]
+            if len(a) != len(b) or not all(map(_iguales, a, b)):
+                raise SystemExit(f"{etapa}: resultados distintos con {mill:g}M filas")
+            print(f"{'':>8} {etapa:8} x{tp / td:.2f} | resultados idénticos")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+# Uso: python -m src.bench.medir <salida> <módulo> [args ...]
+# Corre `python -m módulo args` en este mismo proceso y al terminar escribe en <salida>
+# su RSS pico (VmHWM de /proc/self/status, en MB). VmHWM se reinicia con el exec, así
+# que no incluye la memoria del proceso que lo lanzó; ru_maxrss de wait4 sí (cuenta la
+# copia del padre al hacer fork) y deja a todas las etapas en el piso del benchmark.
+
+import os
+import sys
+import time
+import runpy
+import tempfile
+import subprocess
+
+
+def pico_mb() -> float:
+    """RSS pico de este proceso en MB."""
+    with open("/proc/self/status", encoding="ascii") as f:
+        for line in f:
+            if line.startswith("VmHWM:"):
+                return int(line.split()[1]) / 1024  # kB
+    raise OSError("VmHWM no disponible (solo Linux)")
+
+
+def correr(module: str, *args, stdout=subprocess.DEVNULL):
+    """(segundos, RSS pico en MB) de `python -m module args` en un proceso nuevo."""
+    fd, salida = tempfile.mkstemp(suffix=".rss")
+    os.close(fd)
+    try:
+        t0 = time.perf_counter()
+        p = subprocess.run(
+            [sys.executable, "-m", "src.bench.medir", salida, module, *args],
+            stdout=stdout,
+            env=dict(os.environ, PYTHONPATH="."),
+        )
+        dt = time.perf_counter() - t0
+        if p.returncode != 0:
+            raise SystemExit(f"{module} {' '.join(args)} terminó con error")
+        with open(salida, encoding="ascii") as f:
+            return dt, float(f.read())
+    finally:
+        os.remove(salida)
+
+
+def main():
+    salida, module, *args = sys.argv[1:]
+    sys.argv = [module, *args]
+    try:
+        runpy.run_module(module, run_name="__main__", alter_sys=True)
+    finally:
+        with open(salida, "w", encoding="ascii") as f:
+            f.write(f"{pico_mb():.1f}")
+
+
+if __name__ == "__main__":
+    main()
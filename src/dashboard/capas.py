@@ -0,0 +1,243 @@
+# Capas del mapa precalculadas para el dashboard (funciones puras, sin streamlit, para
+# cachearlas por parámetros con st.cache_data):
+# - polígonos (grilla, contornos KDE) como GeoJSON con el estilo ya en properties.style:
+#   sin style_function folium no recorre las features en Python, Leaflet aplica el
+#   estilo de cada una; la opacidad del slider se aplica en el navegador (JsCode);
+# - puntos (siniestros, semáforos) como una sola capa GeoJSON de CircleMarkers en vez
+#   de un CircleMarker de folium por punto;
+# - heatmap como arreglo [lat, lon, peso] con los eventos sumados en celdas finas
+#   (Leaflet.heat suma igual los puntos que caen en la misma celda de pantalla);
+# - muestras de puntos por vista: caja del mapa ajustada a la grilla de teselas del zoom
+#   (mover poco el mapa reutiliza la consulta cacheada) y muestreo estratificado en
+#   una grilla sobre la caja, proporcional a los puntos de cada celda;
+# - franjas y animación temporal sumando el cubo espacio-tiempo (cubo_espacio_tiempo),
+#   sin volver a filtrar eventos.
+# Cada FeatureCollection lleva su "bbox" (GeoJSON estándar); CapaGeoJson lo usa en vez
+# de recorrer todas las coordenadas en cada render como hace folium.GeoJson.
+
+import os
+
+import numpy as np
+import pandas as pd
+import shapely
+import folium
+from folium import JsCode
+
+HEAT_CELL = float(os.getenv("DASH_HEAT_CELL_DEG", "0.0002"))  # ~22 m
+MUESTRA_CELDAS = int(os.getenv("DASH_MUESTRA_CELDAS", "24"))  # estratos por lado
+ANIM_CELDAS = int(os.getenv("DASH_ANIM_CELDAS", "1500"))  # celdas en la animación
+PRECISION = 1e-6  # grados (~0.1 m) para las coordenadas enviadas al navegador
+OPACIDAD_MAX = 0.9
+# clase Gi* (hotspots_gi) → color; las no significativas van sin relleno
+GI_COLORES = {
+    "caliente 99%": "#b2182b",
+    "caliente 95%": "#ef8a62",
+    "caliente 90%": "#fddbc7",
+    "frío 90%": "#d1e5f0",
+    "frío 95%": "#67a9cf",
+    "frío 99%": "#2166ac",
+}
+
+
+def heat_array(lat, lon, cell=HEAT_CELL) -> list:
+    """[[lat, lon, n], ...] por celda de `cell` grados, listo para HeatMap."""
+    lat, lon = np.asarray(lat, dtype=float), np.asarray(lon, dtype=float)
+    ok = ~(np.isnan(lat) | np.isnan(lon))
+    ij = np.floor(np.c_[lat[ok], lon[ok]] / cell).astype(np.int64)
+    celdas, n = np.unique(ij, axis=0, return_counts=True)
+    centro = (celdas + 0.5) * cell
+    return np.c_[centro.round(6), n].tolist()
+
+
+def caja_vista(bounds, zoom):
+    """(lon_min, lat_min, lon_max, lat_max) de la vista de st_folium, ampliada a
+    múltiplos del ancho de tesela del zoom; None si el mapa aún no la reportó."""
+    try:
+        so, ne = bounds["_southWest"], bounds["_northEast"]
+        caja = np.array([so["lng"], so["lat"], ne["lng"], ne["lat"]], dtype=float)
+        paso = 360 / 2 ** int(zoom)
+    except (KeyError, TypeError, ValueError):
+        return None
+    if np.isnan(caja).any():
+        return None
+    caja[:2] = np.floor(caja[:2] / paso) * paso
+    caja[2:] = np.ceil(caja[2:] / paso) * paso
+    return tuple(caja.round(6).tolist())
+
+
+def muestra_estratificada(df: pd.DataFrame, n: int, celdas=MUESTRA_CELDAS, seed=42):
+    """Hasta `n` filas (lat/lon) repartidas en una grilla celdas × celdas sobre la
+    extensión de `df`, en proporción a las filas de cada celda: conserva la densidad
+    relativa y toda celda con puntos aporta al menos uno."""
+    df = df.dropna(subset=["lat", "lon"])
+    if len(df) <= n:
+        return df
+
+    def _eje(v):
+        v = v.to_numpy(dtype=float)
+        lo, hi = v.min(), v.max()
+        return np.minimum(
+            ((v - lo) / max(hi - lo, 1e-12) * celdas).astype(int), celdas - 1
+        )
+
+    celda = _eje(df["lat"]) * celdas + _eje(df["lon"])
+    rng = np.random.default_rng(seed)
+    orden = rng.permutation(len(df))
+    orden = orden[
+        np.argsort(celda[orden], kind="stable")
+    ]  # al azar dentro de cada celda
+    _, inicio, conteo = np.unique(celda[orden], return_index=True, return_counts=True)
+    rango = np.arange(len(df)) - np.repeat(inicio, conteo)
+    cuota = np.maximum(1, conteo * n // len(df))
+    elegidos = orden[rango < np.repeat(cuota, conteo)]
+    if len(elegidos) > n:  # por el mínimo de uno por celda
+        elegidos = rng.choice(elegidos, n, replace=False)
+    elif len(elegidos) < n:  # lo que dejó el redondeo de las cuotas, al azar
+        resto = np.setdiff1d(orden, elegidos)
+        elegidos = np.r_[elegidos, rng.choice(resto, n - len(elegidos), replace=False)]
+    return df.iloc[np.sort(elegidos)]
+
+
+def puntos_geojson(df: pd.DataFrame, estilo: dict, props=()) -> dict:
+    """FeatureCollection de puntos (lat/lon) con el mismo estilo y columnas `props`."""
+    lon = df["lon"].to_numpy(dtype=float).round(6).tolist()
+    lat = df["lat"].to_numpy(dtype=float).round(6).tolist()
+    cols = [df[c].tolist() for c in props]
+    bbox = [min(lon), min(lat), max(lon), max(lat)] if lon else None
+    return {
+        "type": "FeatureCollection",
+        "bbox": bbox,
+        "features": [
+            {
+                "type": "Feature",
+                "geometry": {"type": "Point", "coordinates": [x, y]},
+                "properties": {
+                    "style": estilo,
+                    **{c: v[k] for c, v in zip(props, cols)},
+                },
+            }
+            for k, (x, y) in enumerate(zip(lon, lat))
+        ],
+    }
+
+
+def _coleccion(gdf, estilos: list, props) -> dict:
+    geoms = shapely.set_precision(gdf.geometry.to_numpy(), PRECISION)
+    out = gdf[list(props)].assign(geometry=geoms).set_geometry("geometry")
+    fc = out.set_crs(gdf.crs, allow_override=True).to_geo_dict(drop_id=True)
+    for f, s in zip(fc["features"], estilos):
+        f["properties"]["style"] = s
+    fc["bbox"] = shapely.total_bounds(geoms).tolist() if len(geoms) else None
+    return fc
+
+
+class CapaGeoJson(folium.GeoJson):
+    """folium.GeoJson que toma los límites del "bbox" de la colección."""
+
+    def _get_self_bounds(self):
+        b = self.data.get("bbox")
+        if not b:
+            return [[None, None], [None, None]]
+        return [[b[1], b[0]], [b[3], b[2]]]
+
+
+def grid_geojson(grid, colores=None) -> dict:
+    """Grilla de hotspots con el estilo en cada feature.
+
+    Con `colores` (clase Gi* → color) se colorea por significancia y las celdas no
+    significativas van sin relleno; si no, negro con opacidad relativa al score.
+    La opacidad final (peso `w` × slider) la pone `opacidad_js`.
+    """
+    if colores is not None:
+        fill = grid["clase"].map(colores).fillna("#000000")
+        w = grid["clase"].isin(list(colores)).astype(float)
+        props = ["comparendos", "siniestros", "score", "clase", "p_sim"]
+        grid = grid.assign(p_sim=grid["p_sim"].round(3))
+        color = "#666666"
+    else:
+        fill = pd.Series("#000000", index=grid.index)
+        w = grid["score"] / max(grid["score"].max(), 1)
+        props = ["comparendos", "siniestros", "score"]
+        color = "#000000"
+    estilos = [
+        {"fillColor": f, "color": color, "weight": 0.2, "w": float(x)}
+        for f, x in zip(fill, w)
+    ]
+    return _coleccion(grid, estilos, props)
+
+
+def opacidad_js(opacidad: float) -> JsCode:
+    # relleno = peso de la celda × opacidad del slider; resalta al pasar el mouse
+    return JsCode(f"""function(feature, layer) {{
+            var s = feature.properties.style;
+            layer.setStyle({{fillOpacity: Math.min({OPACIDAD_MAX}, s.w * {opacidad} + 1e-6)}});
+            layer.on("mouseover", function(e) {{ e.target.setStyle({{weight: 1, color: "#666666"}}); }});
+            layer.on("mouseout", function(e) {{ e.target.setStyle({{weight: s.weight, color: s.color}}); }});
+        }}""")
+
+
+def kde_geojson(contornos, capa: str) -> dict:
+    """Contornos de una capa, de la masa más amplia a la más concentrada (encima)."""
+    c = contornos[contornos["capa"] == capa].sort_values("masa", ascending=False)
+    c = c.assign(
+        info=[
+            f"{m:.0%} de los {capa} · ≥ {d:,.0f}/km²"
+            for m, d in zip(c["masa"], c["densidad_min"])
+        ]
+    )
+    estilos = [
+        {
+            "fillColor": "#7a0177",
+            "color": "#7a0177",
+            "weight": 0.8,
+            "fillOpacity": 0.15 + 0.4 * (1 - m),
+        }
+        for m in c["masa"]
+    ]
+    return _coleccion(c, estilos, ["masa", "info"])
+
+
+def cubo_franja(cubo, meses=None, dias=None, horas=None, por=None) -> pd.DataFrame:
+    """comparendos, siniestros y score por celda (y por la dimensión `por`) sumando el
+    cubo espacio-tiempo en la franja; None = sin filtrar (incluye los sin dato)."""
+    m = np.ones(len(cubo), bool)
+    for col, vals in (("mes", meses), ("dow", dias), ("hora", horas)):
+        if vals is not None:
+            m &= cubo[col].isin(list(vals)).to_numpy()
+    c = cubo[m]
+    if por is not None:
+        c = c[c[por] >= 0]  # sin dato no entra en la animación
+    claves = ["cell_id"] if por is None else ["cell_id", por]
+    t = c.groupby([*claves, "capa"], observed=True)["n"].sum().unstack("capa")
+    t = t.reindex(columns=["comparendos", "siniestros"]).fillna(0).astype(int)
+    t = t.reset_index()
+    t["score"] = t["comparendos"] + t["siniestros"]
+    return t[t["score"] > 0].reset_index(drop=True)
+
+
+def animacion_geojson(grid, conteos, por: str, etiqueta: str, max_celdas=ANIM_CELDAS):
+    """(GeoJSON, styledict, formato) para folium TimeSliderChoropleth.
+
+    Un cuadro por valor de `por`; la opacidad de cada celda es su conteo relativo al
+    máximo de todos los cuadros. Solo las `max_celdas` celdas con más eventos. El
+    "tiempo" de cada cuadro es su valor en segundos desde 1970 y el control lo muestra
+    con el formato "s" de moment.js, que no depende de la zona horaria del navegador.
+    """
+    total = conteos.groupby("cell_id")["score"].sum().nlargest(max_celdas)
+    conteos = conteos[conteos["cell_id"].isin(total.index)]
+    grid = grid[grid["cell_id"].isin(total.index)].reset_index(drop=True)
+    valores = sorted(conteos[por].unique().tolist())
+    tabla = conteos.pivot_table(
+        index="cell_id", columns=por, values="score", aggfunc="sum", fill_value=0
+    ).reindex(index=grid["cell_id"], columns=valores, fill_value=0)
+    op = (tabla.to_numpy() / max(tabla.to_numpy().max(), 1) * OPACIDAD_MAX).round(2)
+    estilo = {"fillColor": "#b2182b", "fillOpacity": 0, "color": "#666666"}
+    fc = _coleccion(grid, [estilo] * len(grid), [])
+    styledict = {}
+    for k, (f, fila) in enumerate(zip(fc["features"], op)):
+        f["id"] = str(k)
+        styledict[str(k)] = {
+            str(v): {"color": "#b2182b", "opacity": float(o)}
+            for v, o in zip(valores, fila)
+        }
+    return fc, styledict, f"[{etiqueta} ]s"
@@ -1,11 +1,13 @@
 import os
+import sys
 from pathlib import Path
+import numpy as np
 import pandas as pd
 import geopandas as gpd
 import streamlit as st
 from streamlit_folium import st_folium
 import folium
-from folium.plugins import HeatMap
+from folium.plugins import HeatMap, TimeSliderChoropleth, VectorGridProtobuf
 import plotly.express as px
 
 # ------------------------- Configuración general -------------------------
@@ -14,57 +16,398 @@ st.set_page_config(page_title="Seguridad Vial Bogotá 2018", layout="wide")
 # ------------------------- Rutas seguras -------------------------
 BASE_DIR = Path(__file__).resolve().parents[2]
 DATA_DIR = BASE_DIR / "data"
+if str(BASE_DIR) not in sys.path:  # `streamlit run` no agrega la raíz del repo
+    sys.path.insert(0, str(BASE_DIR))
+
+from src.dashboard import capas, teselas  # noqa: E402
+from src.extract import almacen_eventos  # noqa: E402
+from src.transform.agregacion_hex import cell_ij, grid_nivel  # noqa: E402
+from src.transform.cubo_espacio_tiempo import SIN_DATO  # noqa: E402
+from src.transform.indice_semaforos import RADIOS, cargar_indice  # noqa: E402
 
 FILES = {
     "kpi_g": DATA_DIR / "analytics/kpi_global.parquet",
     "kpi_loc": DATA_DIR / "analytics/kpi_localidad.parquet",
-    "grid": DATA_DIR / "analytics/grid_hotspots.geojson",
-    "comp": DATA_DIR / "clean/comparendos_2018_loc.parquet",
-    "sin": DATA_DIR / "clean/siniestralidad_2018_loc.parquet",
-    "prox": DATA_DIR / "clean/siniestralidad_2018_dist_semaforos.parquet",
+    "grid": DATA_DIR / "analytics/grid_hotspots.parquet",
+    # almacenes particionados (localidad/mes) de join_localidades
+    "comp": DATA_DIR / "clean/eventos/comparendos/_metadata",
+    "sin": DATA_DIR / "clean/eventos/siniestros/_metadata",
+    "hist": DATA_DIR / "clean/proximidad_buckets_localidad.parquet",
     "sem": DATA_DIR / "raw/semaforos/semaforos_raw.parquet",
 }
+# opcional: pirámide de resoluciones de agregacion_hex (sin ella, solo la grilla base)
+PIRAMIDE = DATA_DIR / "analytics/hotspots_piramide.parquet"
+# opcional: contornos de densidad KDE de kde_hotspots (reemplazan al HeatMap de puntos)
+KDE_CONTORNOS = DATA_DIR / "analytics/kde_contornos.parquet"
+# opcional: significancia Gi* por (level, cell_id) de hotspots_gi
+GI = DATA_DIR / "analytics/hotspots_gi.parquet"
+# opcional: cubo espacio-tiempo (celda, mes, día, hora) de cubo_espacio_tiempo
+CUBO = DATA_DIR / "analytics/cubo_espacio_tiempo.parquet"
+MESES = "ene feb mar abr may jun jul ago sep oct nov dic".split()
+DIAS = "lunes martes miércoles jueves viernes sábado domingo".split()
+# dimensión animable → (columna del cubo, etiqueta del control, desplazamiento)
+ANIMAR = {
+    "hora": ("hora", "Hora", 0),
+    "día": ("dow", "Día (1 = lunes)", 1),
+    "mes": ("mes", "Mes", 0),
+}
 
 
 # ------------------------- Carga de datos -------------------------
-@st.cache_data(show_spinner="Cargando datos...")
-def load_data():
+# Un cargador por tabla, con solo las columnas que usa cada widget, llamado recién
+# cuando la sección o capa lo necesita. st.cache_resource guarda una sola copia para
+# todas las sesiones (st.cache_data devuelve una copia en cada llamada); la clave lleva
+# el mtime del archivo, así un Parquet regenerado se relee sin reiniciar el dashboard.
+# Los objetos cacheados son compartidos: no se modifican, se derivan copias.
+# capas que dependen de la vista: una entrada por caja, acotadas en número y tiempo
+VISTA_CACHE = 32
+VISTA_TTL = 600  # s
+GRID_COLS = ["comparendos", "siniestros", "score", "geometry"]
+SEM_COLS = ["ID", "DIRECCION", "lat", "lon"]
+HIST_COLS = ["dataset", "LOCALIDAD", "dist_bucket", "n"]
+KDE_COLS = ["capa", "masa", "densidad_min", "geometry"]
+
+
+def verificar_archivos():
     missing = [str(v) for v in FILES.values() if not v.exists()]
     if missing:
         st.error(f"Archivos faltantes:\n{chr(10).join(missing)}")
         st.stop()
 
-    kpi_g = pd.read_parquet(FILES["kpi_g"])
-    kpi_loc = pd.read_parquet(FILES["kpi_loc"])
-    grid = gpd.read_file(FILES["grid"])
-    comp = pd.read_parquet(FILES["comp"])
-    sin = pd.read_parquet(FILES["sin"])
-    prox = pd.read_parquet(FILES["prox"])
-    sem = pd.read_parquet(FILES["sem"])
 
-    return kpi_g, kpi_loc, grid, comp, sin, prox, sem
+def _mtime(path: Path):
+    return path.stat().st_mtime_ns if path.exists() else None
+
+
+def version(*paths) -> tuple:
+    # parte de la clave de las capas cacheadas: un archivo regenerado las invalida
+    return tuple(_mtime(p) for p in paths)
+
+
+def _compactar(df):
+    """float64 → float32 y texto repetido → categórico."""
+    for c in df.columns:
+        s = df[c]
+        if s.dtype == "float64":
+            df[c] = s.astype("float32")
+        elif (
+            pd.api.types.is_object_dtype(s) or pd.api.types.is_string_dtype(s)
+        ) and s.nunique() <= len(s) // 2:
+            df[c] = s.astype("category")
+    return df
+
+
+@st.cache_resource(show_spinner="Cargando datos...", max_entries=32)
+def _leer(path: str, mtime, columns=None, geo=False, compactar=True):
+    leer = gpd.read_parquet if geo else pd.read_parquet
+    df = leer(path, columns=None if columns is None else list(columns))
+    return _compactar(df) if compactar else df
+
+
+def tabla(path: Path, columns=None, geo=False, compactar=True):
+    """Tabla cacheada entre sesiones; se relee cuando cambia el mtime del archivo."""
+    cols = None if columns is None else tuple(columns)
+    return _leer(str(path), _mtime(path), cols, geo, compactar)
+
+
+def load_kpis():
+    # tablas de una fila por localidad: sin compactar (los valores se muestran tal cual)
+    return (
+        tabla(FILES["kpi_g"], compactar=False),
+        tabla(FILES["kpi_loc"], compactar=False),
+    )
+
+
+@st.cache_data(show_spinner=False)
+def _particiones(mtimes):
+    # localidades y meses presentes, desde los footers (_metadata): sin leer eventos
+    n = pd.concat([almacen_eventos.conteos(FILES[k].parent) for k in ("comp", "sin")])
+    locs = sorted(n["LOCALIDAD_JOIN"].dropna().unique().tolist())
+    meses = sorted(n["MES"].dropna().unique().tolist())
+    return locs, meses
+
+
+def load_particiones():
+    return _particiones((_mtime(FILES["comp"]), _mtime(FILES["sin"])))
+
+
+@st.cache_resource(show_spinner="Leyendo eventos...", max_entries=16, ttl=VISTA_TTL)
+def _puntos(capa: str, mtime, localidad, mes, caja) -> pd.DataFrame:
+    # el filtro se empuja a pyarrow: solo se leen las particiones pedidas, los row
+    # groups (ordenados por código Z) que tocan la caja y lat/lon
+    pts = almacen_eventos.leer(
+        FILES[capa].parent,
+        columns=["lat", "lon"],
+        localidades=None if localidad is None else [localidad],
+        meses=None if mes is None else [mes],
+        bbox=caja,
+    )
+    return _compactar(pts)
+
+
+def load_puntos(capa: str, localidad=None, mes=None, caja=None) -> pd.DataFrame:
+    return _puntos(capa, _mtime(FILES[capa]), localidad, mes, caja)
+
+
+def load_niveles():
+    if not PIRAMIDE.exists():
+        return None
+    return sorted(tabla(PIRAMIDE, ["level"])["level"].unique().tolist())
+
+
+@st.cache_resource(show_spinner=False, max_entries=8)
+def _nivel(level: int, mtime) -> gpd.GeoDataFrame:
+    # solo las filas del nivel (filtro en pyarrow); polígonos armados en bloque
+    pyr = pd.read_parquet(PIRAMIDE, filters=[("level", "==", level)])
+    return _compactar(grid_nivel(pyr, level))
+
+
+def load_nivel(level: int) -> gpd.GeoDataFrame:
+    return _nivel(level, _mtime(PIRAMIDE))
+
+
+def load_kde_capas():
+    if not KDE_CONTORNOS.exists():
+        return []
+    return sorted(tabla(KDE_CONTORNOS, ["capa"])["capa"].unique().tolist())
+
+
+def load_cubo():
+    return tabla(CUBO, compactar=False) if CUBO.exists() else None
+
+
+@st.cache_resource(show_spinner=False, max_entries=2)
+def _celdas_cubo(mtime) -> gpd.GeoDataFrame:
+    # polígonos de las celdas del cubo, armados una vez desde su cell_id
+    cubo = load_cubo()
+    cid = np.unique(cubo["cell_id"].to_numpy())
+    i, j = cell_ij(cid)
+    level = int(cubo["level"].iloc[0])
+    celdas = pd.DataFrame({"level": level, "cell_id": cid, "i": i, "j": j})
+    return grid_nivel(celdas, level)
+
+
+def load_celdas_cubo() -> gpd.GeoDataFrame:
+    return _celdas_cubo(_mtime(CUBO))
 
 
-kpi_g, kpi_loc, grid, comp, sin, prox, sem = load_data()
+@st.cache_resource(show_spinner=False, max_entries=2)
+def _indice(mtime):
+    # el mismo índice persistido que usa calc_proximidad_semaforos
+    return cargar_indice(
+        str(FILES["sem"]), str(DATA_DIR / "working/semaforos_kdtree.pkl")
+    )
+
+
+def load_indice():
+    return _indice(_mtime(FILES["sem"]))
+
+
+@st.cache_resource(show_spinner=False, max_entries=8)
+def _gi(level: int, mtime):
+    gi = pd.read_parquet(
+        GI,
+        columns=["cell_id", "gi_z", "p_sim", "clase"],
+        filters=[("level", "==", level)],
+    )
+    return _compactar(gi)
+
+
+def load_gi(level: int):
+    return _gi(level, _mtime(GI)) if GI.exists() else None
+
+
+# ------------------------- Capas del mapa (precalculadas) -------------------------
+# GeoJSON / arreglos listos para folium, cacheados por parámetros: mover un slider que
+# no cambia la capa (radio del heatmap, opacidad, ...) no la recalcula. El último
+# argumento, `ver` (version() de los archivos que usa), solo forma parte de la clave.
+@st.cache_data(show_spinner=False)
+def capa_grid(level, con_gi: bool, ver) -> dict:
+    if level is None:
+        grid = tabla(FILES["grid"], GRID_COLS, geo=True)
+    else:
+        grid = load_nivel(level)
+    if con_gi:
+        grid = grid.merge(load_gi(level), on="cell_id", how="left")
+        grid["clase"] = grid["clase"].astype(object).fillna("no significativo")
+    return capas.grid_geojson(grid, capas.GI_COLORES if con_gi else None)
+
+
+@st.cache_data(show_spinner=False)
+def capa_heat(capa: str, localidad, mes, ver) -> list:
+    pts = load_puntos(capa, localidad, mes)
+    return capas.heat_array(pts["lat"], pts["lon"])
+
+
+@st.cache_data(show_spinner=False, max_entries=VISTA_CACHE, ttl=VISTA_TTL)
+def capa_muestra(capa: str, n: int, localidad, mes, caja, ver) -> dict:
+    # puntos de la vista; si son más de n, muestra estratificada por zonas
+    pts = capas.muestra_estratificada(load_puntos(capa, localidad, mes, caja), n)
+    estilo = {"color": "#d62728", "fillOpacity": 0.6}
+    return capas.puntos_geojson(pts, estilo)
+
+
+@st.cache_data(show_spinner=False, max_entries=VISTA_CACHE, ttl=VISTA_TTL)
+def capa_semaforos(n: int, caja, ver) -> dict:
+    # semáforos de la vista consultados en el índice espacial (cKDTree)
+    idx = load_indice()
+    pos = slice(None) if caja is None else idx.en_caja(caja)
+    sem = pd.DataFrame(idx.lonlat[pos], columns=["lon", "lat"])
+    sem = capas.muestra_estratificada(sem, n)
+    return capas.puntos_geojson(sem, {"color": "#ffbf00", "fillOpacity": 0.9})
+
+
+@st.cache_data(show_spinner=False)
+def capa_kde(capa: str, ver) -> dict:
+    kde = tabla(KDE_CONTORNOS, KDE_COLS, geo=True, compactar=False)
+    return capas.kde_geojson(kde, capa)
+
+
+@st.cache_data(show_spinner=False)
+def capa_franja(meses, dias, horas, ver) -> dict:
+    # suma del cubo en la franja (sin leer eventos) → grilla con el estilo de hotspots
+    conteos = capas.cubo_franja(load_cubo(), meses, dias, horas)
+    if conteos.empty:
+        return None
+    grid = load_celdas_cubo().merge(conteos, on="cell_id")
+    return capas.grid_geojson(grid)
+
+
+@st.cache_data(show_spinner=False)
+def capa_animacion(dim: str, meses, dias, horas, ver):
+    col, etiqueta, desplazamiento = ANIMAR[dim]
+    conteos = capas.cubo_franja(load_cubo(), meses, dias, horas, por=col)
+    if conteos.empty:
+        return None
+    conteos[col] += desplazamiento
+    return capas.animacion_geojson(load_celdas_cubo(), conteos, col, etiqueta)
+
+
+@st.cache_resource(show_spinner=False)
+def servidor_teselas():
+    # un servidor por proceso de Streamlit; con el puerto ocupado se asume el sidecar
+    # (python -m src.dashboard.teselas) ya corriendo
+    try:
+        return teselas.iniciar()
+    except ImportError:
+        return None
+    except OSError:
+        return teselas.URL
+
+
+verificar_archivos()
+kpi_g, kpi_loc = load_kpis()
+niveles = load_niveles()
+kde_capas = load_kde_capas()
 
 # ------------------------- Normalizaciones -------------------------
+# kpi_loc está en el caché compartido: se agrega la columna sobre una copia
 if "LOCALIDAD" in kpi_loc.columns:
-    kpi_loc["localidad_plot"] = kpi_loc["LOCALIDAD"].str.title()
+    kpi_loc = kpi_loc.assign(localidad_plot=kpi_loc["LOCALIDAD"].str.title())
 elif "localidad" in kpi_loc.columns:
-    kpi_loc["localidad_plot"] = kpi_loc["localidad"].astype(str).str.title()
+    kpi_loc = kpi_loc.assign(
+        localidad_plot=kpi_loc["localidad"].astype(str).str.title()
+    )
 else:
-    kpi_loc["localidad_plot"] = "Sin localidad"
+    kpi_loc = kpi_loc.assign(localidad_plot="Sin localidad")
 
 # ------------------------- Sidebar -------------------------
 st.sidebar.header("Filtros")
-show_heat_comp = st.sidebar.checkbox("Heatmap de comparendos", value=True)
+locs_map, meses_map = load_particiones()
+loc_map = st.sidebar.selectbox("Localidad (puntos del mapa)", ["(todas)"] + locs_map)
+mes_map = st.sidebar.selectbox("Mes (puntos del mapa)", ["(todos)"] + meses_map)
+loc_map = None if loc_map == "(todas)" else loc_map
+mes_map = None if mes_map == "(todos)" else mes_map
+if kde_capas:
+    kde_capa = st.sidebar.selectbox(
+        "Densidad KDE (contornos)",
+        ["(ninguna)"] + kde_capas,
+        index=1,
+    )
+else:
+    kde_capa = "(ninguna)"
+# con contornos KDE el HeatMap de todos los puntos queda como opción, no por defecto
+show_heat_comp = st.sidebar.checkbox("Heatmap de comparendos", value=not kde_capas)
 show_pts_sin = st.sidebar.checkbox("Puntos de siniestros (muestra)", value=True)
 show_sem = st.sidebar.checkbox("Semáforos", value=False)
+tiles_url = None
+if st.sidebar.checkbox(
+    "Teselas vectoriales (todos los datos)",
+    value=False,
+    help="Hotspots, siniestros y semáforos completos como teselas: el navegador "
+    "solo descarga lo que está a la vista.",
+):
+    tiles_url = servidor_teselas()
+    if tiles_url is None:
+        st.sidebar.warning(
+            "Requiere mapbox-vector-tile (pip install mapbox-vector-tile)"
+        )
 grid_opacity = st.sidebar.slider("Opacidad hotspots", 0.1, 0.9, 0.45, 0.05)
+if niveles:
+    grid_level = st.sidebar.select_slider(
+        "Resolución hotspots (m)",
+        options=niveles,
+        value=500 if 500 in niveles else niveles[len(niveles) // 2],
+    )
+    grid_label = f"Hotspots ({grid_level} m)"
+    grid_gi = GI.exists() and st.sidebar.checkbox("Significancia Gi* (colorear)", True)
+else:
+    grid_level, grid_gi = None, False
+    grid_label = "Hotspots (500 m)"
+
+# franja temporal: None = sin filtrar esa dimensión
+meses_sel = dias_sel = horas_sel = animar = None
+cubo = load_cubo()
+if cubo is not None:
+    st.sidebar.subheader("Tiempo (cubo espacio-tiempo)")
+    meses_cubo = sorted(m for m in cubo["mes"].unique().tolist() if m != SIN_DATO)
+    sel = st.sidebar.multiselect(
+        "Meses", meses_cubo, default=meses_cubo, format_func=lambda m: MESES[m - 1]
+    )
+    meses_sel = None if sel == meses_cubo else tuple(sel)
+    sel = st.sidebar.multiselect(
+        "Días", list(range(7)), default=list(range(7)), format_func=DIAS.__getitem__
+    )
+    dias_sel = None if len(sel) == 7 else tuple(sel)
+    h0, h1 = st.sidebar.slider("Horas", 0, 23, (0, 23))
+    horas_sel = None if (h0, h1) == (0, 23) else tuple(range(h0, h1 + 1))
+    animar = st.sidebar.selectbox("Animar hotspots por", ["(no)", *ANIMAR])
+    animar = None if animar == "(no)" else animar
+    if horas_sel is not None or animar == "hora":
+        st.sidebar.caption("Los eventos sin hora (p. ej. siniestros) quedan fuera.")
+    elif dias_sel is not None or animar == "día":
+        st.sidebar.caption("Los siniestros sin fecha (solo mes) quedan fuera.")
+franja = any(v is not None for v in (meses_sel, dias_sel, horas_sel))
+
 heat_radius = st.sidebar.slider("Radio heatmap", 3, 20, 8)
 heat_blur = st.sidebar.slider("Blur heatmap", 5, 30, 15)
-sample_sin = st.sidebar.slider("Muestra de siniestros (puntos)", 500, 5000, 2000, 100)
-sample_sem = st.sidebar.slider("Muestra de semáforos", 500, 8000, 2000, 100)
+sample_sin = st.sidebar.slider(
+    "Máx. siniestros en la vista (puntos)", 500, 5000, 2000, 100
+)
+sample_sem = st.sidebar.slider("Máx. semáforos en la vista", 500, 8000, 2000, 100)
+
+st.sidebar.subheader("Semáforos cerca de un punto")
+punto_txt = st.sidebar.text_input("Lat, lon", placeholder="4.6097, -74.0817")
+punto = None
+if punto_txt.strip():
+    try:
+        punto = tuple(float(v) for v in punto_txt.split(","))
+        assert len(punto) == 2
+    except (ValueError, AssertionError):
+        st.sidebar.warning("Formato esperado: lat, lon")
+        punto = None
+if punto is not None:
+    idx = load_indice()
+    xy = idx.proyectar([punto[1]], [punto[0]])
+    near_d, near_id = idx.k_nearest(xy, k=3)
+    for r in RADIOS:
+        st.sidebar.write(f"Semáforos a ≤ {r} m: **{int(idx.count_within(xy, r)[0])}**")
+    cercanos = (
+        pd.DataFrame({"ID": near_id[0], "dist_m": near_d[0].round(0)})
+        .merge(tabla(FILES["sem"], SEM_COLS), on="ID", how="left")
+        .query("ID >= 0")
+    )
+    st.sidebar.dataframe(cercanos[["ID", "DIRECCION", "dist_m"]], hide_index=True)
 
 # ------------------------- KPIs -------------------------
 st.title("Seguridad Vial Bogotá 2018 — ETL + Dashboard")
@@ -83,66 +426,139 @@ c4.metric(
 # ------------------------- Mapa -------------------------
 st.subheader("Mapa de hotspots y capas")
 
+# vista (caja y zoom) que reportó el mapa en la última interacción; las muestras de
+# puntos se consultan solo para esa caja
+vista = st.session_state.get("mapa") or {}
+caja = capas.caja_vista(vista.get("bounds"), vista.get("zoom"))
+centro = vista.get("center") or {}
+
 with st.container():
     m = folium.Map(location=[4.65, -74.1], zoom_start=11, tiles="CartoDB positron")
 
-    if show_heat_comp and {"lat", "lon"}.issubset(comp.columns):
-        HeatMap(
-            comp[["lat", "lon"]].dropna().values.tolist(),
-            radius=heat_radius,
-            blur=heat_blur,
-            name="Heatmap comparendos",
+    if show_heat_comp:
+        heat = HeatMap(
+            [], radius=heat_radius, blur=heat_blur, name="Heatmap comparendos"
+        )
+        heat.data = capa_heat(
+            "comp", loc_map, mes_map, version(FILES["comp"])
+        )  # ya validado y agregado
+        heat.add_to(m)
+
+    if kde_capa != "(ninguna)":
+        capas.CapaGeoJson(
+            capa_kde(kde_capa, version(KDE_CONTORNOS)),
+            name=f"KDE {kde_capa}",
+            tooltip=folium.GeoJsonTooltip(fields=["info"], labels=False),
         ).add_to(m)
 
-    if show_pts_sin and {"lat", "lon"}.issubset(sin.columns):
-        layer_sin = folium.FeatureGroup(name="Siniestros (muestra)", show=True)
-        for _, r in sin.sample(min(sample_sin, len(sin)), random_state=42).iterrows():
-            folium.CircleMarker(
-                [r["lat"], r["lon"]],
-                radius=2,
-                color="#d62728",
-                fill=True,
-                fill_opacity=0.6,
-            ).add_to(layer_sin)
-        layer_sin.add_to(m)
+    if tiles_url:
+        # todos los datos en teselas (cache en disco del servidor) en vez de muestras
+        capas_tiles = []
+        if not (franja or animar):
+            capas_tiles.append(("hotspots", f"{grid_label.split(' (')[0]} (teselas)"))
+        if show_pts_sin:
+            capas_tiles.append(("siniestros", "Siniestros (teselas)"))
+        if show_sem:
+            capas_tiles.append(("semaforos", "Semáforos (teselas)"))
+        for capa, nombre in capas_tiles:
+            VectorGridProtobuf(
+                f"{tiles_url}/{capa}/{{z}}/{{x}}/{{y}}.pbf",
+                nombre,
+                teselas.opciones_js(capa, grid_opacity, grid_gi),
+            ).add_to(m)
+
+    # capas que dependen de la vista: st_folium las reemplaza sin redibujar el mapa
+    capas_vista = []
+    if show_pts_sin and not tiles_url:
+        fg = folium.FeatureGroup(name="Siniestros (vista)")
+        capas.CapaGeoJson(
+            capa_muestra(
+                "sin", sample_sin, loc_map, mes_map, caja, version(FILES["sin"])
+            ),
+            marker=folium.CircleMarker(radius=2, fill=True),
+        ).add_to(fg)
+        capas_vista.append(fg)
+
+    if show_sem and not tiles_url:
+        fg = folium.FeatureGroup(name="Semáforos (vista)")
+        capas.CapaGeoJson(
+            capa_semaforos(sample_sem, caja, version(FILES["sem"])),
+            marker=folium.CircleMarker(radius=1.5, fill=True),
+        ).add_to(fg)
+        capas_vista.append(fg)
+
+    # estilo de cada celda ya en el GeoJSON; la opacidad del slider se aplica en JS
+    tooltip = ["comparendos", "siniestros", "score"]
+    alias = ["Comparendos", "Siniestros", "Score"]
+    if grid_gi:
+        tooltip, alias = tooltip + ["clase", "p_sim"], alias + ["Gi*", "p"]
+    # franja o animación: hotspots sumados del cubo espacio-tiempo
+    franja_sel = (meses_sel, dias_sel, horas_sel, version(CUBO))
+    anim = capa_animacion(animar, *franja_sel) if animar else None
+    celdas_franja = capa_franja(*franja_sel) if franja else None
+    if (animar and anim is None) or (franja and not animar and celdas_franja is None):
+        st.info("No hay eventos en la franja temporal elegida.")
+    if anim is not None:
+        fc, estilos, formato = anim
+        TimeSliderChoropleth(
+            fc,
+            estilos,
+            date_options=formato,
+            name=f"Hotspots por {animar} (cubo)",
+            stroke_color="#666666",
+            stroke_width=0.2,
+        ).add_to(m)
+    elif celdas_franja is not None and not animar:
+        capas.CapaGeoJson(
+            celdas_franja,
+            name="Hotspots en la franja (cubo)",
+            on_each_feature=capas.opacidad_js(grid_opacity),
+            tooltip=folium.GeoJsonTooltip(
+                fields=tooltip[:3], aliases=alias[:3], sticky=False
+            ),
+        ).add_to(m)
+    elif not (tiles_url or franja or animar):
+        capas.CapaGeoJson(
+            capa_grid(grid_level, grid_gi, version(FILES["grid"], PIRAMIDE, GI)),
+            name=f"{grid_label} — Gi*" if grid_gi else grid_label,
+            on_each_feature=capas.opacidad_js(grid_opacity),
+            tooltip=folium.GeoJsonTooltip(fields=tooltip, aliases=alias, sticky=False),
+        ).add_to(m)
 
-    if show_sem and {"lat", "lon"}.issubset(sem.columns):
-        layer_sem = folium.FeatureGroup(name="Semáforos (muestra)", show=True)
-        for _, r in sem.sample(min(sample_sem, len(sem)), random_state=42).iterrows():
+    if punto is not None:
+        layer_pt = folium.FeatureGroup(name="Semáforos cercanos", show=True)
+        folium.Marker(punto, tooltip="Punto consultado").add_to(layer_pt)
+        for r in RADIOS:
+            folium.Circle(
+                punto, radius=r, color="#444444", weight=1, fill=False
+            ).add_to(layer_pt)
+        for _, r in cercanos.iterrows():
             folium.CircleMarker(
                 [r["lat"], r["lon"]],
-                radius=1.5,
+                radius=5,
                 color="#ffbf00",
                 fill=True,
-                fill_opacity=0.9,
-            ).add_to(layer_sem)
-        layer_sem.add_to(m)
-
-    if "score" in grid.columns:
-        max_score = max(grid["score"].max(), 1)
-        grid_json = grid.copy()
-        folium.GeoJson(
-            grid_json.to_json(),
-            name="Hotspots (500 m)",
-            style_function=lambda x: {
-                "fillColor": "#000000",
-                "color": "#000000",
-                "weight": 0.2,
-                "fillOpacity": min(
-                    0.9,
-                    (x["properties"].get("score", 0) / max_score) * grid_opacity + 1e-6,
-                ),
-            },
-            highlight_function=lambda x: {"weight": 1, "color": "#666666"},
-            tooltip=folium.GeoJsonTooltip(
-                fields=["comparendos", "siniestros", "score"],
-                aliases=["Comparendos", "Siniestros", "Score"],
-                sticky=False,
-            ),
-        ).add_to(m)
-
-    folium.LayerControl(collapsed=False).add_to(m)
-    st_folium(m, height=640, width=None, returned_objects=[])
+                fill_opacity=1,
+                tooltip=f"{r['DIRECCION']} · {r['dist_m']:.0f} m",
+            ).add_to(layer_pt)
+        layer_pt.add_to(m)
+
+    salida = st_folium(
+        m,
+        key="mapa",
+        height=640,
+        width=None,
+        center=(centro["lat"], centro["lng"]) if centro else None,
+        zoom=vista.get("zoom"),
+        feature_group_to_add=capas_vista,
+        layer_control=folium.LayerControl(collapsed=False),
+        returned_objects=["bounds", "zoom", "center"],
+    )
+    # si la vista cambió después de armar las capas, se vuelven a pedir una vez
+    caja_nueva = capas.caja_vista(salida.get("bounds"), salida.get("zoom"))
+    if caja_nueva != caja and st.session_state.get("caja_pedida") != caja_nueva:
+        st.session_state["caja_pedida"] = caja_nueva
+        st.rerun()
 
 # ------------------------- Barras por localidad -------------------------
 st.subheader("Comparendos, siniestros y mortalidad por localidad (2018)")
@@ -203,32 +619,32 @@ with right:
 
 # ------------------------- Distancias a semáforos -------------------------
 st.subheader("Distribución de siniestros por distancia al semáforo más cercano")
-if "dist_bucket" in prox.columns:
-    map_labels = {
-        "0-100m": "0–100 m",
-        "100-300m": "100–300 m",
-        ">300m": ">300 m",
-        "SIN_COORD": "Sin coord.",
-    }
-    prox["_bucket_lbl"] = (
-        prox["dist_bucket"].map(map_labels).fillna(prox["dist_bucket"])
-    )
+hist = tabla(FILES["hist"], HIST_COLS)
+if not hist.empty:
+    # histograma pre-agregado por localidad (calc_proximidad_semaforos)
+    h = hist[(hist["dataset"] == "siniestros") & (hist["dist_bucket"] != "SIN_COORD")]
+    locs_h = sorted(h["LOCALIDAD"].dropna().unique().tolist())
+    loc_sel = st.selectbox("Localidad", ["Bogotá (todas)"] + locs_h)
+    if loc_sel != "Bogotá (todas)":
+        h = h[h["LOCALIDAD"] == loc_sel]
     dist_counts = (
-        prox["_bucket_lbl"]
-        .value_counts(normalize=True)
-        .rename("pct")
-        .mul(100)
-        .reset_index()
+        h.groupby("dist_bucket", observed=True)["n"].sum().rename("n").reset_index()
+    )
+    dist_counts["pct"] = dist_counts["n"] / max(dist_counts["n"].sum(), 1) * 100
+    dist_counts["bucket"] = (
+        dist_counts["dist_bucket"]
+        .astype(str)
+        .str.replace("-", "–")
+        .str.replace(r"m$", " m", regex=True)
     )
-    dist_counts.columns = ["bucket", "pct"]
 
     fig3 = px.bar(
-        dist_counts.sort_values("bucket"),
+        dist_counts,  # el categórico ya viene ordenado por distancia
         x="bucket",
         y="pct",
         text=dist_counts["pct"].map(lambda x: f"{x:.1f}%"),
         labels={"bucket": "Rango", "pct": "% siniestros"},
-        title="Siniestros por distancia al semáforo",
+        title=f"Siniestros por distancia al semáforo — {loc_sel}",
     )
     st.plotly_chart(fig3, use_container_width=True)
 
@@ -0,0 +1,331 @@
+# Uso: python -m src.dashboard.teselas   (o lo inicia el dashboard en un hilo)
+# Servidor local de teselas vectoriales (Mapbox Vector Tiles) para el mapa:
+#   /hotspots/{z}/{x}/{y}.pbf    celdas de la pirámide de agregacion_hex; el nivel
+#                                 (100 m … 2 km) se elige según el zoom
+#   /siniestros/{z}/{x}/{y}.pbf  eventos del almacén particionado (lectura con bbox)
+#   /semaforos/{z}/{x}/{y}.pbf   red semafórica
+# Con zoom bajo los puntos de cada tesela se agrupan en una grilla de BINS×BINS (un
+# punto por celda con su conteo `n`); desde TILES_Z_DETALLE van todos, uno por uno.
+# Cada tesela se genera una vez y se guarda en data/working/teselas/<capa>-<huella>/,
+# donde la huella es el sha256 de los archivos fuente: si cambian, se usa otra carpeta
+# y se borran las de huellas anteriores.
+# mapbox_vector_tile es opcional: solo lo necesita este módulo (pip install
+# mapbox-vector-tile).
+
+import os
+import re
+import glob
+import shutil
+import hashlib
+import threading
+import traceback
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+import pandas as pd
+import shapely
+
+from src.dashboard.capas import GI_COLORES, OPACIDAD_MAX
+from src.extract import almacen_eventos
+from src.transform.agregacion_hex import cell_polygons
+
+# rutas absolutas: el servidor corre también dentro del proceso de Streamlit
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+DATA = os.path.join(ROOT, "data")
+PIRAMIDE = f"{DATA}/analytics/hotspots_piramide.parquet"
+GI = f"{DATA}/analytics/hotspots_gi.parquet"
+EVENTOS_SIN = f"{DATA}/clean/eventos/siniestros"
+RAW_SEM = f"{DATA}/raw/semaforos/semaforos_raw.parquet"
+CACHE_DIR = f"{DATA}/working/teselas"
+
+HOST = os.getenv("TILES_HOST", "127.0.0.1")
+PORT = int(os.getenv("TILES_PORT", "8765"))
+# URL con la que el navegador llega al servidor (detrás de un proxy puede ser otra)
+URL = os.getenv("TILES_URL", f"http://localhost:{PORT}")
+Z_DETALLE = int(os.getenv("TILES_Z_DETALLE", "15"))
+EXTENT = 4096
+BUFFER = 64  # unidades de tesela alrededor del borde (evita cortes en los trazos)
+BINS = 256  # agrupación de puntos por tesela con zoom < Z_DETALLE
+PX_CELDA = 6  # tamaño mínimo en pantalla (px) de una celda de hotspots
+CAPAS = ("hotspots", "siniestros", "semaforos")
+
+R_TIERRA = 6378137.0
+ORIGEN = np.pi * R_TIERRA  # 20037508.34 m
+_VERSION = 1
+_RUTA = re.compile(r"^/(\w+)/(\d+)/(\d+)/(\d+)\.pbf$")
+
+
+def _sha(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def mercator(lon, lat):
+    """lon/lat (4326) → x/y en EPSG:3857 (esfera), en bloque."""
+    lon, lat = np.asarray(lon, dtype=float), np.asarray(lat, dtype=float)
+    x = R_TIERRA * np.radians(lon)
+    y = R_TIERRA * np.log(np.tan(np.pi / 4 + np.radians(lat) / 2))
+    return x, y
+
+
+def tile_bounds(z: int, x: int, y: int):
+    """(xmin, ymin, xmax, ymax) de la tesela en EPSG:3857."""
+    size = 2 * ORIGEN / 2**z
+    xmin = -ORIGEN + x * size
+    ymax = ORIGEN - y * size
+    return xmin, ymax - size, xmin + size, ymax
+
+
+def _lonlat(xmin, ymin, xmax, ymax):
+    lon = np.degrees(np.array([xmin, xmax]) / R_TIERRA)
+    lat = np.degrees(
+        2 * np.arctan(np.exp(np.array([ymin, ymax]) / R_TIERRA)) - np.pi / 2
+    )
+    return lon[0], lat[0], lon[1], lat[1]
+
+
+class Fuente:
+    """Datos de una capa + huella de sus archivos; se recarga si cambian."""
+
+    def __init__(self, capa: str):
+        self.capa = capa
+        self._stamp = None
+        self._lock = threading.Lock()
+
+    def archivos(self):
+        if self.capa == "hotspots":
+            return [p for p in (PIRAMIDE, GI) if os.path.exists(p)]
+        if self.capa == "siniestros":
+            return [f"{EVENTOS_SIN}/_metadata"]
+        return [RAW_SEM]
+
+    def actual(self):
+        paths = self.archivos()
+        stamp = [(p, os.stat(p).st_mtime_ns) for p in paths]
+        with self._lock:
+            if stamp != self._stamp:
+                h = hashlib.sha256(f"v{_VERSION}".encode())
+                for p in paths:
+                    h.update(_sha(p).encode())
+                self.huella = h.hexdigest()[:16]
+                self.datos = self._cargar()
+                self._stamp = stamp
+                self._podar()
+            return self
+
+    def _podar(self):
+        # teselas de huellas anteriores (de esta corrida o de otras): ya no se sirven
+        actual = f"{CACHE_DIR}/{self.capa}-{self.huella}"
+        for d in glob.glob(f"{CACHE_DIR}/{self.capa}-*"):
+            if d != actual:
+                shutil.rmtree(d, ignore_errors=True)
+
+    def _cargar(self):
+        if self.capa == "hotspots":
+            pyr = pd.read_parquet(PIRAMIDE)
+            pyr["w"] = pyr["score"] / pyr.groupby("level")["score"].transform("max")
+            pyr["color"], pyr["sig"] = "#000000", 0
+            if os.path.exists(GI):
+                gi = pd.read_parquet(GI, columns=["level", "cell_id", "clase"])
+                pyr = pyr.merge(gi, on=["level", "cell_id"], how="left")
+                pyr["clase"] = pyr["clase"].fillna("no significativo")
+                pyr["color"] = pyr["clase"].map(GI_COLORES).fillna("#000000")
+                pyr["sig"] = pyr["clase"].isin(list(GI_COLORES)).astype(int)
+            return {int(lv): g for lv, g in pyr.groupby("level")}
+        if self.capa == "siniestros":
+            return almacen_eventos.abrir(EVENTOS_SIN)
+        sem = pd.read_parquet(RAW_SEM, columns=["lon", "lat"]).dropna()
+        return np.c_[mercator(sem["lon"], sem["lat"])]
+
+
+# ---------------------------- geometría por tesela ----------------------------
+def _a_tesela(b):
+    # 3857 → coordenadas de tesela (0..EXTENT, y hacia arriba)
+    k = EXTENT / (b[2] - b[0])
+    return lambda xy: (xy - [b[0], b[1]]) * k
+
+
+def _puntos(xy: np.ndarray, b, z: int) -> list:
+    pad = BUFFER * (b[2] - b[0]) / EXTENT
+    m = (
+        (xy[:, 0] >= b[0] - pad)
+        & (xy[:, 0] <= b[2] + pad)
+        & (xy[:, 1] >= b[1] - pad)
+        & (xy[:, 1] <= b[3] + pad)
+    )
+    t = _a_tesela(b)(xy[m])
+    if z < Z_DETALLE and len(t):
+        # un punto por celda de la grilla BINS×BINS, en su centroide, con el conteo
+        paso = EXTENT / BINS
+        celdas, inv, n = np.unique(
+            np.floor(t / paso).astype(np.int64),
+            axis=0,
+            return_inverse=True,
+            return_counts=True,
+        )
+        suma = np.zeros((len(celdas), 2))
+        np.add.at(suma, inv.ravel(), t)
+        t = suma / n[:, None]
+    else:
+        n = np.ones(len(t), np.int64)
+    geoms = shapely.points(np.rint(t))
+    return [
+        {"geometry": g, "properties": {"n": int(k)}} for g, k in zip(geoms, n.tolist())
+    ]
+
+
+def _nivel(niveles, z: int) -> int:
+    # la celda más fina que mide al menos PX_CELDA píxeles a este zoom (en Bogotá)
+    m_px = 2 * ORIGEN / (256 * 2**z) * np.cos(np.radians(4.6))
+    ok = [lv for lv in sorted(niveles) if lv >= PX_CELDA * m_px]
+    return ok[0] if ok else max(niveles)
+
+
+def _celdas(niveles: dict, b, z: int) -> list:
+    lv = _nivel(niveles, z)
+    c = niveles[lv]
+    # las celdas cuadradas de 3857 cubren [i·lv, (i+1)·lv]
+    i0, i1 = np.floor(b[0] / lv) - 1, np.floor(b[2] / lv)
+    j0, j1 = np.floor(b[1] / lv) - 1, np.floor(b[3] / lv)
+    c = c[(c["i"] >= i0) & (c["i"] <= i1) & (c["j"] >= j0) & (c["j"] <= j1)]
+    if c.empty:
+        return []
+    geoms = cell_polygons(c["i"], c["j"], lv, "square")
+    geoms = shapely.transform(geoms, _a_tesela(b))
+    geoms = shapely.clip_by_rect(
+        geoms, -BUFFER, -BUFFER, EXTENT + BUFFER, EXTENT + BUFFER
+    )
+    cols = ["comparendos", "siniestros", "score", "w", "color", "sig"]
+    props = c[cols].assign(level=lv)
+    if "clase" in c.columns:
+        props["clase"] = c["clase"]
+    return [
+        {"geometry": g, "properties": p}
+        for g, p in zip(geoms, props.to_dict("records"))
+        if not g.is_empty
+    ]
+
+
+def generar(fuente: Fuente, z: int, x: int, y: int) -> bytes:
+    import mapbox_vector_tile
+
+    b = tile_bounds(z, x, y)
+    if fuente.capa == "hotspots":
+        feats = _celdas(fuente.datos, b, z)
+    elif fuente.capa == "siniestros":
+        pad = BUFFER * (b[2] - b[0]) / EXTENT
+        caja = _lonlat(b[0] - pad, b[1] - pad, b[2] + pad, b[3] + pad)
+        # filtro empujado al almacén: solo los row groups que tocan la tesela
+        t = fuente.datos.to_table(
+            columns=["lon", "lat"], filter=almacen_eventos.filtro(bbox=caja)
+        )
+        xy = np.c_[mercator(t["lon"].to_numpy(), t["lat"].to_numpy())]
+        feats = _puntos(xy, b, z)
+    else:
+        feats = _puntos(fuente.datos, b, z)
+    if not feats:
+        return b""
+    return mapbox_vector_tile.encode(
+        [{"name": fuente.capa, "features": feats}],
+        default_options={"extents": EXTENT},
+    )
+
+
+def tesela(fuentes: dict, capa: str, z: int, x: int, y: int) -> bytes:
+    """Tesela desde el cache en disco; si no está, se genera y se guarda."""
+    fuente = fuentes[capa].actual()
+    path = f"{CACHE_DIR}/{capa}-{fuente.huella}/{z}/{x}/{y}.pbf"
+    try:
+        with open(path, "rb") as f:
+            return f.read()
+    except FileNotFoundError:
+        pass
+    data = generar(fuente, z, x, y)
+    tmp = f"{path}.{threading.get_ident()}.tmp"
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)  # varias peticiones de la misma tesela: gana cualquiera
+    except OSError:
+        pass  # carpeta podada mientras tanto (la fuente cambió): se sirve sin guardar
+    return data
+
+
+def opciones_js(capa: str, opacidad=0.45, con_gi=False) -> str:
+    """Opciones de L.vectorGrid.protobuf (JS) con el estilo de la capa."""
+    if capa == "hotspots" and con_gi:
+        estilo = f"{{fill: true, fillColor: p.color, fillOpacity: p.sig * {opacidad}, color: '#666666', weight: 0.2}}"
+    elif capa == "hotspots":
+        estilo = f"{{fill: true, fillColor: '#000000', fillOpacity: Math.min({OPACIDAD_MAX}, p.w * {opacidad} + 1e-6), color: '#000000', weight: 0.2}}"
+    else:
+        color, alfa = ("#d62728", 0.6) if capa == "siniestros" else ("#ffbf00", 0.9)
+        # puntos agrupados: el radio crece con el conteo de la celda
+        estilo = f"{{radius: Math.min(8, 1.5 + Math.log2(p.n)), fill: true, fillColor: '{color}', fillOpacity: {alfa}, stroke: false}}"
+    return (
+        "{rendererFactory: L.canvas.tile, maxNativeZoom: 18, "
+        f"vectorTileLayerStyles: {{{capa}: function(p) {{ return {estilo}; }}}}}}"
+    )
+
+
+# ---------------------------- servidor HTTP ----------------------------
+def _handler(fuentes: dict):
+    class Teselas(BaseHTTPRequestHandler):
+        def do_GET(self):
+            m = _RUTA.match(self.path.split("?")[0])
+            if not m or m.group(1) not in fuentes:
+                self.send_error(404)
+                return
+            try:
+                data = tesela(fuentes, m.group(1), *map(int, m.groups()[1:]))
+            except FileNotFoundError:  # capa sin datos todavía
+                self.send_error(404)
+                return
+            except Exception as e:
+                # error al leer o generar: respuesta 500 en vez de cortar la conexión
+                traceback.print_exc()
+                self.send_error(500, explain=f"{type(e).__name__}: {e}")
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", "application/vnd.mapbox-vector-tile")
+            self.send_header("Access-Control-Allow-Origin", "*")
+            self.send_header("Cache-Control", "max-age=3600")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, *args):
+            pass  # sin una línea por tesela en la consola
+
+    return Teselas
+
+
+def servidor(host=HOST, port=PORT) -> ThreadingHTTPServer:
+    import mapbox_vector_tile  # noqa: F401  (falla aquí y no en cada tesela)
+
+    fuentes = {c: Fuente(c) for c in CAPAS}
+    srv = ThreadingHTTPServer((host, port), _handler(fuentes))
+    srv.daemon_threads = True
+    return srv
+
+
+def iniciar(host=HOST, port=PORT) -> str:
+    """Servidor en un hilo de fondo del proceso actual (el de Streamlit); devuelve URL."""
+    srv = servidor(host, port)
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    return URL
+
+
+def main():
+    srv = servidor()
+    print(
+        f"Teselas en {URL}/{{capa}}/{{z}}/{{x}}/{{y}}.pbf (capas: {', '.join(CAPAS)})"
+    )
+    srv.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,187 @@
+# Almacén particionado de eventos (comparendos / siniestros) para lecturas parciales.
+# Dataset Hive en data/clean/eventos/<nombre>/LOCALIDAD_JOIN=<loc>/MES=<aaaa-mm>/ con
+# las filas de cada partición ordenadas por código Z (Morton) de lon/lat, así cada row
+# group cubre una zona compacta y sus estadísticas min/max de lat/lon son ajustadas.
+# Un _metadata por dataset reúne los footers de todos los archivos: abrirlo no lista
+# directorios ni lee footers, y los filtros (localidad, mes, caja lon/lat) se empujan a
+# pyarrow, que descarta particiones completas y luego row groups por estadísticas.
+# Los archivos no llevan geometría: lat/lon cumplen el papel de la columna bbox.
+# MES va en hora de Bogotá (FECHA_HORA de ArcGIS viene en UTC); los siniestros sin
+# fecha toman el mes de mes_procesado, igual que el cubo espacio-tiempo.
+
+import os
+import shutil
+import operator
+from functools import reduce
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+STORE_DIR = "data/clean/eventos"
+ROW_GROUP = int(os.getenv("EVENTOS_ROW_GROUP", "16384"))
+LOC_COL = "LOCALIDAD_JOIN"
+MES_COL = "MES"
+ZONA = "America/Bogota"
+# columna de fecha según la fuente → zona en que viene (None = ya en hora local):
+# comparendos (ArcGIS, epoch en UTC) / siniestros (anuario, solo día)
+FECHAS = {"FECHA_HORA": "UTC", "fecha": None, "fechaocurrencia": None}
+# nombre del mes en el anuario de siniestros; está aunque falte la fecha
+MES_RESPALDO = "mes_procesado"
+MESES = {
+    m: k + 1
+    for k, m in enumerate(
+        "ENERO FEBRERO MARZO ABRIL MAYO JUNIO JULIO AGOSTO SEPTIEMBRE OCTUBRE "
+        "NOVIEMBRE DICIEMBRE".split()
+    )
+}
+MESES["SETIEMBRE"] = 9
+
+PARTICION = ds.partitioning(
+    pa.schema([(LOC_COL, pa.string()), (MES_COL, pa.string())]), flavor="hive"
+)
+Z_BITS = 16  # por eje: celdas de ~1 m sobre la extensión de Bogotá
+
+
+def _separar(v: np.ndarray) -> np.ndarray:
+    # intercala ceros entre los 16 bits bajos (xxxx → 0x0x0x0x)
+    v = v.astype(np.uint32)
+    v = (v | (v << 8)) & 0x00FF00FF
+    v = (v | (v << 4)) & 0x0F0F0F0F
+    v = (v | (v << 2)) & 0x33333333
+    v = (v | (v << 1)) & 0x55555555
+    return v
+
+
+def zorder(lon, lat, bounds=None) -> np.ndarray:
+    """Código Morton de lon/lat cuantizados a Z_BITS sobre `bounds` (o su extensión)."""
+    x, y = np.asarray(lon, dtype=float), np.asarray(lat, dtype=float)
+    if len(x) == 0:
+        return np.zeros(0, np.uint32)
+    xmin, ymin, xmax, ymax = bounds or (x.min(), y.min(), x.max(), y.max())
+    top = (1 << Z_BITS) - 1
+    qx = np.clip((x - xmin) / max(xmax - xmin, 1e-12) * top, 0, top)
+    qy = np.clip((y - ymin) / max(ymax - ymin, 1e-12) * top, 0, top)
+    return _separar(qx) | (_separar(qy) << 1)
+
+
+def fecha_local(df: pd.DataFrame) -> pd.Series:
+    """Fecha en hora de Bogotá (sin zona) de la primera columna de FECHAS presente."""
+    col = next((c for c in FECHAS if c in df.columns), None)
+    if col is None:
+        return pd.Series(pd.NaT, index=df.index, dtype="datetime64[ns]")
+    f = pd.to_datetime(df[col], errors="coerce")
+    if f.dt.tz is None and FECHAS[col] is not None:
+        f = f.dt.tz_localize(FECHAS[col])
+    if f.dt.tz is not None:
+        f = f.dt.tz_convert(ZONA).dt.tz_localize(None)
+    return f
+
+
+def mes_respaldo(df: pd.DataFrame) -> pd.Series:
+    """Mes 1-12 (Int16) desde mes_procesado; <NA> si no hay."""
+    if MES_RESPALDO not in df.columns:
+        return pd.Series(pd.NA, index=df.index, dtype="Int16")
+    nombre = df[MES_RESPALDO].astype("string").str.strip().str.upper()
+    return nombre.map(MESES).astype("Int16")
+
+
+def _mes(df: pd.DataFrame) -> pd.Series:
+    f = fecha_local(df)
+    mes = f.dt.strftime("%Y-%m").astype("string")  # NaT → <NA> (partición nula)
+    # sin fecha: mes de mes_procesado con el año más frecuente de las filas fechadas
+    # (cada fuente es de un solo año)
+    faltan = mes.isna()
+    if faltan.any() and f.notna().any():
+        anio = int(f.dt.year.mode().iloc[0])
+        m = mes_respaldo(df)[faltan]
+        mes[faltan] = (f"{anio}-" + m.astype("string").str.zfill(2)).where(m.notna())
+    return mes
+
+
+def escribir(df: pd.DataFrame, root, row_group=ROW_GROUP) -> int:
+    """Escribe `df` (con lat/lon y LOCALIDAD_JOIN) como dataset particionado en `root`."""
+    t = pd.DataFrame(df.drop(columns=["geometry", "bbox"], errors="ignore"))
+    t[LOC_COL] = t[LOC_COL].astype("string")
+    t[MES_COL] = _mes(t)
+    # partición → orden Z dentro de la partición (el escritor conserva el orden)
+    key = zorder(t["lon"], t["lat"])
+    orden = np.lexsort((key, t[MES_COL].fillna(""), t[LOC_COL].fillna("")))
+    tabla = pa.Table.from_pandas(t.iloc[orden], preserve_index=False)
+
+    tmp = f"{root}.tmp"
+    shutil.rmtree(tmp, ignore_errors=True)
+    footers = []
+
+    def _visita(f):
+        md = f.metadata
+        md.set_file_path(os.path.relpath(f.path, tmp))
+        footers.append(md)
+
+    ds.write_dataset(
+        tabla,
+        tmp,
+        format="parquet",
+        partitioning=PARTICION,
+        basename_template="part-{i}.parquet",
+        file_options=ds.ParquetFileFormat().make_write_options(compression="zstd"),
+        max_rows_per_group=row_group,
+        min_rows_per_group=min(row_group, 1024),
+        max_partitions=4096,
+        preserve_order=True,
+        use_threads=False,  # orden de archivos y row groups reproducible
+        file_visitor=_visita,
+    )
+    esquema = tabla.schema.remove_metadata()
+    for c in (LOC_COL, MES_COL):
+        esquema = esquema.remove(esquema.get_field_index(c))
+    os.makedirs(tmp, exist_ok=True)
+    # footers en orden de ruta: el _metadata no depende del orden de escritura
+    footers.sort(key=lambda md: md.row_group(0).column(0).file_path)
+    pq.write_metadata(esquema, f"{tmp}/_metadata", metadata_collector=footers)
+    shutil.rmtree(root, ignore_errors=True)
+    os.replace(tmp, root)
+    return len(footers)
+
+
+def abrir(root) -> ds.Dataset:
+    # el _metadata trae rutas y estadísticas de todos los row groups
+    return ds.parquet_dataset(f"{root}/_metadata", partitioning=PARTICION)
+
+
+def filtro(localidades=None, meses=None, bbox=None):
+    """Expresión pyarrow para localidades, meses ("aaaa-mm") y caja (xmin, ymin, xmax, ymax)."""
+    conds = []
+    if localidades is not None:
+        conds.append(pc.field(LOC_COL).isin(list(localidades)))
+    if meses is not None:
+        conds.append(pc.field(MES_COL).isin(list(meses)))
+    if bbox is not None:
+        xmin, ymin, xmax, ymax = bbox
+        conds += [
+            pc.field("lon") >= xmin,
+            pc.field("lon") <= xmax,
+            pc.field("lat") >= ymin,
+            pc.field("lat") <= ymax,
+        ]
+    return reduce(operator.and_, conds) if conds else None
+
+
+def leer(root, columns=None, localidades=None, meses=None, bbox=None) -> pd.DataFrame:
+    """Solo las particiones y row groups que pueden cumplir el filtro."""
+    f = filtro(localidades, meses, bbox)
+    return abrir(root).to_table(columns=columns, filter=f).to_pandas()
+
+
+def conteos(root) -> pd.DataFrame:
+    """Eventos por (LOCALIDAD_JOIN, MES) desde los footers, sin leer datos."""
+    filas = []
+    for frag in abrir(root).get_fragments():
+        keys = ds.get_partition_keys(frag.partition_expression)
+        n = sum(rg.num_rows for rg in frag.row_groups)
+        filas.append((keys.get(LOC_COL), keys.get(MES_COL), n))
+    n = pd.DataFrame(filas, columns=[LOC_COL, MES_COL, "n"])
+    return n.groupby([LOC_COL, MES_COL], dropna=False, as_index=False)["n"].sum()
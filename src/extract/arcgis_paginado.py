@@ -0,0 +1,225 @@
+# Motor de paginación compartido para capas ArcGIS REST (FeatureServer / MapServer).
+# 1) pregunta a la capa su conteo y campo OBJECTID, 2) descarga páginas en paralelo sobre
+# una sesión HTTP con pool + reintentos/backoff, 3) guarda cada página como checkpoint en
+# data/working/arcgis/<nombre>/ para reanudar si el proceso se cae a mitad de extracción.
+# Cada página se valida contra el conteo de la capa: solo se guarda (y se entrega) si
+# trae todas sus filas, así que la suma de las páginas es exactamente el conteo pedido.
+# Las páginas se entregan como tablas columnares (pyarrow), en orden de offset, listas
+# para escribirse una a una con src/extract/parquet_stream.py.
+
+import os
+import json
+import shutil
+import itertools
+import concurrent.futures
+
+import requests
+import pyarrow as pa
+import pyarrow.parquet as pq
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from tqdm import tqdm
+
+WORK_DIR = "data/working/arcgis"
+
+# tipos de campo ArcGIS → tipos Arrow (los no listados, p. ej. geometría/blob, se omiten)
+ESRI_TYPES = {
+    "esriFieldTypeOID": pa.int64(),
+    "esriFieldTypeSmallInteger": pa.int64(),
+    "esriFieldTypeInteger": pa.int64(),
+    "esriFieldTypeBigInteger": pa.int64(),
+    "esriFieldTypeSingle": pa.float64(),
+    "esriFieldTypeDouble": pa.float64(),
+    "esriFieldTypeString": pa.string(),
+    "esriFieldTypeGUID": pa.string(),
+    "esriFieldTypeGlobalID": pa.string(),
+    "esriFieldTypeDate": pa.timestamp("ms"),
+}
+
+
+def make_session(pool_size=8, retries=5, backoff=0.5) -> requests.Session:
+    retry = Retry(
+        total=retries,
+        backoff_factor=backoff,
+        status_forcelist=(429, 500, 502, 503, 504),
+        allowed_methods=("GET",),
+    )
+    adapter = HTTPAdapter(
+        pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry
+    )
+    s = requests.Session()
+    s.mount("http://", adapter)
+    s.mount("https://", adapter)
+    return s
+
+
+def _get_json(session, url, params, timeout=60):
+    r = session.get(url, params=params, timeout=timeout)
+    r.raise_for_status()
+    data = r.json()
+    # ArcGIS responde errores con HTTP 200 y {"error": {...}}
+    if "error" in data:
+        raise requests.HTTPError(f"ArcGIS {url}: {data['error']}")
+    return data
+
+
+def layer_info(url, session, where="1=1") -> dict:
+    """Conteo de registros, campo OBJECTID, maxRecordCount y campos declarados de la capa."""
+    meta = _get_json(session, url.rsplit("/query", 1)[0], {"f": "json"})
+    fields = meta.get("fields") or []
+    oid = meta.get("objectIdField") or next(
+        (f["name"] for f in fields if f.get("type") == "esriFieldTypeOID"), None
+    )
+    count = _get_json(
+        session, url, {"where": where, "returnCountOnly": "true", "f": "json"}
+    ).get("count", 0)
+    return {
+        "count": int(count),
+        "oid_field": oid,
+        "max_record_count": meta.get("maxRecordCount"),
+        "fields": fields,
+    }
+
+
+def arrow_schema(fields) -> pa.Schema:
+    """Esquema fijo a partir de los campos declarados por la capa, más lon/lat."""
+    cols = [
+        pa.field(f["name"], ESRI_TYPES[f.get("type")])
+        for f in fields
+        if f.get("type") in ESRI_TYPES and f["name"] not in ("lon", "lat")
+    ]
+    return pa.schema(
+        cols + [pa.field("lon", pa.float64()), pa.field("lat", pa.float64())]
+    )
+
+
+def layer_schema(url) -> pa.Schema:
+    return arrow_schema(layer_info(url, make_session(pool_size=1))["fields"])
+
+
+def _page_table(feats) -> pa.Table:
+    # features ArcGIS → columnas (atributos + lon/lat de la geometría)
+    attrs = [f.get("attributes") or {} for f in feats]
+    geoms = [f.get("geometry") or {} for f in feats]
+    names = list(dict.fromkeys(k for a in attrs for k in a))
+    cols = {k: [a.get(k) for a in attrs] for k in names}
+    cols["lon"] = [g.get("x") for g in geoms]
+    cols["lat"] = [g.get("y") for g in geoms]
+    return pa.table(cols)
+
+
+class _Checkpoints:
+    def __init__(self, name, manifest, resume=True):
+        self.dir = os.path.join(WORK_DIR, name)
+        man_fn = os.path.join(self.dir, "_manifest.json")
+        old = None
+        if resume and os.path.exists(man_fn):
+            with open(man_fn, "r", encoding="utf-8") as f:
+                old = json.load(f)
+        # si cambian los parámetros de la consulta, los checkpoints no sirven
+        if old != manifest:
+            shutil.rmtree(self.dir, ignore_errors=True)
+            os.makedirs(self.dir, exist_ok=True)
+            with open(man_fn, "w", encoding="utf-8") as f:
+                json.dump(manifest, f)
+
+    def _fn(self, offset):
+        return os.path.join(self.dir, f"page_{offset:09d}.parquet")
+
+    def load(self, offset):
+        fn = self._fn(offset)
+        return pq.read_table(fn) if os.path.exists(fn) else None
+
+    def save(self, offset, table):
+        fn = self._fn(offset)
+        pq.write_table(table, fn + ".tmp")
+        os.replace(fn + ".tmp", fn)  # atómico: nunca queda una página a medias
+
+
+def iter_pages(
+    url,
+    name,
+    limit=None,
+    page=2000,
+    max_workers=8,
+    where="1=1",
+    out_fields="*",
+    extra_params=None,
+    resume=True,
+    desc=None,
+):
+    """Genera una pa.Table por página, en orden de offset. Reanuda desde los checkpoints."""
+    session = make_session(pool_size=max_workers)
+    info = layer_info(url, session, where=where)
+    total = min(info["count"], limit) if limit else info["count"]
+    if info["max_record_count"]:
+        page = min(page, int(info["max_record_count"]))
+
+    base = {
+        "where": where,
+        "outFields": out_fields,
+        "outSR": 4326,
+        "f": "json",
+        "returnGeometry": "true",
+        "resultRecordCount": page,
+        **(extra_params or {}),
+    }
+    # orden estable por OBJECTID: sin esto, los offsets en paralelo pueden solaparse
+    if info["oid_field"]:
+        base["orderByFields"] = f"{info['oid_field']} ASC"
+
+    ckpt = _Checkpoints(
+        name, {"url": url, "params": base, "total": total}, resume=resume
+    )
+
+    def _fetch(offset, n):
+        # el servidor puede cortar la página antes de `page` filas (maxRecordCount menor
+        # que el declarado, exceededTransferLimit): se pide el resto desde donde quedó
+        partes, got = [], 0
+        while got < n:
+            data = _get_json(
+                session,
+                url,
+                {**base, "resultOffset": offset + got, "resultRecordCount": n - got},
+            )
+            feats = data.get("features", [])[: n - got]
+            if not feats:
+                raise ValueError(
+                    f"ArcGIS {url}: página en offset {offset} con {got} de {n} filas "
+                    f"(la capa anunció {info['count']})"
+                )
+            partes.append(_page_table(feats))
+            got += len(feats)
+        return pa.concat_tables(partes, promote_options="permissive")
+
+    def _load_or_fetch(offset):
+        n = min(page, total - offset)
+        t = ckpt.load(offset)
+        # un checkpoint incompleto no sirve: se vuelve a pedir
+        if t is None or t.num_rows != n:
+            t = _fetch(offset, n)
+            ckpt.save(offset, t)
+        return t
+
+    offsets = list(range(0, total, page))
+    todo = iter(offsets)
+    # ventana acotada de páginas en vuelo → memoria acotada aunque la capa sea enorme
+    window = max_workers * 2
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as ex, tqdm(
+        desc=desc or name, total=total
+    ) as pbar:
+        pending = {
+            o: ex.submit(_load_or_fetch, o) for o in itertools.islice(todo, window)
+        }
+        for offset in offsets:
+            table = pending.pop(offset).result()
+            nxt = next(todo, None)
+            if nxt is not None:
+                pending[nxt] = ex.submit(_load_or_fetch, nxt)
+            pbar.update(table.num_rows)
+            if table.num_rows:
+                yield table
+
+
+def clear_checkpoints(name):
+    shutil.rmtree(os.path.join(WORK_DIR, name), ignore_errors=True)
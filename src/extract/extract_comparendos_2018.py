@@ -1,52 +1,47 @@
 # Uso: python -m src.extract.extract_comparendos
-import os, requests
-import pandas as pd
-from tqdm import tqdm
+import os
+import pyarrow.compute as pc
+
+from src.extract.arcgis_paginado import iter_pages, layer_schema, clear_checkpoints
+from src.extract.parquet_stream import ParquetStream
 
 RAW = "data/raw"
 os.makedirs(RAW, exist_ok=True)
 
+NAME = "comparendos_2018"
 BASE = "https://services2.arcgis.com/NEwhEo9GGSHXcRXV/arcgis/rest/services/ComparendosDEI2018/FeatureServer/0/query"
-
-
-def fetch(limit=200000, page=2000):
-    out, offset = [], 0
-    with tqdm(desc="comparendos 2018", total=limit) as pbar:
-        while offset < limit:
-            params = {
-                "where": "1=1",
-                "outFields": "*",
-                "outSR": 4326,
-                "f": "json",
-                "resultOffset": offset,
-                "resultRecordCount": page,
-                "returnGeometry": "true",
-            }
-            r = requests.get(BASE, params=params, timeout=60)
-            r.raise_for_status()
-            feats = r.json().get("features", [])
-            if not feats:
-                break
-            for f in feats:
-                a = f.get("attributes", {})
-                g = f.get("geometry") or {}
-                a["lon"], a["lat"] = g.get("x"), g.get("y")
-                out.append(a)
-            offset += len(feats)
-            pbar.update(len(feats))
-            if len(feats) < page:
-                break
-    return pd.DataFrame(out)
+OUT = f"{RAW}/comparendos_2018.parquet"
+
+INPUTS = []
+OUTPUTS = [OUT]
+
+
+def fetch(out_path=OUT, limit=200000, page=2000, max_workers=8):
+    # páginas en paralelo + checkpoints (ver src/extract/arcgis_paginado.py);
+    # cada página se escribe como row group → memoria acotada a una página
+    schema = layer_schema(BASE)  # FECHA_HORA (esriFieldTypeDate) → timestamp[ms]
+    with ParquetStream(out_path, schema) as sink:
+        for table in iter_pages(
+            BASE,
+            NAME,
+            limit=limit,
+            page=page,
+            max_workers=max_workers,
+            desc="comparendos 2018",
+        ):
+            # Buenas prácticas: solo registros con coordenadas
+            sink.write(
+                table.filter(
+                    pc.and_(pc.is_valid(table["lat"]), pc.is_valid(table["lon"]))
+                )
+            )
+    return sink.rows
 
 
 def main():
-    df = fetch()
-    # Buenas prácticas: tipos y fechas consistentes
-    if "FECHA_HORA" in df.columns:
-        df["FECHA_HORA"] = pd.to_datetime(df["FECHA_HORA"], unit="ms", errors="coerce")
-    df = df.dropna(subset=["lat", "lon"])
-    df.to_parquet(f"{RAW}/comparendos_2018.parquet", index=False)
-    print("OK:", len(df), "rows → data/raw/comparendos_2018.parquet")
+    n = fetch()
+    clear_checkpoints(NAME)
+    print("OK:", n, "rows → data/raw/comparendos_2018.parquet")
 
 
 if __name__ == "__main__":
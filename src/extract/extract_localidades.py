@@ -1,15 +1,22 @@
 # Uso: python -m src.extract.extract_localidades
-# Descarga/lee el GeoJSON de Localidades desde datosabiertos, normaliza nombre y CRS, y guarda en data/raw/localidades/.
+# Descarga/lee el GeoJSON de Localidades desde datosabiertos, normaliza nombre y CRS, y guarda en data/raw/localidades/
+# como GeoParquet (la descarga cruda queda en loca.json).
 
 import os
 import requests
 import geopandas as gpd
 
+from src.extract.geoparquet import write_geoparquet
+
 RAW_DIR = "data/raw/localidades"
 os.makedirs(RAW_DIR, exist_ok=True)
 
 URL = "https://datosabiertos.bogota.gov.co/dataset/856cb657-8ca3-4ee8-857f-37211173b1f8/resource/497b8756-0927-4aee-8da9-ca4e32ca3a8a/download/loca.json"
-OUT_PATH = os.path.join(RAW_DIR, "localidades.geojson")
+RAW_JSON = os.path.join(RAW_DIR, "loca.json")
+OUT_PATH = os.path.join(RAW_DIR, "localidades.parquet")
+
+INPUTS = []
+OUTPUTS = [OUT_PATH]
 
 def _detect_name_col(cols):
     cands = [c for c in cols if str(c).lower() in (
@@ -21,10 +28,10 @@ def main():
     # descarga cruda a disco (más reproducible)
     r = requests.get(URL, timeout=90)
     r.raise_for_status()
-    with open(OUT_PATH, "wb") as f:
+    with open(RAW_JSON, "wb") as f:
         f.write(r.content)
 
-    gdf = gpd.read_file(OUT_PATH)
+    gdf = gpd.read_file(RAW_JSON)
     if gdf.crs is None:
         gdf = gdf.set_crs(4326)
     else:
@@ -43,7 +50,7 @@ def main():
     gdf_m = gdf.to_crs(3857)
     gdf["AREA_KM2"] = gdf_m.geometry.area / 1e6
 
-    gdf.to_file(OUT_PATH, driver="GeoJSON")
+    write_geoparquet(gdf, OUT_PATH)
     print(f"OK localidades → {OUT_PATH} ({len(gdf)} polígonos)")
 
 if __name__ == "__main__":
@@ -1,35 +1,62 @@
 # Uso: python -m src.extract.extract_runt
 # Descarga parque automotor RUNT (Socrata API)
-import os, pandas as pd
+import os
+import pyarrow as pa
 from sodapy import Socrata
 from tqdm import tqdm
 
+from src.extract.parquet_stream import ParquetStream
+
 RAW = "data/raw/runt"
 os.makedirs(RAW, exist_ok=True)
 
 DATASET_ID = "u3vn-bdcy"  # Parque automotor (RUNT 2.0)
-client = Socrata("www.datos.gov.co", None, timeout=60)
+OUT = f"{RAW}/runt_raw.parquet"
 
+INPUTS = []
+OUTPUTS = [OUT]
+client = Socrata("www.datos.gov.co", None, timeout=60)
 
-def fetch_all(dataset_id, page_size=50000, max_rows=None):
-    rows, offset = [], 0
-    with tqdm(desc="RUNT", unit="rows") as pbar:
+# SODA entrega todo como texto; esquema fijo (campos ausentes en una fila → null)
+SCHEMA = pa.schema(
+    [
+        (c, pa.string())
+        for c in (
+            "nombre_departamento",
+            "nombre_municipio",
+            "nombre_servicio",
+            "estado_del_vehiculo",
+            "nombre_de_la_clase",
+            "fecha_de_registro",
+            "cantidad",
+            "mes_de_publicacion",
+            "a_o_de_publicacion",
+        )
+    ]
+)
+
+
+def fetch_all(dataset_id, out_path=OUT, page_size=50000, max_rows=None):
+    # cada página va directo a un row group; nunca se acumula el dataset completo
+    offset = 0
+    with ParquetStream(out_path, SCHEMA) as sink, tqdm(
+        desc="RUNT", unit="rows"
+    ) as pbar:
         while True:
             batch = client.get(dataset_id, limit=page_size, offset=offset)
             if not batch:
                 break
-            rows.extend(batch)
+            sink.write_records(batch)
             offset += len(batch)
             pbar.update(len(batch))
-            if max_rows and len(rows) >= max_rows:
+            if max_rows and offset >= max_rows:
                 break
-    return pd.DataFrame.from_records(rows)
+    return sink.rows
 
 
 def main():
-    df = fetch_all(DATASET_ID, page_size=50000, max_rows=300000)
-    df.to_parquet(f"{RAW}/runt_raw.parquet", index=False)
-    print("OK RUNT → data/raw/runt/runt_raw.parquet", len(df))
+    n = fetch_all(DATASET_ID, page_size=50000, max_rows=300000)
+    print("OK RUNT → data/raw/runt/runt_raw.parquet", n)
 
 
 if __name__ == "__main__":
@@ -5,62 +5,49 @@
 # =========================================================
 
 import os
-import requests
-import pandas as pd
-from tqdm import tqdm
+import pyarrow.compute as pc
+
+from src.extract.arcgis_paginado import iter_pages, layer_schema, clear_checkpoints
+from src.extract.parquet_stream import ParquetStream
 
 RAW_DIR = "data/raw/semaforos"
 os.makedirs(RAW_DIR, exist_ok=True)
 
+NAME = "semaforos"
 BASE_URL = "https://sig.simur.gov.co/arcgis/rest/services/DatosAbiertos/RedSemaforica/MapServer/0/query"
-
-
-def fetch_semaforos(limit=10000):
-    records = []
-    offset = 0
-    PAGE_SIZE = 2000
-    with tqdm(total=limit, desc="Descargando semáforos") as pbar:
-        while offset < limit:
-            params = {
-                "where": "1=1",
-                "outFields": "*",
-                "outSR": 4326,
-                "f": "json",
-                "resultOffset": offset,
-                "resultRecordCount": PAGE_SIZE,
-            }
-            resp = requests.get(BASE_URL, params=params, timeout=60)
-            resp.raise_for_status()
-            data = resp.json()
-            feats = data.get("features", [])
-            if not feats:
-                break
-            for f in feats:
-                attrs = f["attributes"]
-                geom = f.get("geometry", {})
-                attrs["lon"] = geom.get("x")
-                attrs["lat"] = geom.get("y")
-                records.append(attrs)
-            offset += PAGE_SIZE
-            pbar.update(len(feats))
-            if len(feats) < PAGE_SIZE:
-                break
-    return pd.DataFrame(records)
+OUT_PATH = os.path.join(RAW_DIR, "semaforos_raw.parquet")
+
+INPUTS = []
+OUTPUTS = [OUT_PATH]
+
+
+def fetch_semaforos(out_path=OUT_PATH, limit=10000, max_workers=4):
+    total = 0
+    with ParquetStream(out_path, layer_schema(BASE_URL)) as sink:
+        for table in iter_pages(
+            BASE_URL,
+            NAME,
+            limit=limit,
+            page=2000,
+            max_workers=max_workers,
+            desc="Descargando semáforos",
+        ):
+            total += table.num_rows
+            # Limpieza básica: coordenadas válidas (lon/lat ya vienen como float64)
+            sink.write(
+                table.filter(
+                    pc.and_(pc.is_valid(table["lat"]), pc.is_valid(table["lon"]))
+                )
+            )
+    return total, sink.rows
 
 
 def main():
-    df = fetch_semaforos(limit=5000)
-    print(f"✅ Registros descargados: {len(df)}")
-
-    # Limpieza básica: coordenadas válidas
-    df["lat"] = pd.to_numeric(df["lat"], errors="coerce")
-    df["lon"] = pd.to_numeric(df["lon"], errors="coerce")
-    df = df.dropna(subset=["lat", "lon"])
-    print(f"✅ Registros válidos con coordenadas: {len(df)}")
-
-    out_path = os.path.join(RAW_DIR, "semaforos_raw.parquet")
-    df.to_parquet(out_path, index=False)
-    print(f"OK semáforos → {out_path}")
+    total, validos = fetch_semaforos(limit=5000)
+    print(f"✅ Registros descargados: {total}")
+    print(f"✅ Registros válidos con coordenadas: {validos}")
+    clear_checkpoints(NAME)
+    print(f"OK semáforos → {OUT_PATH}")
 
 
 if __name__ == "__main__":
@@ -6,6 +6,10 @@ import os, io, re, unicodedata, requests, pandas as pd
 RAW_DIR = "data/raw/siniestralidad_2018"
 os.makedirs(RAW_DIR, exist_ok=True)
 
+OUT_PATH = os.path.join(RAW_DIR, "siniestralidad_2018_raw.parquet")
+INPUTS = []
+OUTPUTS = [OUT_PATH]
+
 URL = "https://observatorio.movilidadbogota.gov.co/sites/default/files/2025-09/SIGAT_ANUARIO_2018_0.xlsx"
 
 ADDR_PATTERNS = [
@@ -73,10 +77,9 @@ def main():
         if re.search(r"(?i)fecha", c):
             out[c] = pd.to_datetime(out[c], errors="coerce", dayfirst=True)
 
-    out_path = os.path.join(RAW_DIR, "siniestralidad_2018_raw.parquet")
-    out.to_parquet(out_path, index=False)
+    out.to_parquet(OUT_PATH, index=False)
     print(
-        f"OK siniestralidad 2018 → {out_path} ({len(out)} filas, {len(out.columns)} columnas)"
+        f"OK siniestralidad 2018 → {OUT_PATH} ({len(out)} filas, {len(out.columns)} columnas)"
     )
 
 
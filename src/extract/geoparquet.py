@@ -0,0 +1,37 @@
+# GeoParquet como formato de las capas espaciales (localidades, eventos con geometría,
+# grilla, contornos): geometría WKB, columna "bbox" de cobertura (GeoParquet 1.1) y
+# filas ordenadas por la curva de Hilbert, así cada row group cubre una zona compacta
+# y una lectura con bbox= solo toca los row groups que la intersectan.
+
+import os
+
+import numpy as np
+import geopandas as gpd
+
+ROW_GROUP = int(os.getenv("GEOPARQUET_ROW_GROUP", "65536"))
+
+
+def hilbert_sort(gdf: gpd.GeoDataFrame) -> gpd.GeoDataFrame:
+    if len(gdf) < 2 or gdf.geometry.isna().all():
+        return gdf
+    # vacías/nulas al final; el orden es estable para empates
+    key = gdf.geometry.hilbert_distance().to_numpy(dtype=float, na_value=np.inf)
+    return gdf.iloc[np.argsort(key, kind="stable")]
+
+
+def write_geoparquet(gdf: gpd.GeoDataFrame, path, row_group_size=ROW_GROUP) -> None:
+    tmp = f"{path}.tmp"
+    hilbert_sort(gdf).to_parquet(
+        tmp,
+        index=False,
+        write_covering_bbox=True,
+        row_group_size=row_group_size,
+        compression="zstd",
+    )
+    os.replace(tmp, path)  # como ParquetStream: no deja archivos a medias
+
+
+def read_geoparquet(path, bbox=None, columns=None) -> gpd.GeoDataFrame:
+    """Lee una capa; con `bbox` (xmin, ymin, xmax, ymax en el CRS de la capa) se
+    descartan los row groups fuera de la caja usando las estadísticas de "bbox"."""
+    return gpd.read_parquet(path, bbox=bbox, columns=columns)
@@ -0,0 +1,56 @@
+# Escritura incremental a Parquet: cada página descargada se escribe como un row group
+# con un esquema fijo y declarado, así la memoria queda acotada a una página.
+# El archivo se escribe en <ruta>.tmp y solo reemplaza al final si todo salió bien.
+
+import os
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+
+def conform(table: pa.Table, schema: pa.Schema) -> pa.Table:
+    # ordena/castea columnas al esquema; las que faltan quedan en null y las extra se ignoran
+    cols = []
+    for field in schema:
+        if field.name in table.column_names:
+            cols.append(table[field.name].cast(field.type))
+        else:
+            cols.append(pa.nulls(table.num_rows, type=field.type))
+    return pa.Table.from_arrays(cols, schema=schema)
+
+
+class ParquetStream:
+    def __init__(self, path, schema: pa.Schema, compression="snappy"):
+        self.path = path
+        self.schema = schema
+        self.rows = 0
+        self._tmp = f"{path}.tmp"
+        self._writer = pq.ParquetWriter(self._tmp, schema, compression=compression)
+
+    def write(self, table: pa.Table) -> None:
+        table = conform(table, self.schema)
+        if table.num_rows:
+            self._writer.write_table(table)
+            self.rows += table.num_rows
+
+    def write_records(self, records) -> None:
+        self.write(pa.Table.from_pylist(records, schema=self.schema))
+
+    def close(self) -> None:
+        self._writer.close()
+        os.replace(self._tmp, self.path)
+
+    def abort(self) -> None:
+        self._writer.close()
+        if os.path.exists(self._tmp):
+            os.remove(self._tmp)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+        return False
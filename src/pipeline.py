@@ -0,0 +1,335 @@
+# Uso: python -m src.pipeline [etapa|grupo ...] [--force] [-j N] [--dry-run] [--fused]
+# Runner incremental del ETL. Cada módulo de etapa declara INPUTS/OUTPUTS (sus rutas
+# RAW_IN, OUT_COMP, ...); el grafo sale de emparejar salidas con entradas. Una etapa
+# se salta si la huella (sha256 de entradas + código propio y módulos src.* que
+# importa + variables ENV_VARS) no cambió y sus salidas existen. Las etapas sin
+# dependencias pendientes corren a la vez, cada una en su propio proceso.
+
+import os
+import sys
+import ast
+import json
+import time
+import hashlib
+import argparse
+import subprocess
+import concurrent.futures
+from typing import Dict, List, Optional
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+WORK_DIR = "data/working"
+STATE_FN = os.path.join(WORK_DIR, "pipeline_state.json")
+LOG_DIR = os.path.join(WORK_DIR, "pipeline_logs")
+FUSED = "src.pipeline_fused"
+
+# (nombre, módulo, grupo) — el orden solo desempata la presentación
+STAGES = [
+    ("comparendos", "src.extract.extract_comparendos_2018", "extract"),
+    ("siniestralidad", "src.extract.extract_siniestralidad_2018", "extract"),
+    ("semaforos", "src.extract.extract_semaforos", "extract"),
+    ("mortalidad", "src.extract.extract_mortalidad", "extract"),
+    ("runt", "src.extract.extract_runt", "extract"),
+    ("localidades", "src.extract.extract_localidades", "extract"),
+    ("geocode", "src.transform.geocode_addresses", "transform"),
+    ("join_localidades", "src.transform.join_localidades", "transform"),
+    ("proximidad", "src.transform.calc_proximidad_semaforos", "transform"),
+    ("hex", "src.transform.agregacion_hex", "transform"),
+    ("kde", "src.transform.kde_hotspots", "transform"),
+    ("cubo", "src.transform.cubo_espacio_tiempo", "transform"),
+    ("mortalidad_panel", "src.transform.merge_mortalidad", "transform"),
+    ("kpi", "src.analytics.resumen_kpi", "analytics"),
+    ("gi", "src.analytics.hotspots_gi", "analytics"),
+]
+
+
+def _eval(node, env: Dict):
+    # constantes de ruta a nivel de módulo: "...", f"{RAW}/x", os.path.join(...), [..]
+    if isinstance(node, ast.Constant) and isinstance(node.value, str):
+        return node.value
+    if isinstance(node, ast.Name):
+        return env[node.id]
+    if isinstance(node, ast.JoinedStr):
+        return "".join(
+            _eval(v.value if isinstance(v, ast.FormattedValue) else v, env)
+            for v in node.values
+        )
+    if isinstance(node, (ast.List, ast.Tuple)):
+        return [_eval(e, env) for e in node.elts]
+    if isinstance(node, ast.Call) and ast.unparse(node.func) == "os.path.join":
+        return os.path.join(*(_eval(a, env) for a in node.args))
+    raise KeyError(ast.unparse(node))
+
+
+def declarations(module: str) -> Dict:
+    """Lee INPUTS/OUTPUTS/ENV_VARS sin importar el módulo (ni sus dependencias)."""
+    with open(_module_file(module), "r", encoding="utf-8") as f:
+        tree = ast.parse(f.read())
+    env = {}
+    for node in tree.body:
+        if isinstance(node, ast.Assign):
+            try:
+                value = _eval(node.value, env)
+            except KeyError:
+                continue
+            for t in node.targets:
+                if isinstance(t, ast.Name):
+                    env[t.id] = value
+                elif isinstance(t, ast.Tuple):  # CLEAN, ANAL = "...", "..."
+                    env.update(zip((e.id for e in t.elts), value))
+    return env
+
+
+class Stage:
+    def __init__(self, name: str, module: str, group: str, decl=None):
+        self.name = name
+        self.module = module
+        self.group = group
+        decl = declarations(module) if decl is None else decl
+        self.inputs: List[str] = decl.get("INPUTS", [])
+        self.outputs: List[str] = decl.get("OUTPUTS", [])
+        self.env: List[str] = decl.get("ENV_VARS", [])
+        self.deps: List[str] = []
+        self.members: List[str] = []  # etapas que reemplaza (solo la fusionada)
+
+
+# ============================ huellas ============================
+def _sha_file(path: str, memo: Dict) -> str:
+    # memo por (tamaño, mtime): los parquet grandes solo se rehashean si cambian
+    st = os.stat(path)
+    stamp = [st.st_size, st.st_mtime_ns]
+    hit = memo.get(path)
+    if hit and hit[:2] == stamp:
+        return hit[2]
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    memo[path] = stamp + [h.hexdigest()]
+    return memo[path][2]
+
+
+def _module_file(module: str) -> Optional[str]:
+    path = os.path.join(ROOT, *module.split("."))
+    for cand in (path + ".py", os.path.join(path, "__init__.py")):
+        if os.path.exists(cand):
+            return cand
+    return None
+
+
+def code_files(module: str) -> List[str]:
+    """Archivo del módulo y, transitivamente, los módulos src.* que importa."""
+    seen, todo = {}, [module]
+    while todo:
+        m = todo.pop()
+        fn = _module_file(m)
+        if m in seen or fn is None:
+            continue
+        seen[m] = fn
+        with open(fn, "r", encoding="utf-8") as f:
+            tree = ast.parse(f.read(), filename=fn)
+        for node in ast.walk(tree):
+            if isinstance(node, ast.ImportFrom) and node.module:
+                names = [node.module] + [f"{node.module}.{a.name}" for a in node.names]
+            elif isinstance(node, ast.Import):
+                names = [a.name for a in node.names]
+            else:
+                continue
+            todo += [n for n in names if n.split(".")[0] == "src"]
+    return sorted(seen.values())
+
+
+def fingerprint(stage: Stage, memo: Dict) -> Optional[str]:
+    """None si falta alguna entrada (la etapa no puede correr)."""
+    h = hashlib.sha256()
+    for p in stage.inputs:
+        if not os.path.exists(p):
+            return None
+        h.update(f"in:{p}:{_sha_file(p, memo)}\n".encode())
+    for fn in code_files(stage.module):
+        h.update(f"code:{os.path.relpath(fn, ROOT)}:{_sha_file(fn, memo)}\n".encode())
+    for k in stage.env:
+        h.update(f"env:{k}={os.getenv(k, '')}\n".encode())
+    return h.hexdigest()
+
+
+def _load_state() -> Dict:
+    try:
+        with open(STATE_FN, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {"stages": {}, "files": {}}
+
+
+def _save_state(state: Dict) -> None:
+    os.makedirs(WORK_DIR, exist_ok=True)
+    tmp = STATE_FN + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(state, f, indent=1)
+    os.replace(tmp, STATE_FN)
+
+
+# ============================ grafo ============================
+def _fuse(stages: Dict[str, Stage]) -> Dict[str, Stage]:
+    # las etapas de src/pipeline_fused.py pasan a ser una sola etapa en un proceso
+    members = [stages.pop(n) for n in declarations(FUSED)["STAGES"]]
+    produced = {o for m in members for o in m.outputs}
+    fused = Stage("fused", FUSED, "transform", decl={})
+    fused.inputs = sorted({i for m in members for i in m.inputs} - produced)
+    fused.outputs = sorted(produced)
+    fused.env = sorted({e for m in members for e in m.env})
+    fused.members = [m.name for m in members]
+    stages[fused.name] = fused
+    return stages
+
+
+def build(names=None, fused=False) -> Dict[str, Stage]:
+    stages = {n: Stage(n, m, g) for n, m, g in STAGES}
+    if fused:
+        stages = _fuse(stages)
+        members = stages["fused"].members
+        names = [("fused" if n in members else n) for n in names or []]
+    producer = {o: s.name for s in stages.values() for o in s.outputs}
+    for s in stages.values():
+        s.deps = sorted({producer[i] for i in s.inputs if i in producer} - {s.name})
+    if not names:
+        return stages
+    # etapas pedidas (o grupos) + todo lo que necesitan aguas arriba
+    todo = [s.name for s in stages.values() if s.name in names or s.group in names]
+    known = {s.name for s in stages.values()} | {s.group for s in stages.values()}
+    unknown = set(names) - known
+    if unknown:
+        raise SystemExit(f"Etapas desconocidas: {', '.join(sorted(unknown))}")
+    keep = set()
+    while todo:
+        n = todo.pop()
+        if n not in keep:
+            keep.add(n)
+            todo += stages[n].deps
+    return {n: s for n, s in stages.items() if n in keep}
+
+
+def _run_stage(stage: Stage) -> int:
+    os.makedirs(LOG_DIR, exist_ok=True)
+    env = dict(os.environ, PYTHONPATH=ROOT)
+    with open(os.path.join(LOG_DIR, f"{stage.name}.log"), "w") as log:
+        return subprocess.run(
+            [sys.executable, "-m", stage.module],
+            cwd=ROOT,
+            env=env,
+            stdout=log,
+            stderr=subprocess.STDOUT,
+        ).returncode
+
+
+def _tail(stage: Stage, n=15) -> str:
+    with open(os.path.join(LOG_DIR, f"{stage.name}.log"), "r", errors="replace") as f:
+        return "".join(f.readlines()[-n:])
+
+
+def run(names=None, force=False, jobs=None, dry_run=False, fused=False) -> int:
+    os.chdir(ROOT)
+    stages = build(names, fused)
+    state = _load_state()
+    memo = state.setdefault("files", {})
+    done, failed, would, running = set(), set(), set(), {}
+    jobs = jobs or min(6, os.cpu_count() or 1)
+    t0 = time.perf_counter()
+
+    def ready():
+        for s in stages.values():
+            if s.name in done or s.name in failed or s.name in running:
+                continue
+            bad = [d for d in s.deps if d in failed]
+            if bad:
+                print(f"⏭  {s.name}: bloqueada (falló {', '.join(bad)})")
+                failed.add(s.name)
+                continue
+            if all(d in done for d in s.deps):
+                yield s
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=jobs) as ex:
+        while True:
+            batch = list(ready())
+            for s in batch:
+                # la huella se calcula cuando las entradas ya están construidas
+                fp = fingerprint(s, memo)
+                prev = state["stages"].get(s.name, {}).get("fingerprint")
+                fresh = all(os.path.exists(o) for o in s.outputs)
+                stale = force or any(d in would for d in s.deps)
+                if fp is not None and fp == prev and fresh and not stale:
+                    print(f"✔  {s.name}: sin cambios")
+                    done.add(s.name)
+                    continue
+                if prev is None and not s.inputs and fresh and not stale:
+                    # fuente remota ya descargada antes del runner: no se rebaja
+                    print(f"✔  {s.name}: salidas existentes adoptadas")
+                    if not dry_run:
+                        state["stages"][s.name] = {"fingerprint": fp, "ts": time.time()}
+                    done.add(s.name)
+                    continue
+                if dry_run:
+                    print(f"•  {s.name}: se ejecutaría")
+                    would.add(s.name)
+                    done.add(s.name)
+                    continue
+                if fp is None:
+                    missing = [p for p in s.inputs if not os.path.exists(p)]
+                    print(f"✖  {s.name}: faltan entradas {missing}")
+                    failed.add(s.name)
+                    continue
+                print(f"▶  {s.name} ({s.module})")
+                running[s.name] = (ex.submit(_run_stage, s), fp, time.perf_counter())
+            if not running:
+                if batch:  # etapas saltadas: puede haber nuevas listas
+                    continue
+                break
+            fin, _ = concurrent.futures.wait(
+                [f for f, *_ in running.values()],
+                return_when=concurrent.futures.FIRST_COMPLETED,
+            )
+            for name in [n for n, (f, *_) in running.items() if f in fin]:
+                fut, fp, t = running.pop(name)
+                s, dt = stages[name], time.perf_counter() - t
+                if fut.result() == 0:
+                    print(f"✅ {name} ({dt:.1f} s)")
+                    state["stages"][name] = {"fingerprint": fp, "ts": time.time()}
+                    done.add(name)
+                else:
+                    print(f"❌ {name} ({dt:.1f} s) — log: {LOG_DIR}/{name}.log")
+                    print(_tail(s))
+                    state["stages"].pop(name, None)
+                    failed.add(name)
+                _save_state(state)
+
+    _save_state(state)
+    print(
+        f"⏱  {time.perf_counter() - t0:.1f} s | ok={len(done)} fallidas={len(failed)}"
+    )
+    return 1 if failed else 0
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Runner incremental del ETL")
+    ap.add_argument(
+        "targets", nargs="*", help="etapas o grupos (extract/transform/analytics)"
+    )
+    ap.add_argument("--force", action="store_true", help="ignora las huellas")
+    ap.add_argument("-j", "--jobs", type=int, default=None, help="procesos en paralelo")
+    ap.add_argument("--dry-run", action="store_true", help="solo muestra qué correría")
+    ap.add_argument("--list", action="store_true", help="muestra el grafo de etapas")
+    ap.add_argument(
+        "--fused",
+        action="store_true",
+        help="transform + analytics en un solo proceso, en memoria (src/pipeline_fused.py)",
+    )
+    args = ap.parse_args()
+    if args.list:
+        for s in build(args.targets, args.fused).values():
+            deps = ", ".join(s.deps) or "-"
+            print(f"{s.group:10} {s.name:18} ← {deps}")
+        return
+    sys.exit(run(args.targets, args.force, args.jobs, args.dry_run, args.fused))
+
+
+if __name__ == "__main__":
+    main()
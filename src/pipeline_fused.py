@@ -0,0 +1,134 @@
+# Uso: python -m src.pipeline_fused   (o python -m src.pipeline --fused)
+# Modo fusionado de transform + analytics en un solo proceso: join_localidades,
+# calc_proximidad_semaforos, agregacion_hex, kde_hotspots, cubo_espacio_tiempo,
+# merge_mortalidad y resumen_kpi se pasan los DataFrames en memoria. La localidad se
+# asigna desde lon/lat; los puntos se construyen una vez (4326) y se proyectan una sola
+# vez a EPSG:3857 (grilla, KDE y cubo); las distancias usan la proyección métrica
+# local (NumPy).
+# No se relee ningún parquet intermedio; solo se escriben los artefactos declarados
+# en OUTPUTS de cada etapa, que son los que consumen el dashboard y la interpretación.
+
+import time
+
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+
+from src.analytics import resumen_kpi
+from src.transform import (
+    agregacion_hex,
+    calc_proximidad_semaforos as prox,
+    cubo_espacio_tiempo,
+    join_localidades,
+    kde_hotspots,
+    merge_mortalidad,
+)
+from src.extract import almacen_eventos
+from src.extract.geoparquet import write_geoparquet
+from src.transform.asignador_localidades import cargar_asignador
+from src.transform.indice_semaforos import cargar_indice
+
+# etapas de src/pipeline.py que este modo reemplaza
+STAGES = [
+    "join_localidades",
+    "proximidad",
+    "hex",
+    "kde",
+    "cubo",
+    "mortalidad_panel",
+    "kpi",
+]
+
+
+def run() -> dict:
+    """Ejecuta las etapas en memoria; devuelve los artefactos por ruta de salida."""
+    t0 = time.perf_counter()
+    lap = {}
+
+    def _lap(name):
+        lap[name] = time.perf_counter() - t0 - sum(lap.values())
+
+    # --- localidad (raster de consulta) + puntos 4326, construidos una vez ---
+    asig = cargar_asignador(join_localidades.GEOLOC)
+    comp, sin = (
+        join_localidades.asignar_localidad(
+            pd.read_parquet(path).dropna(subset=["lat", "lon"]), asig
+        )
+        for path in (join_localidades.IN_COMP, join_localidades.IN_SIN)
+    )
+    _lap("join_localidades")
+
+    # --- una sola proyección a 3857, compartida por grilla y KDE; las distancias
+    # van en el CRS métrico local del índice de semáforos ---
+    pc = gpd.GeoDataFrame(geometry=comp.geometry.to_crs(3857))
+    ps = gpd.GeoDataFrame(geometry=sin.geometry.to_crs(3857))
+    xy_c = np.c_[pc.geometry.x, pc.geometry.y]
+    xy_s = np.c_[ps.geometry.x, ps.geometry.y]
+    idx = cargar_indice(prox.RAW_SEM)
+    comp_d = prox.add_distancias(comp.copy(), idx)
+    sin_d = prox.add_distancias(sin.copy(), idx)
+    hist = prox.histograma(comp_d, sin_d)
+    _lap("proximidad")
+
+    grid = agregacion_hex.hotspots(pc, ps)
+    pyr = agregacion_hex.piramide(pc, ps)
+    _lap("hex")
+
+    layers, raster, cont = kde_hotspots.kde(xy_c, xy_s)
+    _lap("kde")
+
+    cubo = cubo_espacio_tiempo.cubo(
+        xy_c,
+        xy_s,
+        cubo_espacio_tiempo.tiempo_de(comp),
+        cubo_espacio_tiempo.tiempo_de(sin),
+    )
+    _lap("cubo")
+
+    panel = merge_mortalidad.build_panel(
+        pd.read_parquet(merge_mortalidad.RAW_MORT), comp, sin
+    )
+    _lap("mortalidad_panel")
+
+    kpi_g, kpi_loc = resumen_kpi.build_kpis(comp, sin, hist, panel)
+    _lap("kpi")
+
+    out = {
+        join_localidades.OUT_COMP: comp,
+        join_localidades.OUT_SIN: sin,
+        prox.OUT_COMP: comp_d,
+        prox.OUT_SIN: sin_d,
+        prox.OUT_HIST: hist,
+        agregacion_hex.OUT_GEO: grid,
+        agregacion_hex.OUT_PIRAMIDE: pyr,
+        kde_hotspots.OUT_CONTORNOS: cont,
+        cubo_espacio_tiempo.OUT_CUBO: cubo,
+        merge_mortalidad.OUT_PANEL_2018: panel,
+        resumen_kpi.OUT_GLOBAL: kpi_g,
+        resumen_kpi.OUT_LOC: kpi_loc,
+    }
+    for path, df in out.items():
+        if isinstance(df, gpd.GeoDataFrame):
+            write_geoparquet(df, path)
+        else:
+            df.to_parquet(path, index=False)
+    kde_hotspots.write_raster(layers, raster)  # el raster no es tabla: aparte
+    # almacén particionado: un dataset por capa, no un archivo
+    almacen_eventos.escribir(comp, join_localidades.EVENTOS_COMP)
+    almacen_eventos.escribir(sin, join_localidades.EVENTOS_SIN)
+    _lap("escritura")
+
+    print(" | ".join(f"{k} {v:.2f}s" for k, v in lap.items()))
+    return out
+
+
+def main():
+    t0 = time.perf_counter()
+    out = run()
+    for path, df in out.items():
+        print(f"OK → {path} ({len(df)})")
+    print(f"⏱  fusionado: {time.perf_counter() - t0:.1f} s")
+
+
+if __name__ == "__main__":
+    main()
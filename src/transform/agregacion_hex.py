@@ -1,69 +1,177 @@
 # Uso: python -m src.transform.agregacion_hex
-# Crea grilla ~500 m y cuenta comparendos/siniestros por celda. Exporta GeoJSON.
+# Cuenta comparendos/siniestros por celda (cuadrada o hexagonal, ~500 m por defecto)
+# y exporta GeoParquet. El binning es aritmético sobre coordenadas EPSG:3857: índice
+# entero de celda por punto, conteo con np.bincount y polígonos solo para las celdas
+# con eventos. Las celdas se alinean al origen de 3857 (estables entre corridas).
 
 import os, numpy as np, pandas as pd, geopandas as gpd
-from shapely.geometry import box
+import shapely
+from functools import reduce
+from math import gcd
+
+from src.extract.geoparquet import read_geoparquet, write_geoparquet
 
 CLEAN = "data/clean"
 ANAL = "data/analytics"
 os.makedirs(ANAL, exist_ok=True)
 
-OUT_GEO = f"{ANAL}/grid_hotspots.geojson"
-
-
-def _to_points(df):
-    return gpd.GeoDataFrame(
-        df, geometry=gpd.points_from_xy(df["lon"], df["lat"]), crs=4326
+IN_COMP = f"{CLEAN}/comparendos_2018_loc.parquet"
+IN_SIN = f"{CLEAN}/siniestralidad_2018_loc.parquet"
+OUT_GEO = f"{ANAL}/grid_hotspots.parquet"
+OUT_PIRAMIDE = f"{ANAL}/hotspots_piramide.parquet"
+
+INPUTS = [IN_COMP, IN_SIN]
+OUTPUTS = [OUT_GEO, OUT_PIRAMIDE]
+ENV_VARS = ["HOTSPOT_CELL_M", "HOTSPOT_SHAPE", "HOTSPOT_NIVELES"]
+
+# lado de la celda en metros; los hexágonos tienen la misma área que el cuadrado
+CELL_M = float(os.getenv("HOTSPOT_CELL_M", "500"))
+SHAPE = os.getenv("HOTSPOT_SHAPE", "square").strip().lower()  # square | hex
+SHAPES = ("square", "hex")
+# radio (centro-vértice) del hexágono de área size²
+HEX_R = np.sqrt(2 / (3 * np.sqrt(3)))
+# pirámide de resoluciones (celdas cuadradas, metros); todas múltiplo de la base común
+NIVELES = [
+    int(v) for v in os.getenv("HOTSPOT_NIVELES", "100,250,500,1000,2000").split(",")
+]
+
+
+def cell_index(x, y, size_m=CELL_M, shape=SHAPE):
+    """Índices enteros (i, j) de celda para coordenadas 3857 (hex: axiales q, r)."""
+    x, y = np.asarray(x, dtype=float), np.asarray(y, dtype=float)
+    if shape == "square":
+        i, j = np.floor(x / size_m), np.floor(y / size_m)
+        return i.astype(np.int64), j.astype(np.int64)
+    if shape != "hex":
+        raise ValueError(f"Forma de celda desconocida: {shape} (usa {SHAPES})")
+    # hexágonos "pointy-top": coordenadas axiales fraccionarias + redondeo cúbico
+    r = size_m * HEX_R
+    q, rr = (np.sqrt(3) / 3 * x - y / 3) / r, (2 / 3 * y) / r
+    s = -q - rr
+    qi, ri, si = np.rint(q), np.rint(rr), np.rint(s)
+    dq, dr, ds = np.abs(qi - q), np.abs(ri - rr), np.abs(si - s)
+    fix_q = (dq > dr) & (dq > ds)
+    fix_r = ~fix_q & (dr > ds)
+    qi = np.where(fix_q, -ri - si, qi)
+    ri = np.where(fix_r, -qi - si, ri)
+    return qi.astype(np.int64), ri.astype(np.int64)
+
+
+def cell_polygons(i, j, size_m=CELL_M, shape=SHAPE) -> np.ndarray:
+    """Polígonos (3857) de las celdas (i, j), construidos en bloque."""
+    i, j = np.asarray(i, dtype=float), np.asarray(j, dtype=float)
+    if shape == "square":
+        x0, y0 = i * size_m, j * size_m
+        dx = np.array([0, 1, 1, 0, 0]) * size_m
+        dy = np.array([0, 0, 1, 1, 0]) * size_m
+    else:
+        r = size_m * HEX_R
+        x0, y0 = r * np.sqrt(3) * (i + j / 2), r * 1.5 * j
+        ang = np.radians(30 + 60 * np.arange(7))
+        dx, dy = r * np.cos(ang), r * np.sin(ang)
+    coords = np.stack([x0[:, None] + dx, y0[:, None] + dy], axis=-1)
+    return shapely.polygons(coords)
+
+
+def _agrupar(i, j, *pesos):
+    """Celdas (i, j) distintas y la suma de cada vector de pesos por celda."""
+    # id lineal de celda dentro del rectángulo de índices ocupados
+    i0, j0 = i.min(), j.min()
+    nj = j.max() - j0 + 1
+    ids, inv = np.unique((i - i0) * nj + (j - j0), return_inverse=True)
+    sums = [np.bincount(inv, weights=w, minlength=len(ids)) for w in pesos]
+    return ids // nj + i0, ids % nj + j0, [s.astype(np.int64) for s in sums]
+
+
+def cell_id(i, j):
+    # (i, j) → entero estable: índices de 3857 caben holgados en ±2^20
+    return (np.asarray(i, np.int64) + 2**20) * 2**21 + (np.asarray(j, np.int64) + 2**20)
+
+
+def cell_ij(cid):
+    """Inversa de cell_id: índices (i, j) de la celda."""
+    cid = np.asarray(cid, np.int64)
+    return cid // 2**21 - 2**20, cid % 2**21 - 2**20
+
+
+def hotspots(
+    pcomp: gpd.GeoDataFrame, psin: gpd.GeoDataFrame, size_m=CELL_M, shape=SHAPE
+):
+    """Conteos por celda a partir de puntos ya en EPSG:3857; devuelve la grilla en 4326.
+
+    Solo incluye celdas con al menos un evento.
+    """
+    if pcomp.empty and psin.empty:
+        raise ValueError("No hay puntos para generar hotspots.")
+    ci, cj = cell_index(pcomp.geometry.x, pcomp.geometry.y, size_m, shape)
+    si, sj = cell_index(psin.geometry.x, psin.geometry.y, size_m, shape)
+    es_comp = np.r_[np.ones(len(ci)), np.zeros(len(si))]
+    i, j, (nc, ns) = _agrupar(np.r_[ci, si], np.r_[cj, sj], es_comp, 1 - es_comp)
+    grid = gpd.GeoDataFrame(
+        {"i": i, "j": j, "comparendos": nc, "siniestros": ns},
+        geometry=cell_polygons(i, j, size_m, shape),
+        crs=3857,
     )
+    grid["score"] = (grid["comparendos"] + grid["siniestros"]).astype(int)
+    return grid.to_crs(4326)
+
+
+def piramide(pcomp: gpd.GeoDataFrame, psin: gpd.GeoDataFrame, niveles=NIVELES):
+    """Conteos por (level, cell_id) para varias resoluciones en una sola pasada.
+
+    Los puntos se binnean una vez a la celda base (mcd de los niveles, 50 m por
+    defecto) y cada nivel suma celdas base: i_nivel = i_base // (nivel / base).
+    """
+    base = reduce(gcd, niveles)
+    ci, cj = cell_index(pcomp.geometry.x, pcomp.geometry.y, base, "square")
+    si, sj = cell_index(psin.geometry.x, psin.geometry.y, base, "square")
+    es_comp = np.r_[np.ones(len(ci)), np.zeros(len(si))]
+    bi, bj, (bc, bs) = _agrupar(np.r_[ci, si], np.r_[cj, sj], es_comp, 1 - es_comp)
+    parts = []
+    for level in sorted(niveles):
+        f = level // base
+        i, j, (nc, ns) = _agrupar(bi // f, bj // f, bc, bs)
+        parts.append(
+            pd.DataFrame(
+                {
+                    "level": np.full(len(i), level, np.int16),
+                    "cell_id": cell_id(i, j),
+                    "i": i.astype(np.int32),
+                    "j": j.astype(np.int32),
+                    "comparendos": nc.astype(np.int32),
+                    "siniestros": ns.astype(np.int32),
+                }
+            )
+        )
+    pyr = pd.concat(parts, ignore_index=True)
+    pyr["score"] = pyr["comparendos"] + pyr["siniestros"]
+    return pyr.sort_values(["level", "cell_id"], ignore_index=True)
+
+
+def grid_nivel(pyr: pd.DataFrame, level: int) -> gpd.GeoDataFrame:
+    """Celdas de un nivel de la pirámide como GeoDataFrame en 4326."""
+    cells = pyr[pyr["level"] == level]
+    geom = cell_polygons(cells["i"], cells["j"], level, "square")
+    return gpd.GeoDataFrame(
+        cells.reset_index(drop=True), geometry=geom, crs=3857
+    ).to_crs(4326)
 
 
-def _grid_500(gdf: gpd.GeoDataFrame, size_m=500) -> gpd.GeoDataFrame:
-    if gdf.empty:
-        raise ValueError("No hay geometrías para calcular el bounding box del grid.")
-    g = gdf.to_crs(3857)
-    xmin, ymin, xmax, ymax = g.total_bounds
-    xs = np.arange(xmin, xmax + size_m, size_m)
-    ys = np.arange(ymin, ymax + size_m, size_m)
-    polys = [box(x, y, x + size_m, y + size_m) for x in xs[:-1] for y in ys[:-1]]
-    grid = gpd.GeoDataFrame(geometry=polys, crs=3857).to_crs(4326)
-    return grid
-
-
-def _count(
-    points: gpd.GeoDataFrame, grid: gpd.GeoDataFrame, name: str
-) -> gpd.GeoDataFrame:
-    # within es suficiente; si te interesan puntos en borde, usa predicate="intersects"
-    join = gpd.sjoin(points, grid, predicate="within", how="left")
-    counts = join.groupby(join.index_right).size()
-    grid[name] = counts
-    grid[name] = grid[name].fillna(0).astype(int)
-    return grid
+def write_grid(grid: gpd.GeoDataFrame, path=OUT_GEO) -> None:
+    write_geoparquet(grid, path)
 
 
 def main():
-    comp = pd.read_parquet(f"{CLEAN}/comparendos_2018_loc.parquet").dropna(
-        subset=["lat", "lon"]
-    )
-    sin = pd.read_parquet(f"{CLEAN}/siniestralidad_2018_loc.parquet").dropna(
-        subset=["lat", "lon"]
-    )
-
-    if comp.empty and sin.empty:
-        raise ValueError("No hay puntos para generar hotspots.")
-
-    gcomp = _to_points(comp)
-    gsin = _to_points(sin)
-
-    # grid sobre el conjunto de puntos
-    both = pd.concat([gcomp, gsin], ignore_index=True)
-    grid = _grid_500(both, size_m=500)
-
-    grid = _count(gcomp, grid, "comparendos")
-    grid = _count(gsin, grid, "siniestros")
-    grid["score"] = (grid["comparendos"] + grid["siniestros"]).astype(int)
-
-    grid.to_file(OUT_GEO, driver="GeoJSON")
-    print(f"OK → {OUT_GEO} ({len(grid)})")
+    # la geometría de punto ya viene en el GeoParquet de join_localidades
+    pcomp = read_geoparquet(IN_COMP, columns=["geometry"]).to_crs(3857)
+    psin = read_geoparquet(IN_SIN, columns=["geometry"]).to_crs(3857)
+    grid = hotspots(pcomp, psin)
+    write_grid(grid)
+    print(f"OK → {OUT_GEO} ({len(grid)} celdas {SHAPE} de {CELL_M:g} m con eventos)")
+    pyr = piramide(pcomp, psin)
+    pyr.to_parquet(OUT_PIRAMIDE, index=False)
+    per_level = pyr.groupby("level").size().to_dict()
+    print(f"OK → {OUT_PIRAMIDE} (celdas por nivel: {per_level})")
 
 
 if __name__ == "__main__":
@@ -1,6 +1,8 @@
 # Uso: python -m src.transform.agregacion_hotspots
 import os, numpy as np, geopandas as gpd, pandas as pd
 
+from src.extract.geoparquet import read_geoparquet, write_geoparquet
+
 CLEAN, ANAL = "data/clean", "data/analytics"
 os.makedirs(ANAL, exist_ok=True)
 
@@ -32,23 +34,16 @@ def count_in_grid(points_gdf, grid_gdf, col_name):
 
 
 def main():
-    comp = pd.read_parquet(f"{CLEAN}/comparendos_2018_loc.parquet")
-    sin = pd.read_parquet(f"{CLEAN}/siniestralidad_2018_loc.parquet")
-
-    comp_g = gpd.GeoDataFrame(
-        comp, geometry=gpd.points_from_xy(comp["lon"], comp["lat"]), crs=4326
-    )
-    sin_g = gpd.GeoDataFrame(
-        sin, geometry=gpd.points_from_xy(sin["lon"], sin["lat"]), crs=4326
-    )
+    comp_g = read_geoparquet(f"{CLEAN}/comparendos_2018_loc.parquet")
+    sin_g = read_geoparquet(f"{CLEAN}/siniestralidad_2018_loc.parquet")
 
     grid = grid_500m(pd.concat([comp_g, sin_g]))
     grid_comp = count_in_grid(comp_g, grid, "comparendos")
     grid_both = count_in_grid(sin_g, grid_comp, "siniestros")
 
     grid_both["score_hotspot"] = grid_both["comparendos"] + grid_both["siniestros"]
-    grid_both.to_file(f"{ANAL}/grid_hotspots.geojson", driver="GeoJSON")
-    print("OK → data/analytics/grid_hotspots.geojson")
+    write_geoparquet(grid_both, f"{ANAL}/grid_hotspots.parquet")
+    print("OK → data/analytics/grid_hotspots.parquet")
 
 
 if __name__ == "__main__":
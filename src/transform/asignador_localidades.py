@@ -0,0 +1,190 @@
+# Asignación de localidad punto-en-polígono sin sjoin.
+# Los polígonos se leen una vez de la capa (GeoParquet) y se guardan en data/working en forma
+# binaria compacta (npz: coordenadas "ragged" de shapely + nombres + sha256 de la
+# fuente), junto con un raster fino de consulta en grados:
+#   ≥ 0  celda completamente dentro de esa localidad
+#    -1  celda completamente fuera de todas
+#    -2  celda que toca un borde → verificación exacta (STRtree + polígono preparado)
+# Así casi todos los puntos se resuelven con una lectura de arreglo (NumPy) y solo los
+# de celdas de borde llaman a GEOS, en bloques repartidos entre procesos.
+
+import os
+import hashlib
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import shapely
+
+from src.extract.geoparquet import read_geoparquet
+
+GEOLOC = "data/raw/localidades/localidades.parquet"
+CACHE_FN = "data/working/localidades_lookup.npz"
+
+CELL_DEG = float(os.getenv("LOC_CELL_DEG", "0.0005"))  # ~55 m en Bogotá
+JOBS = int(os.getenv("LOC_JOBS", "0")) or os.cpu_count() or 1
+CHUNK = 200_000  # puntos de borde por tarea del pool
+
+FUERA, BORDE = -1, -2
+_VERSION = 1
+
+
+def _sha(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def _name_col(cols):
+    return (
+        "LOCALIDAD"
+        if "LOCALIDAD" in cols
+        else [c for c in cols if "LOCAL" in c.upper()][0]
+    )
+
+
+def _exactos(polys, x, y) -> np.ndarray:
+    """Índice del polígono que contiene cada punto (o FUERA).
+
+    STRtree solo filtra por caja; la prueba exacta es contains_xy contra el polígono
+    preparado (el predicado "within" del árbol prepara los puntos, no los polígonos).
+    contains excluye el borde, igual que "within" en sjoin.
+    """
+    ip, ig = shapely.STRtree(polys).query(shapely.points(x, y))
+    hit = np.zeros(len(ip), bool)
+    for k in np.unique(ig):
+        sel = ig == k
+        shapely.prepare(polys[k])
+        hit[sel] = shapely.contains_xy(polys[k], x[ip[sel]], y[ip[sel]])
+    ip, ig = ip[hit], ig[hit]
+    out = np.full(len(x), FUERA, np.int16)
+    # polígonos que se solapan: gana el primero, como una fila de sjoin
+    out[ip[::-1]] = ig[::-1]
+    return out
+
+
+def _exactos_chunk(args):
+    cache, x, y = args
+    return _exactos(Asignador.cargar(cache).polys, x, y)
+
+
+class Asignador:
+    def __init__(self, names, polys, x0, y0, cell, labels, fuente=""):
+        self.names = np.asarray(names, dtype=object)
+        self.polys = np.asarray(polys)
+        self.x0, self.y0, self.cell = float(x0), float(y0), float(cell)
+        self.labels = labels  # (ny, nx) int8
+        self.fuente = fuente
+        self.version = _VERSION
+        self.cache = None  # ruta del npz si se cargó/guardó en disco
+
+    # ---------- construcción ----------
+    @classmethod
+    def desde_capa(cls, path=GEOLOC, cell=CELL_DEG, fuente=None):
+        locs = read_geoparquet(path).to_crs(4326)
+        col = _name_col(locs.columns)
+        names = locs[col].astype(str).str.upper().str.strip().to_numpy()
+        polys = locs.geometry.to_numpy()
+        xmin, ymin, xmax, ymax = shapely.total_bounds(polys)
+        x0, y0 = xmin - cell, ymin - cell
+        nx = int(np.ceil((xmax + cell - x0) / cell))
+        ny = int(np.ceil((ymax + cell - y0) / cell))
+        labels = np.full((ny, nx), FUERA, np.int8)
+
+        # interior: centro de celda dentro de un polígono (contains_xy preparado)
+        cx = x0 + (np.arange(nx) + 0.5) * cell
+        cy = y0 + (np.arange(ny) + 0.5) * cell
+        for k, poly in enumerate(polys):
+            shapely.prepare(poly)
+            bx0, by0, bx1, by1 = shapely.bounds(poly)
+            ix = np.nonzero((cx >= bx0) & (cx <= bx1))[0]
+            iy = np.nonzero((cy >= by0) & (cy <= by1))[0]
+            gx, gy = np.meshgrid(cx[ix], cy[iy])
+            inside = shapely.contains_xy(poly, gx, gy)
+            sub = labels[np.ix_(iy, ix)]
+            sub[inside] = k
+            labels[np.ix_(iy, ix)] = sub
+
+        # borde: bordes densificados a media celda + 1 celda de margen, así toda
+        # celda que el borde atraviesa queda marcada aunque solo roce una esquina
+        edges = shapely.segmentize(shapely.boundary(polys), cell / 2)
+        bxy = shapely.get_coordinates(edges)
+        bi = np.floor((bxy[:, 0] - x0) / cell).astype(np.int64)
+        bj = np.floor((bxy[:, 1] - y0) / cell).astype(np.int64)
+        for di in (-1, 0, 1):
+            for dj in (-1, 0, 1):
+                labels[np.clip(bj + dj, 0, ny - 1), np.clip(bi + di, 0, nx - 1)] = BORDE
+        return cls(names, polys, x0, y0, cell, labels, fuente or _sha(path))
+
+    # ---------- forma binaria ----------
+    def guardar(self, cache=CACHE_FN) -> None:
+        gtype, coords, offsets = shapely.to_ragged_array(self.polys)
+        os.makedirs(os.path.dirname(cache), exist_ok=True)
+        tmp = f"{cache}.tmp.npz"
+        np.savez(
+            tmp,
+            version=_VERSION,
+            fuente=self.fuente,
+            names=self.names.astype(str),
+            gtype=int(gtype),
+            coords=coords,
+            **{f"off{i}": o for i, o in enumerate(offsets)},
+            origen=np.array([self.x0, self.y0, self.cell]),
+            labels=self.labels,
+        )
+        os.replace(tmp, cache)
+        self.cache = cache
+
+    @classmethod
+    def cargar(cls, cache=CACHE_FN):
+        with np.load(cache) as z:
+            offsets = tuple(z[f"off{i}"] for i in range(3) if f"off{i}" in z)
+            polys = shapely.from_ragged_array(
+                shapely.GeometryType(int(z["gtype"])), z["coords"], offsets
+            )
+            x0, y0, cell = z["origen"]
+            a = cls(z["names"], polys, x0, y0, cell, z["labels"], str(z["fuente"]))
+            a.version = int(z["version"])
+        a.cache = cache
+        return a
+
+    # ---------- consulta ----------
+    def codigos(self, lon, lat, jobs=JOBS) -> np.ndarray:
+        """Índice de localidad por punto (FUERA si no cae en ninguna)."""
+        x, y = np.asarray(lon, dtype=float), np.asarray(lat, dtype=float)
+        ny, nx = self.labels.shape
+        i = np.floor((x - self.x0) / self.cell)
+        j = np.floor((y - self.y0) / self.cell)
+        ok = (i >= 0) & (i < nx) & (j >= 0) & (j < ny)  # NaN → False
+        out = np.full(len(x), FUERA, np.int16)
+        out[ok] = self.labels[j[ok].astype(np.int64), i[ok].astype(np.int64)]
+        borde = np.nonzero(out == BORDE)[0]
+        if len(borde) == 0:
+            return out
+        if jobs > 1 and len(borde) > CHUNK and self.cache:
+            parts = [borde[s : s + CHUNK] for s in range(0, len(borde), CHUNK)]
+            with ProcessPoolExecutor(jobs) as ex:
+                res = ex.map(_exactos_chunk, [(self.cache, x[p], y[p]) for p in parts])
+                out[borde] = np.concatenate(list(res))
+        else:
+            out[borde] = _exactos(self.polys, x[borde], y[borde])
+        return out
+
+    def nombres(self, lon, lat, **kw) -> np.ndarray:
+        """Nombre de localidad por punto (None fuera de Bogotá)."""
+        return np.append(self.names, None)[self.codigos(lon, lat, **kw)]
+
+
+def cargar_asignador(path=GEOLOC, cache=CACHE_FN) -> Asignador:
+    """Asignador desde el npz si corresponde a la capa actual; si no, lo reconstruye."""
+    fuente = _sha(path)
+    try:
+        a = Asignador.cargar(cache)
+        if a.version == _VERSION and a.fuente == fuente and a.cell == CELL_DEG:
+            return a
+    except (OSError, KeyError, ValueError):
+        pass  # sin cache o de otra versión
+    a = Asignador.desde_capa(path, fuente=fuente)
+    a.guardar(cache)
+    return a
@@ -1,66 +1,132 @@
 # Uso: python -m src.transform.calc_proximidad_semaforos
-# Calcula distancia al semáforo más cercano (m) y buckets.
-
-import os, pandas as pd, geopandas as gpd
-from scipy.spatial import cKDTree
+# Calcula distancia al semáforo más cercano (m), su id, semáforos a 100/300 m y buckets.
+# Las consultas usan el índice persistente de src.transform.indice_semaforos; las
+# distancias son en metros de la proyección PROX_CRS (local por defecto, ver
+# src.transform.proyeccion), cada dataset se proyecta una sola vez en NumPy.
+# Los buckets (bordes PROX_BUCKETS) son un categórico ordenado (diccionario en Parquet)
+# y se escribe además el histograma por localidad, que es lo que leen los KPI, la
+# interpretación y el dashboard.
+# Validación: python -m src.transform.calc_proximidad_semaforos --validar
+#   compara las distancias contra haversine y la geodésica WGS84 (no escribe nada).
+
+import argparse
+import os, pandas as pd
 import numpy as np
 
+from src.extract.geoparquet import read_geoparquet, write_geoparquet
+from src.transform.indice_semaforos import IndiceSemaforos, cargar_indice
+from src.transform.proyeccion import CRS_METRICO, geodesica_m, haversine_m
+
 RAW_SEM = "data/raw/semaforos/semaforos_raw.parquet"
 CLEAN_DIR = "data/clean"
+IN_COMP = f"{CLEAN_DIR}/comparendos_2018_loc.parquet"
+IN_SIN = f"{CLEAN_DIR}/siniestralidad_2018_loc.parquet"
 OUT_COMP = f"{CLEAN_DIR}/comparendos_2018_dist_semaforos.parquet"
 OUT_SIN = f"{CLEAN_DIR}/siniestralidad_2018_dist_semaforos.parquet"
-
-
-def _nearest_dist_m(points_gdf, sem_gdf):
-    p_3857 = points_gdf.to_crs(3857)
-    s_3857 = sem_gdf.to_crs(3857)
-    tree = cKDTree(np.c_[s_3857.geometry.x, s_3857.geometry.y])
-    dist, _ = tree.query(np.c_[p_3857.geometry.x, p_3857.geometry.y], k=1)
-    return dist  # metros en 3857
-
-
-def _bucket(d):
-    if pd.isna(d):
-        return "SIN_COORD"
-    if d <= 100:
-        return "0-100m"
-    if d <= 300:
-        return "100-300m"
-    return ">300m"
-
-
-def _to_points(df):
-    gdf = gpd.GeoDataFrame(
-        df, geometry=gpd.points_from_xy(df["lon"], df["lat"]), crs=4326
-    )
-    return gdf.dropna(subset=["geometry"])
+OUT_HIST = f"{CLEAN_DIR}/proximidad_buckets_localidad.parquet"
+
+INPUTS = [RAW_SEM, IN_COMP, IN_SIN]
+OUTPUTS = [OUT_COMP, OUT_SIN, OUT_HIST]
+ENV_VARS = ["PROX_CRS", "PROX_BUCKETS"]
+
+# bordes superiores (m, cerrados a la derecha): 100,300 → 0-100m | 100-300m | >300m
+EDGES = [float(v) for v in os.getenv("PROX_BUCKETS", "100,300").split(",")]
+SIN_COORD = "SIN_COORD"
+LOC_COL = "LOCALIDAD_JOIN"
+
+
+def bucket_labels(edges=EDGES):
+    lo = [0] + list(edges[:-1])
+    labels = [f"{a:g}-{b:g}m" for a, b in zip(lo, edges)]
+    return labels + [f">{edges[-1]:g}m", SIN_COORD]
+
+
+def buckets(d, edges=EDGES) -> pd.Categorical:
+    """Bucket de distancia en bloque (np.searchsorted) como categórico ordenado."""
+    d = np.asarray(d, dtype=float)
+    codes = np.searchsorted(np.asarray(edges, float), d, side="left")
+    codes[np.isnan(d)] = len(edges) + 1
+    return pd.Categorical.from_codes(codes, bucket_labels(edges), ordered=True)
+
+
+def histograma(comp: pd.DataFrame, sin: pd.DataFrame) -> pd.DataFrame:
+    """Eventos por (dataset, LOCALIDAD, dist_bucket), incluidos los buckets vacíos."""
+    parts = []
+    for nombre, df in (("comparendos", comp), ("siniestros", sin)):
+        loc = df[LOC_COL] if LOC_COL in df.columns else pd.Series(pd.NA, df.index)
+        n = (
+            df.groupby(
+                [loc.rename("LOCALIDAD"), "dist_bucket"], observed=False, dropna=False
+            )
+            .size()
+            .rename("n")
+            .reset_index()
+        )
+        n.insert(0, "dataset", nombre)
+        parts.append(n)
+    hist = pd.concat(parts, ignore_index=True)
+    hist["dataset"] = hist["dataset"].astype("category")
+    hist["n"] = hist["n"].astype(np.int32)
+    return hist
+
+
+def add_distancias(df: pd.DataFrame, idx: IndiceSemaforos):
+    # una sola proyección (NumPy) del dataset al CRS del índice
+    xy = idx.proyectar(df["lon"], df["lat"])
+    for col, values in idx.features(xy).items():
+        df[col] = values
+    df["dist_bucket"] = buckets(df["dist_sem_m"])
+    return df
+
+
+def validar(df: pd.DataFrame, idx: IndiceSemaforos, nombre: str) -> None:
+    # par (punto, semáforo más cercano) según el índice → distancia de referencia
+    dist, pos = idx.tree.query(idx.proyectar(df["lon"], df["lat"]), k=1, workers=-1)
+    sem = idx.lonlat[pos]
+    ref = {
+        "haversine": haversine_m(df["lon"], df["lat"], sem[:, 0], sem[:, 1]),
+        "geodésica": geodesica_m(df["lon"], df["lat"], sem[:, 0], sem[:, 1]),
+    }
+    b = buckets(dist)
+    for ref_name, d in ref.items():
+        err = dist - d
+        rel = np.abs(err[d > 1]) / d[d > 1]
+        otro = (buckets(d) != b).sum()
+        print(
+            f"  {nombre:12} vs {ref_name:9}: |error| máx {np.abs(err).max():.2f} m, "
+            f"p99 {np.quantile(np.abs(err), 0.99):.2f} m, relativo máx {rel.max():.3%}"
+            f" | {otro} de {len(d)} con otro bucket"
+        )
 
 
 def main():
-    sem = pd.read_parquet(RAW_SEM)
-    gsem = gpd.GeoDataFrame(
-        sem, geometry=gpd.points_from_xy(sem["lon"], sem["lat"]), crs=4326
-    ).dropna(subset=["geometry"])
-
-    comp = pd.read_parquet(f"{CLEAN_DIR}/comparendos_2018_loc.parquet").dropna(
-        subset=["lat", "lon"]
-    )
-    sin = pd.read_parquet(f"{CLEAN_DIR}/siniestralidad_2018_loc.parquet").dropna(
-        subset=["lat", "lon"]
+    ap = argparse.ArgumentParser()
+    ap.add_argument(
+        "--validar",
+        action="store_true",
+        help="comparar contra haversine/geodésica en lugar de escribir",
     )
+    args = ap.parse_args()
+
+    idx = cargar_indice(RAW_SEM)
 
-    gcomp = _to_points(comp)
-    gsin = _to_points(sin)
+    comp = read_geoparquet(IN_COMP).dropna(subset=["lat", "lon"])
+    sin = read_geoparquet(IN_SIN).dropna(subset=["lat", "lon"])
 
-    comp["dist_sem_m"] = _nearest_dist_m(gcomp, gsem)
-    sin["dist_sem_m"] = _nearest_dist_m(gsin, gsem)
+    if args.validar:
+        print(f"CRS métrico: {idx.crs}")
+        validar(comp, idx, "comparendos")
+        validar(sin, idx, "siniestros")
+        return
 
-    comp["dist_bucket"] = comp["dist_sem_m"].map(_bucket)
-    sin["dist_bucket"] = sin["dist_sem_m"].map(_bucket)
+    add_distancias(comp, idx)
+    add_distancias(sin, idx)
 
-    comp.to_parquet(OUT_COMP, index=False)
-    sin.to_parquet(OUT_SIN, index=False)
-    print(f"OK → {OUT_COMP} | {OUT_SIN}")
+    write_geoparquet(comp, OUT_COMP)
+    write_geoparquet(sin, OUT_SIN)
+    histograma(comp, sin).to_parquet(OUT_HIST, index=False)
+    print(f"OK → {OUT_COMP} | {OUT_SIN} (distancias en CRS {CRS_METRICO})")
+    print(f"OK → {OUT_HIST} (buckets {bucket_labels()[:-1]})")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,111 @@
+# Uso: python -m src.transform.cubo_espacio_tiempo
+# Cubo espacio-tiempo: conteos de comparendos y siniestros por (celda, mes, día de la
+# semana, hora) sobre celdas cuadradas de CUBO_CELL_M m alineadas a las de
+# agregacion_hex (mismo cell_id). Se guarda disperso (solo las combinaciones con
+# eventos, formato COO) en Parquet con enteros pequeños y ordenado por celda: el
+# dashboard filtra y anima por tiempo sumando estos agregados, sin releer eventos.
+# Fechas con las mismas reglas que el almacén de eventos (almacen_eventos.fecha_local):
+# FECHA_HORA de comparendos (ArcGIS, UTC) pasa a la hora de Bogotá; los siniestros sin
+# fecha toman el mes de mes_procesado. Lo que no se conoce queda en -1: la hora de los
+# siniestros (el anuario trae solo el día) y el día de la semana sin fecha.
+
+import os
+
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+
+from src.extract.almacen_eventos import FECHAS, MES_RESPALDO, fecha_local, mes_respaldo
+from src.extract.geoparquet import read_geoparquet
+from src.transform.agregacion_hex import cell_id, cell_index
+
+CLEAN = "data/clean"
+ANAL = "data/analytics"
+os.makedirs(ANAL, exist_ok=True)
+
+IN_COMP = f"{CLEAN}/comparendos_2018_loc.parquet"
+IN_SIN = f"{CLEAN}/siniestralidad_2018_loc.parquet"
+OUT_CUBO = f"{ANAL}/cubo_espacio_tiempo.parquet"
+
+INPUTS = [IN_COMP, IN_SIN]
+OUTPUTS = [OUT_CUBO]
+ENV_VARS = ["CUBO_CELL_M"]
+
+CELL_M = int(os.getenv("CUBO_CELL_M", "500"))
+CAPAS = ("comparendos", "siniestros")
+DIMS = ["mes", "dow", "hora"]  # 1-12, 0 = lunes, 0-23
+SIN_DATO = -1
+# (mes, dow, hora) + 1 en un entero de 12 bits: ((mes * 8) + dow) * 25 + hora
+_T = 4096
+
+
+def tiempo_de(df: pd.DataFrame) -> pd.DataFrame:
+    """mes, dow y hora (int8, hora local) de cada evento; -1 si no hay dato."""
+    f = fecha_local(df)
+    # fechas solo de día (todas a medianoche): la hora no se conoce
+    validas = f.dropna()
+    con_hora = bool((validas != validas.dt.normalize()).any())
+    mes = f.dt.month.astype("Int16").fillna(mes_respaldo(df))
+    t = pd.DataFrame({"mes": mes, "dow": f.dt.dayofweek, "hora": f.dt.hour})
+    t = t.astype("Int16").fillna(SIN_DATO).astype(np.int8)
+    if not con_hora:
+        t["hora"] = np.int8(SIN_DATO)
+    return t
+
+
+def cubo(xy_c, xy_s, t_c, t_s, size_m=CELL_M) -> pd.DataFrame:
+    """Conteos no nulos por (capa, cell_id, mes, dow, hora) desde puntos en 3857."""
+    partes = []
+    for capa, xy, t in zip(CAPAS, (xy_c, xy_s), (t_c, t_s)):
+        i, j = cell_index(xy[:, 0], xy[:, 1], size_m, "square")
+        m, d, h = (t[c].to_numpy(np.int64) + 1 for c in DIMS)
+        # celda y tiempo en un solo entero: un np.unique hace el conteo
+        claves, n = np.unique(
+            cell_id(i, j) * _T + (m * 8 + d) * 25 + h, return_counts=True
+        )
+        tt = claves % _T
+        partes.append(
+            pd.DataFrame(
+                {
+                    "capa": capa,
+                    "level": np.int16(size_m),
+                    "cell_id": claves // _T,
+                    "mes": (tt // 200 - 1).astype(np.int8),
+                    "dow": (tt // 25 % 8 - 1).astype(np.int8),
+                    "hora": (tt % 25 - 1).astype(np.int8),
+                    "n": n.astype(np.int32),
+                }
+            )
+        )
+    c = pd.concat(partes, ignore_index=True)
+    c["capa"] = pd.Categorical(c["capa"], categories=CAPAS)
+    return c
+
+
+def _leer(path):
+    # solo la geometría y las columnas de fecha que tenga la fuente
+    cols = pq.read_schema(path).names
+    fechas = [c for c in (*FECHAS, MES_RESPALDO) if c in cols]
+    pts = read_geoparquet(path, columns=["geometry", *fechas])
+    g = pts.geometry.to_crs(3857)
+    return np.c_[g.x, g.y], tiempo_de(pts)
+
+
+def main():
+    (xy_c, t_c), (xy_s, t_s) = _leer(IN_COMP), _leer(IN_SIN)
+    c = cubo(xy_c, xy_s, t_c, t_s)
+    c.to_parquet(OUT_CUBO, index=False, compression="zstd")
+    celdas = c["cell_id"].nunique()
+    denso = len(CAPAS) * celdas * 13 * 8 * 25
+    print(
+        f"OK → {OUT_CUBO} ({len(c)} combinaciones no nulas de {denso} "
+        f"[{len(c) / max(denso, 1):.2%}], {celdas} celdas de {CELL_M} m)"
+    )
+    # eventos que quedan fuera de los filtros por mes, día u hora
+    for capa, t in zip(CAPAS, (t_c, t_s)):
+        faltan = ", ".join(f"{d} {(t[d] == SIN_DATO).mean():.0%}" for d in DIMS)
+        print(f"{capa} sin dato: {faltan}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+# Canonización de direcciones antes de geocodificar: variantes del mismo lugar
+# ("KR" vs "CARRERA", cruce en orden inverso, colas "- 2", localidad con/sin tilde)
+# comparten una clave canónica y se geocodifican una sola vez.
+#   canonical_key("CARRERA 37A CON CALLE 10 - 2, PUENTE ARANDA, BOGOTÁ, COLOMBIA")
+#   → "CALLE 10 CON CARRERA 37A, PUENTE ARANDA"
+# La placa ("# 72-10") solo se descarta en los cruces; en una vía sola es lo que
+# distingue un lugar de otro y se conserva normalizada:
+#   canonical_key("KR 7 # 72 - 10, CHAPINERO") → "CARRERA 7 # 72-10, CHAPINERO"
+
+import re
+import unicodedata
+from typing import Dict, Iterable, List, Optional
+
+# abreviaturas → tipo de vía; AK/AC son la misma vía que KR/CL para ubicar el cruce
+TIPOS = {
+    "CL": "CALLE",
+    "CLL": "CALLE",
+    "CALLE": "CALLE",
+    "AC": "CALLE",
+    "AVENIDA CALLE": "CALLE",
+    "KR": "CARRERA",
+    "CR": "CARRERA",
+    "KRA": "CARRERA",
+    "CRA": "CARRERA",
+    "CARRERA": "CARRERA",
+    "AK": "CARRERA",
+    "AVENIDA CARRERA": "CARRERA",
+    "DG": "DIAGONAL",
+    "DIAGONAL": "DIAGONAL",
+    "TV": "TRANSVERSAL",
+    "TR": "TRANSVERSAL",
+    "TRANSVERSAL": "TRANSVERSAL",
+    "AV": "AVENIDA",
+    "AVENIDA": "AVENIDA",
+}
+CARDINALES = {"S": "SUR", "SUR": "SUR", "E": "ESTE", "ESTE": "ESTE"}
+SUFIJOS = {"BOGOTA", "BOGOTA D.C.", "BOGOTA DC", "COLOMBIA"}
+
+_TIPO_RE = "|".join(sorted((re.escape(t) for t in TIPOS), key=len, reverse=True))
+# S/E/N separada por espacio y seguida de fin, número, "#" o "-" es el cardinal
+# abreviado ("CALLE 10 E" → CALLE 10 ESTE), no la letra de la vía ("CALLE 10E")
+_NO_CARD = r"(?!(?<=\s)[SEN]\s*(?:$|[\d#-]))"
+_VIA = re.compile(
+    rf"^(?P<tipo>{_TIPO_RE})\.?\s+(?P<num>\d+)\s*{_NO_CARD}(?P<letra>[A-Z](?![A-Z]))?"
+    rf"\s*(?P<bis>BIS)?\s*{_NO_CARD}(?P<letra2>[A-Z](?![A-Z]))?"
+    r"\s*(?P<card>SUR|ESTE|NORTE|OESTE|S|E|N)?\b"
+)
+# placa: "# 72-10", "# 72 A - 10" (NO./N° se llevan antes a "#")
+_NUMERO = re.compile(r"\b(?:NO\.?|N°)\s*(?=\d)")
+_PLACA = re.compile(
+    r"#\s*(?P<n>\d+)\s*(?P<letra>[A-Z](?![A-Z]))?(?:\s*-\s*(?P<m>\d+))?"
+)
+
+
+def fold(s: str) -> str:
+    # sin tildes, mayúsculas, espacios simples
+    s = "".join(
+        ch for ch in unicodedata.normalize("NFD", s) if unicodedata.category(ch) != "Mn"
+    )
+    return re.sub(r"\s+", " ", s.upper()).strip()
+
+
+def _via(part: str) -> str:
+    part = re.sub(r"^(AVENIDA )+", "AVENIDA ", part)  # "AVENIDA AVENIDA BOYACA"
+    m = _VIA.match(part)
+    if not m:
+        # vía con nombre (AVENIDA BOYACA…): solo se quita la cola numérica
+        return re.sub(r"\s*[-#].*$", "", part).strip()
+    via = f"{TIPOS[m['tipo']]} {m['num']}{m['letra'] or ''}"
+    if m["bis"]:
+        via += " BIS" + (f" {m['letra2']}" if m["letra2"] else "")
+    # NORTE/OESTE son el lado por defecto de la grilla: no distinguen lugares
+    card = CARDINALES.get(m["card"] or "")
+    return f"{via} {card}" if card else via
+
+
+def _placa(part: str) -> Optional[str]:
+    m = _PLACA.search(part)
+    if not m:
+        return None
+    return f"# {m['n']}{m['letra'] or ''}" + (f"-{m['m']}" if m["m"] else "")
+
+
+def canonical_key(addr: str) -> Optional[str]:
+    if not isinstance(addr, str) or not addr.strip():
+        return None
+    parts = [p.strip() for p in fold(addr).split(",")]
+    core = _NUMERO.sub("# ", parts[0])
+    loc = [p for p in parts[1:] if p and p not in SUFIJOS]
+    partes = [v.strip() for v in re.split(r"\s+(?:CON|X|Y)\s+", core) if v.strip()]
+    vias = [_via(v) for v in partes]
+    key = " CON ".join(sorted(set(vias)))  # cruce independiente del orden
+    if len(partes) == 1 and key:
+        placa = _placa(partes[0])
+        key = f"{key} {placa}" if placa else key
+    if not key:
+        return None
+    return f"{key}, {loc[0]}" if loc else key
+
+
+def agrupar_variantes(queries: Iterable[str]) -> Dict[str, List[str]]:
+    """clave canónica → variantes (en el orden de entrada)."""
+    groups: Dict[str, List[str]] = {}
+    for q in queries:
+        k = canonical_key(q)
+        if k is not None:
+            groups.setdefault(k, []).append(q)
+    return groups
+
+
+def consulta(key: str) -> str:
+    # texto a enviar al geocodificador para una clave canónica
+    return f"{key}, BOGOTÁ, COLOMBIA"
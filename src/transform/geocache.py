@@ -0,0 +1,157 @@
+# Cache de geocodificación en SQLite (stdlib): clave = _sha de la dirección normalizada.
+# - inserciones incrementales en transacciones pequeñas (WAL): un corte no corrompe nada
+# - resultados nulos con TTL: pasado el plazo se consideran faltantes y se reintentan
+# - importación (una sola vez por archivo) de los caches JSON anteriores
+
+import os
+import json
+import time
+import sqlite3
+from typing import Dict, Iterable, List, Optional
+
+import pandas as pd
+
+NEG_TTL_DAYS = float(os.getenv("GEOCACHE_NEG_TTL_DAYS", "30"))
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS geocache (
+    key TEXT PRIMARY KEY,
+    q TEXT NOT NULL,
+    lat REAL,
+    lon REAL,
+    addr TEXT,
+    provider TEXT,
+    ts REAL NOT NULL
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS imports (
+    path TEXT PRIMARY KEY,
+    mtime REAL NOT NULL
+);
+"""
+
+_CHUNK = 900  # límite de parámetros por consulta en SQLite
+
+
+class GeoCache:
+    def __init__(self, path: str, neg_ttl_days: float = NEG_TTL_DAYS, commit_every=50):
+        self.path = path
+        self.neg_ttl = neg_ttl_days * 86400
+        self.commit_every = commit_every
+        self._pending = 0
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(_SCHEMA)
+        self.conn.commit()
+
+    # ---------- lectura ----------
+    def _valid_clause(self):
+        # hit positivo, o nulo todavía dentro del TTL
+        return "(lat IS NOT NULL OR ts >= ?)", (time.time() - self.neg_ttl,)
+
+    def _select(self, cols: str, keys: List[str]):
+        cond, args = self._valid_clause()
+        for i in range(0, len(keys), _CHUNK):
+            chunk = keys[i : i + _CHUNK]
+            marks = ",".join("?" * len(chunk))
+            yield from self.conn.execute(
+                f"SELECT {cols} FROM geocache WHERE key IN ({marks}) AND {cond}",
+                (*chunk, *args),
+            )
+
+    def get(self, key: str) -> Optional[Dict]:
+        row = next(self._select("q, lat, lon, addr", [key]), None)
+        return dict(zip(("q", "lat", "lon", "addr"), row)) if row else None
+
+    def __contains__(self, key: str) -> bool:
+        return self.get(key) is not None
+
+    def __len__(self) -> int:
+        return self.conn.execute("SELECT COUNT(*) FROM geocache").fetchone()[0]
+
+    def missing(self, keys: Iterable[str]) -> List[str]:
+        keys = list(dict.fromkeys(keys))
+        found = {k for (k,) in self._select("key", keys)}
+        return [k for k in keys if k not in found]
+
+    def frame(self, keys: Iterable[str]) -> pd.DataFrame:
+        """lat/lon/addr indexados por clave (solo entradas válidas), para mapear en bloque."""
+        keys = [k for k in dict.fromkeys(keys) if isinstance(k, str)]
+        rows = list(self._select("key, lat, lon, addr", keys))
+        return pd.DataFrame(rows, columns=["key", "lat", "lon", "addr"]).set_index(
+            "key"
+        )
+
+    def positives(self, exclude_providers=()) -> pd.DataFrame:
+        """Todas las entradas con coordenadas (q, lat, lon, addr, provider)."""
+        marks = ",".join("?" * len(exclude_providers))
+        where = f"AND provider NOT IN ({marks})" if exclude_providers else ""
+        rows = self.conn.execute(
+            "SELECT q, lat, lon, addr, provider FROM geocache "
+            f"WHERE lat IS NOT NULL {where}",
+            tuple(exclude_providers),
+        ).fetchall()
+        return pd.DataFrame(rows, columns=["q", "lat", "lon", "addr", "provider"])
+
+    # ---------- escritura ----------
+    def put(self, key, q, lat, lon, addr, provider=None, ts=None) -> None:
+        self.conn.execute(
+            "INSERT OR REPLACE INTO geocache VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (key, q, lat, lon, addr, provider, ts or time.time()),
+        )
+        self._pending += 1
+        if self._pending >= self.commit_every:
+            self.commit()
+
+    def commit(self) -> None:
+        self.conn.commit()
+        self._pending = 0
+
+    def import_json(self, path: str, provider: str) -> int:
+        """Importa un cache JSON {sha: {q, lat, lon, addr}}; no pisa entradas existentes."""
+        if not os.path.exists(path):
+            return 0
+        mtime = os.path.getmtime(path)
+        done = self.conn.execute(
+            "SELECT mtime FROM imports WHERE path = ?", (path,)
+        ).fetchone()
+        if done and done[0] >= mtime:
+            return 0
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except ValueError:
+            print(f"⚠️ Cache JSON ilegible, se omite: {path}")
+            return 0
+        # ts = mtime del archivo: los nulos viejos vencen según su antigüedad real
+        rows = [
+            (
+                k,
+                v.get("q") or "",
+                v.get("lat"),
+                v.get("lon"),
+                v.get("addr"),
+                provider,
+                mtime,
+            )
+            for k, v in data.items()
+        ]
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO geocache VALUES (?, ?, ?, ?, ?, ?, ?)", rows
+            )
+            self.conn.execute(
+                "INSERT OR REPLACE INTO imports VALUES (?, ?)", (path, mtime)
+            )
+        return len(rows)
+
+    def close(self) -> None:
+        self.commit()
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
@@ -1,15 +1,23 @@
-# src/transform/geocode_addresses_google_parallel.py
+# Uso: python -m src.transform.geocode_addresses
+# Geocodifica direcciones de siniestros sin coordenadas (proveedor en GEOCODER_PROVIDER).
 
 import os
 import re
-import json
-import time
 import hashlib
+import numpy as np
 import pandas as pd
-from tqdm import tqdm
-from typing import Dict, Optional
+from typing import Optional
 from dotenv import load_dotenv
-import concurrent.futures
+
+from src.transform.direcciones_canonicas import agrupar_variantes, consulta
+from src.transform.geocache import GeoCache
+from src.transform.geocoder_grilla import GrillaIndex, GrillaProvider
+from src.transform.geocoding import (
+    BBOX,
+    FatalGeocodeError,
+    GeocodeEngine,
+    make_provider,
+)
 
 # cargar .env
 load_dotenv(dotenv_path=os.path.join(os.getcwd(), ".env"))
@@ -18,18 +26,31 @@ load_dotenv(dotenv_path=os.path.join(os.getcwd(), ".env"))
 RAW_IN = "data/raw/siniestralidad_2018/siniestralidad_2018_raw.parquet"
 CLEAN_DIR = "data/clean"
 WORK_DIR = "data/working"
-CACHE_FN = os.path.join(WORK_DIR, "geocache_google.json")
+CACHE_DB = os.path.join(WORK_DIR, "geocache.sqlite")
+# caches JSON anteriores: se importan una vez a SQLite
+LEGACY_CACHES = [
+    (os.path.join(WORK_DIR, "geocache_google.json"), "google"),
+    (os.path.join(WORK_DIR, "geocache_nominatim.json"), "nominatim"),
+]
 OUT_FN = os.path.join(CLEAN_DIR, "siniestralidad_2018_geocoded_google_parallel.parquet")
 
+INPUTS = [RAW_IN]
+OUTPUTS = [OUT_FN]
+ENV_VARS = ["GEOCODER_PROVIDER", "GEOCODER_LOCAL"]
+
 os.makedirs(CLEAN_DIR, exist_ok=True)
 os.makedirs(WORK_DIR, exist_ok=True)
 
 # config
 GOOGLE_API_KEY = os.getenv("GOOGLE_MAPS_API_KEY", "").strip()
-if not GOOGLE_API_KEY:
-    raise ValueError("No se encontró GOOGLE_MAPS_API_KEY en .env")
+# proveedor: google | nominatim | fake (local, para pruebas sin cuota)
+PROVIDER = os.getenv("GEOCODER_PROVIDER", "google").strip().lower()
+# solicitudes/segundo; vacío → el default del proveedor (google 40, nominatim 1)
+RPS = float(os.getenv("GEOCODER_RPS", "0") or 0) or None
+MAX_WORKERS = int(os.getenv("GEOCODER_WORKERS", "8"))
+# geocodificador local de cruces antes del proveedor remoto (0 para desactivar)
+USE_GRILLA = os.getenv("GEOCODER_LOCAL", "1").strip() != "0"
 
-BBOX = (-74.25, 4.45, -73.95, 4.90)  # Bogotá
 MAP_TIPO = {
     "CL": "CALLE",
     "KR": "CARRERA",
@@ -96,71 +117,185 @@ def _addr_core(row: pd.Series) -> Optional[str]:
     return (base + (f", {loc}" if loc else "") + ", BOGOTÁ, COLOMBIA").strip(", ")
 
 
+# ---------- versión columnar de _addr_core (mismas cadenas, sin apply por fila) ----------
+VIA_COLS = {
+    1: ("tipovia1", "numerovia1", "letravia1", "cardinalvia1"),
+    2: ("tipovia2", "numerovia2", "letravia2", "cardinalvia2"),
+}
+DIR_COLS = (
+    "direccion",
+    "direccion_normalizada",
+    "dir",
+    "direccion_accidente",
+    "direccion_sitio",
+)
+
+
+def _col(df: pd.DataFrame, c: str) -> pd.Series:
+    # equivale a row.get(c): columna ausente → None
+    if c in df.columns:
+        return df[c]
+    # np.full: pd.Series(None, dtype=object) da NaN (no falsy) en pandas 3
+    return pd.Series(np.full(len(df), None, dtype=object), index=df.index)
+
+
+def _falsy(s: pd.Series) -> np.ndarray:
+    # replica `not x` sobre el valor crudo: None y "" son falsos; NaN (float) no
+    v = s.to_numpy(dtype=object)
+    return (v == None) | (v == "")  # noqa: E711 (comparación elemento a elemento)
+
+
+def _clean_vec(s: pd.Series) -> pd.Series:
+    # limpia solo los valores distintos (pocos por columna) y reexpande por código
+    codes, uniq = pd.factorize(s)
+    clean = pd.Series(uniq, dtype=object).astype(str).str.strip().str.upper()
+    clean = clean.str.replace(r"\s+", " ", regex=True).to_numpy(dtype=object)
+    return pd.Series(np.append(clean, "")[codes], index=s.index, dtype=object)
+
+
+def _join2(a: pd.Series, b: pd.Series, sep: str) -> pd.Series:
+    # " ".join de las partes no vacías (a y b ya vienen sin espacios en los extremos)
+    out = a.where(b == "", a + sep + b)
+    return out.where(a != "", b)
+
+
+def _fmt_via_vec(tipo, num, letra, card) -> pd.Series:
+    t = _clean_vec(tipo)
+    t = t.map(MAP_TIPO).fillna(t)
+    base = _join2(t, _clean_vec(num) + _clean_vec(letra), " ")
+    c = _clean_vec(card)
+    c = c.map(MAP_CARD).fillna(c)
+    out = _join2(base, c, " ")
+    return out.where(~(_falsy(tipo) & _falsy(num)), "")
+
+
+def _addr_core_vec(df: pd.DataFrame) -> pd.Series:
+    p1, p2 = (_fmt_via_vec(*(_col(df, c) for c in VIA_COLS[i])) for i in (1, 2))
+    base = _join2(p1, p2, " CON ")
+    for c in DIR_COLS:
+        empty = base == ""
+        if c not in df.columns or not empty.any():
+            continue
+        raw = df.loc[empty, c]
+        ok = raw.map(lambda v: isinstance(v, str) and bool(v.strip()))
+        if ok.any():
+            base.loc[ok[ok].index] = _clean_vec(raw[ok])
+    loc_raw = _col(df, "localidad")
+    loc_raw = loc_raw.where(~_falsy(loc_raw), _col(df, "LOCALIDAD"))
+    loc = _clean_vec(loc_raw.where(~_falsy(loc_raw), ""))
+    out = (base + (", " + loc).where(loc != "", "") + ", BOGOTÁ, COLOMBIA").str.strip(
+        ", "
+    )
+    return out.astype(object).where(base != "", None)
+
+
+def _in_bbox_mask(lat, lon) -> pd.Series:
+    lat = pd.to_numeric(lat, errors="coerce")
+    lon = pd.to_numeric(lon, errors="coerce")
+    return lat.between(BBOX[1], BBOX[3]) & lon.between(BBOX[0], BBOX[2])
+
+
 def _in_bbox(lat, lon) -> bool:
     if pd.isna(lat) or pd.isna(lon):
         return False
     return (BBOX[1] <= lat <= BBOX[3]) and (BBOX[0] <= lon <= BBOX[2])
 
 
-def _load_cache() -> Dict[str, Dict]:
-    if os.path.exists(CACHE_FN):
-        try:
-            with open(CACHE_FN, "r", encoding="utf-8") as f:
-                return json.load(f)
-        except Exception:
-            return {}
-    return {}
+# ============================ geocoding ============================
+def geocode_parallel(addresses, cache, max_workers=MAX_WORKERS):
+    provider = make_provider(PROVIDER, api_key=GOOGLE_API_KEY, bbox=BBOX)
+    engine = GeocodeEngine(provider, rps=RPS, max_workers=max_workers)
+    results = {}
 
+    def _on_result(addr, res):
+        results[addr] = res
+        lat, lon, fmt = res
+        # commit incremental cada 50 resultados (GeoCache.commit_every)
+        cache.put(_sha(addr), addr, lat, lon, fmt, provider=provider.name)
 
-def _save_cache(cache: Dict[str, Dict]) -> None:
-    with open(CACHE_FN, "w", encoding="utf-8") as f:
-        json.dump(cache, f, ensure_ascii=False, indent=2)
+    try:
+        engine.run(addresses, on_result=_on_result, desc=f"geocode {provider.name}")
+    except FatalGeocodeError as e:
+        # clave rechazada / sin facturación: nada de negativos en el cache; lo ya
+        # resuelto queda guardado al cerrar el GeoCache
+        print("📈", engine.stats.report())
+        raise SystemExit(f"❌ Geocodificación abortada: {e}")
+    print("📈", engine.stats.report())
+    return results
 
 
-# ============================ geocoding ============================
-def geocode_one(address: str):
-    from googlemaps import Client
-
-    gmaps = Client(key=GOOGLE_API_KEY)
-    try:
-        res = gmaps.geocode(address, region="co")
-        if res:
-            loc = res[0]["geometry"]["location"]
-            formatted = res[0].get("formatted_address")
-            return (address, loc.get("lat"), loc.get("lng"), formatted)
-    except Exception:
-        return (address, None, None, None)
-    return (address, None, None, None)
+def _precise(addr: pd.Series) -> pd.Series:
+    # resultados de Google a nivel de cruce ("Cl. 10 & Cra. 37a, ..."); los de calle
+    # suelta son centroides de la vía y contaminan el índice
+    return addr.str.contains(" & ", regex=False, na=False)
 
 
-def geocode_parallel(addresses, max_workers=10):
-    results = {}
-    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
-        for addr, lat, lon, fmt in tqdm(
-            executor.map(geocode_one, addresses),
-            total=len(addresses),
-            desc="Google geocode",
-        ):
-            results[addr] = (lat, lon, fmt)
-            if len(results) % 50 == 0:  # guardado incremental
-                _save_cache(
-                    cache
-                    | {
-                        _sha(k): {"q": k, "lat": v[0], "lon": v[1], "addr": v[2]}
-                        for k, v in results.items()
-                    }
+def _grilla_training(df: pd.DataFrame, cache: GeoCache) -> pd.DataFrame:
+    # coordenadas de origen + aciertos remotos a nivel de cruce (cache y salida previa)
+    cols = ["addr_core", "lat", "lon"]
+    parts = [df.loc[df["lat"].notna() & df["lon"].notna(), cols]]
+    hits = cache.positives(exclude_providers=("grilla", "fake", "canonica"))
+    hits = hits.rename(columns={"q": "addr_core"})
+    parts.append(hits.loc[_precise(hits["addr"]), cols])
+    if os.path.exists(OUT_FN):
+        prev = pd.read_parquet(OUT_FN, columns=cols + ["geocode_address"])
+        parts.append(prev.loc[_precise(prev["geocode_address"]), cols])
+    return pd.concat(parts, ignore_index=True)
+
+
+def geocode_grilla(queries, df: pd.DataFrame, cache: GeoCache):
+    """Resuelve localmente los cruces que se pueda; devuelve los que siguen faltando."""
+    train = _grilla_training(df, cache)
+    index = GrillaIndex.fit(train["addr_core"], train["lat"], train["lon"])
+    provider = GrillaProvider(index)
+    rest = []
+    for q in queries:
+        lat, lon, fmt = provider.geocode(q)
+        if lat is None:
+            rest.append(q)
+        else:
+            cache.put(_sha(q), q, lat, lon, fmt, provider=provider.name)
+    cache.commit()
+    print(
+        f"🧭 Grilla local ({index.stats()}): "
+        f"{len(queries) - len(rest)} / {len(queries)} resueltas sin API"
+    )
+    return rest
+
+
+def propagar_canonicas(groups, cache: GeoCache):
+    """Copia a cada variante sin entrada el resultado conocido de su lugar canónico.
+
+    Devuelve las consultas canónicas de los lugares que aún no tienen ninguna entrada.
+    """
+    reps = {k: consulta(k) for k in groups}
+    keys = {q: _sha(q) for v in groups.values() for q in v}
+    keys.update({r: _sha(r) for r in reps.values()})
+    hits = cache.frame(keys.values())
+    lat, lon, addr = (hits[c].to_dict() for c in ("lat", "lon", "addr"))
+    pendientes, copiadas = [], 0
+    for k, variants in groups.items():
+        cand = [keys[reps[k]]] + [keys[q] for q in variants]
+        known = [h for h in cand if h in lat]
+        if not known:
+            pendientes.append(reps[k])
+            continue
+        # preferir un acierto positivo a un nulo
+        best = next((h for h in known if pd.notna(lat[h])), known[0])
+        for q in variants:
+            if keys[q] not in lat:
+                cache.put(
+                    keys[q], q, lat[best], lon[best], addr[best], provider="canonica"
                 )
-                time.sleep(0.05)
-    return results
+                copiadas += 1
+    cache.commit()
+    return pendientes, copiadas
 
 
 # ============================ main ============================
 def main():
-    # 🚫 Si ya existe el parquet final, no hacer nada
-    if os.path.exists(OUT_FN):
-        print(f"✅ Archivo final ya existe: {OUT_FN}\nNada que hacer.")
-        return
-
+    # sin atajo "la salida ya existe": src/pipeline.py decide si hace falta correr
+    # (huella de entradas y código) y el cache evita repetir llamadas a la API
     if not os.path.exists(RAW_IN):
         raise FileNotFoundError(f"No existe entrada: {RAW_IN}")
 
@@ -175,44 +310,51 @@ def main():
         df["lat"] = pd.NA
         df["lon"] = pd.NA
 
-    df["addr_core"] = df.apply(_addr_core, axis=1)
+    df["addr_core"] = _addr_core_vec(df)
     need = df[(df["lat"].isna()) | (df["lon"].isna())]
     queries = need["addr_core"].dropna().drop_duplicates()
     queries = [q for q in queries if isinstance(q, str) and len(q) >= 8]
 
-    cache = _load_cache()
-
-    # 🚫 Si todas las direcciones ya están en cache, no llamar API
-    all_in_cache = all(_sha(q) in cache for q in queries)
-    if all_in_cache:
-        print(f"✅ Cache completa ({len(cache)} direcciones). Nada que hacer.")
-    else:
-        missing = [q for q in queries if _sha(q) not in cache]
-        print("Total a geocodificar:", len(missing))
-        if missing:
-            results = geocode_parallel(missing, max_workers=8)
-            for q, (lat, lon, fmt) in results.items():
-                cache[_sha(q)] = {"q": q, "lat": lat, "lon": lon, "addr": fmt}
-            _save_cache(cache)
-
-    # aplicar resultados
-    def _pick(a, key):
-        return cache.get(_sha(a), {}).get(key, pd.NA)
-
-    df["lat_fill"] = df["addr_core"].map(lambda a: _pick(a, "lat"))
-    df["lon_fill"] = df["addr_core"].map(lambda a: _pick(a, "lon"))
-    df["geocode_address"] = df["addr_core"].map(lambda a: _pick(a, "addr"))
+    with GeoCache(CACHE_DB) as cache:
+        for fn, prov in LEGACY_CACHES:
+            n = cache.import_json(fn, prov)
+            if n:
+                print(f"↪ Importadas {n} entradas de {fn}")
+
+        # variantes del mismo lugar (orden del cruce, abreviaturas, "- 2") → una clave
+        groups = agrupar_variantes(queries)
+        ratio = len(queries) / len(groups) if groups else 1.0
+        print(
+            f"🔁 Canonización: {len(queries)} variantes → {len(groups)} lugares "
+            f"(x{ratio:.2f})"
+        )
+
+        # 🚫 Si todos los lugares ya están en cache, no llamar API
+        missing, copiadas = propagar_canonicas(groups, cache)
+        if copiadas:
+            print(f"↪ {copiadas} variantes resueltas con el cache de su lugar canónico")
+        if not missing:
+            print(f"✅ Cache completa ({len(cache)} direcciones). Nada que hacer.")
+        else:
+            print("Total a geocodificar:", len(missing))
+            if USE_GRILLA:
+                missing = geocode_grilla(missing, df, cache)
+            if missing:
+                geocode_parallel(missing, cache)
+            cache.commit()
+            propagar_canonicas(groups, cache)
+
+        # aplicar resultados (lookup por hash, en bloque)
+        keys = df["addr_core"].map(_sha, na_action="ignore")
+        hits = cache.frame(keys.dropna())
+
+    df["lat_fill"] = keys.map(hits["lat"])
+    df["lon_fill"] = keys.map(hits["lon"])
+    df["geocode_address"] = keys.map(hits["addr"])
     df.loc[df["lat"].isna(), "lat"] = df["lat_fill"]
     df.loc[df["lon"].isna(), "lon"] = df["lon_fill"]
 
-    mask_ok = df.apply(
-        lambda r: (
-            _in_bbox(r["lat"], r["lon"])
-            if pd.notna(r["lat"]) and pd.notna(r["lon"])
-            else False
-        ),
-        axis=1,
-    )
+    mask_ok = _in_bbox_mask(df["lat"], df["lon"])
     df.loc[~mask_ok, ["lat", "lon", "geocode_address"]] = pd.NA
 
     df.to_parquet(OUT_FN, index=False)
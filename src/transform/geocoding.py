@@ -0,0 +1,335 @@
+# Motor de geocodificación: proveedores intercambiables (Google, Nominatim, fake local),
+# un cliente HTTP reutilizado por hilo de trabajo, token bucket de solicitudes/segundo,
+# reintentos con backoff + jitter y métricas de throughput/latencia.
+# Uso típico:
+#   engine = GeocodeEngine(make_provider("google", api_key=...), rps=40, max_workers=8)
+#   results = engine.run(addresses)   # {address: (lat, lon, formatted)}
+#   print(engine.stats.report())
+
+import time
+import random
+import collections
+import hashlib
+import threading
+import concurrent.futures
+from typing import Callable, Dict, Optional, Tuple
+
+import requests
+from tqdm import tqdm
+
+Result = Tuple[Optional[float], Optional[float], Optional[str]]
+EMPTY: Result = (None, None, None)
+
+BBOX = (-74.25, 4.45, -73.95, 4.90)  # Bogotá (lon_min, lat_min, lon_max, lat_max)
+
+
+class TransientGeocodeError(Exception):
+    """Falla recuperable (cuota, timeout, 5xx): el motor reintenta."""
+
+
+class FatalGeocodeError(Exception):
+    """Falla de la cuenta o del acceso (clave rechazada, sin facturación): el motor
+    aborta la corrida en vez de marcar cada dirección como fallida."""
+
+
+# ============================ proveedores ============================
+class Provider:
+    name = "base"
+    default_rps = 10.0
+
+    def __init__(self):
+        self._local = threading.local()
+
+    def _client(self):
+        # un cliente por hilo: conexiones reutilizadas sin compartir estado entre hilos
+        c = getattr(self._local, "client", None)
+        if c is None:
+            c = self._local.client = self._new_client()
+        return c
+
+    def _new_client(self):
+        return None
+
+    def geocode(self, address: str) -> Result:
+        raise NotImplementedError
+
+
+class GoogleProvider(Provider):
+    name = "google"
+    default_rps = 40.0  # la cuota estándar de Geocoding API es 50 QPS
+
+    def __init__(self, api_key: str):
+        super().__init__()
+        if not api_key:
+            raise ValueError("No se encontró GOOGLE_MAPS_API_KEY en .env")
+        self.api_key = api_key
+
+    def _new_client(self):
+        from googlemaps import Client
+
+        # el ritmo y los reintentos los controla el motor, no el cliente
+        return Client(key=self.api_key, queries_per_second=1000, retry_timeout=0)
+
+    def geocode(self, address: str) -> Result:
+        from googlemaps import exceptions as gexc
+
+        try:
+            res = self._client().geocode(address, region="co")
+        except (gexc.Timeout, gexc.TransportError) as e:
+            raise TransientGeocodeError(str(e)) from e
+        except gexc.ApiError as e:
+            # ZERO_RESULTS no llega aquí (el cliente devuelve []): ningún ApiError es
+            # "sin resultado", así que nunca se guarda como negativo en el cache
+            if e.status in ("OVER_QUERY_LIMIT", "UNKNOWN_ERROR"):
+                raise TransientGeocodeError(e.status) from e
+            if e.status == "REQUEST_DENIED":
+                raise FatalGeocodeError(f"Google {e.status}: {e.message}") from e
+            raise  # INVALID_REQUEST, ...: fallida, se reintenta en otra corrida
+        if res:
+            loc = res[0]["geometry"]["location"]
+            return (loc.get("lat"), loc.get("lng"), res[0].get("formatted_address"))
+        return EMPTY
+
+
+class NominatimProvider(Provider):
+    name = "nominatim"
+    default_rps = 1.0  # política de uso del servidor público
+    URL = "https://nominatim.openstreetmap.org/search"
+
+    def __init__(self, user_agent="etl-bogota-seguridad-vial", bbox=BBOX, url=None):
+        super().__init__()
+        self.user_agent = user_agent
+        self.bbox = bbox
+        self.url = url or self.URL
+
+    def _new_client(self):
+        s = requests.Session()
+        s.headers["User-Agent"] = self.user_agent
+        return s
+
+    def geocode(self, address: str) -> Result:
+        params = {
+            "q": address,
+            "format": "jsonv2",
+            "limit": 1,
+            "countrycodes": "co",
+            "viewbox": ",".join(str(v) for v in self.bbox),
+            "bounded": 1,
+        }
+        try:
+            r = self._client().get(self.url, params=params, timeout=30)
+        except requests.RequestException as e:
+            raise TransientGeocodeError(str(e)) from e
+        if r.status_code == 429 or r.status_code >= 500:
+            raise TransientGeocodeError(f"HTTP {r.status_code}")
+        if r.status_code in (401, 403):  # bloqueado por la política de uso
+            raise FatalGeocodeError(f"Nominatim HTTP {r.status_code}")
+        r.raise_for_status()
+        res = r.json()
+        if res:
+            return (
+                float(res[0]["lat"]),
+                float(res[0]["lon"]),
+                res[0].get("display_name"),
+            )
+        return EMPTY
+
+
+class FakeProvider(Provider):
+    """Proveedor local para pruebas: coordenadas deterministas dentro del bbox."""
+
+    name = "fake"
+    default_rps = 500.0
+
+    def __init__(self, latency=0.01, fail_rate=0.0, miss_rate=0.0, bbox=BBOX, seed=0):
+        super().__init__()
+        self.latency = latency
+        self.fail_rate = fail_rate
+        self.miss_rate = miss_rate
+        self.bbox = bbox
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def geocode(self, address: str) -> Result:
+        time.sleep(self.latency)
+        with self._lock:
+            u = self._rng.random()
+        if u < self.fail_rate:
+            raise TransientGeocodeError("fallo simulado")
+        h = hashlib.sha1(address.encode("utf-8")).digest()
+        if h[0] / 255 < self.miss_rate:
+            return EMPTY
+        fx = int.from_bytes(h[1:5], "big") / 2**32
+        fy = int.from_bytes(h[5:9], "big") / 2**32
+        lon = self.bbox[0] + fx * (self.bbox[2] - self.bbox[0])
+        lat = self.bbox[1] + fy * (self.bbox[3] - self.bbox[1])
+        return (lat, lon, f"FAKE {address}")
+
+
+def make_provider(name: str, **kwargs) -> Provider:
+    if name == "google":
+        return GoogleProvider(api_key=kwargs.get("api_key", ""))
+    if name == "nominatim":
+        return NominatimProvider(bbox=kwargs.get("bbox", BBOX))
+    if name == "fake":
+        return FakeProvider(bbox=kwargs.get("bbox", BBOX))
+    raise ValueError(f"Proveedor de geocodificación desconocido: {name}")
+
+
+# ============================ control de ritmo ============================
+class TokenBucket:
+    def __init__(self, rate: float, burst: Optional[float] = None):
+        self.rate = float(rate)
+        # ráfaga corta por defecto: nunca más de ~1/4 de segundo de cuota de golpe
+        self.capacity = float(burst if burst is not None else max(1.0, rate / 4))
+        self._tokens = self.capacity
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(
+                    self.capacity, self._tokens + (now - self._last) * self.rate
+                )
+                self._last = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+class EngineStats:
+    def __init__(self):
+        self.latencies = []
+        self.ok = 0
+        self.empty = 0
+        self.failed = 0
+        self.retries = 0
+        self.elapsed = 0.0
+        self.errors = collections.Counter()  # tipo de error no recuperable → veces
+
+    def percentile(self, p: float) -> float:
+        if not self.latencies:
+            return 0.0
+        xs = sorted(self.latencies)
+        return xs[min(len(xs) - 1, int(round(p / 100 * (len(xs) - 1))))]
+
+    def summary(self) -> Dict[str, float]:
+        n = self.ok + self.empty + self.failed
+        return {
+            "total": n,
+            "ok": self.ok,
+            "sin_resultado": self.empty,
+            "fallidas": self.failed,
+            "reintentos": self.retries,
+            "seg": round(self.elapsed, 2),
+            "req_por_seg": round(n / self.elapsed, 2) if self.elapsed else 0.0,
+            "p50_ms": round(self.percentile(50) * 1000, 1),
+            "p95_ms": round(self.percentile(95) * 1000, 1),
+            "p99_ms": round(self.percentile(99) * 1000, 1),
+        }
+
+    def report(self) -> str:
+        out = " | ".join(f"{k}={v}" for k, v in self.summary().items())
+        if self.errors:
+            out += " | errores=" + ", ".join(f"{k}×{v}" for k, v in self.errors.items())
+        return out
+
+
+# ============================ motor ============================
+class GeocodeEngine:
+    def __init__(
+        self,
+        provider: Provider,
+        rps: Optional[float] = None,
+        max_workers=8,
+        retries=4,
+        backoff=0.5,
+        max_backoff=20.0,
+    ):
+        self.provider = provider
+        self.bucket = TokenBucket(rps or provider.default_rps)
+        self.max_workers = max_workers
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.stats = EngineStats()
+        self._lock = threading.Lock()
+        self._fatal = threading.Event()  # error fatal: los hilos dejan de pedir
+
+    def _one(self, address: str) -> Optional[Result]:
+        # None = falló tras todos los reintentos (no se cachea; se reintenta otra corrida)
+        for attempt in range(self.retries + 1):
+            self.bucket.acquire()
+            if self._fatal.is_set():
+                return None  # corrida abortada: ni se pide ni se cuenta
+            t0 = time.perf_counter()
+            try:
+                res = self.provider.geocode(address)
+            except TransientGeocodeError:
+                if attempt == self.retries:
+                    break
+                with self._lock:
+                    self.stats.retries += 1
+                # backoff exponencial con "full jitter"
+                time.sleep(
+                    random.uniform(0, min(self.max_backoff, self.backoff * 2**attempt))
+                )
+                continue
+            except FatalGeocodeError:
+                self._fatal.set()
+                raise
+            except Exception as e:
+                # error no recuperable del proveedor (4xx, respuesta inválida, ...):
+                # cuenta como fallida sin abortar la corrida; se avisa una vez por tipo
+                nombre = type(e).__name__
+                with self._lock:
+                    primera = not self.stats.errors[nombre]
+                    self.stats.errors[nombre] += 1
+                if primera:
+                    tqdm.write(f"⚠️  {self.provider.name}: {nombre}: {e}")
+                break
+            finally:
+                with self._lock:
+                    self.stats.latencies.append(time.perf_counter() - t0)
+            with self._lock:
+                if res[0] is None:
+                    self.stats.empty += 1
+                else:
+                    self.stats.ok += 1
+            return res
+        with self._lock:
+            self.stats.failed += 1
+        return None
+
+    def run(
+        self,
+        addresses,
+        on_result: Optional[Callable[[str, Result], None]] = None,
+        desc="geocode",
+    ) -> Dict[str, Result]:
+        results = {}
+        self._fatal.clear()
+        t0 = time.perf_counter()
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.max_workers) as ex:
+            futs = {ex.submit(self._one, a): a for a in addresses}
+            for fut in tqdm(
+                concurrent.futures.as_completed(futs), total=len(futs), desc=desc
+            ):
+                try:
+                    addr, res = futs[fut], fut.result()
+                except FatalGeocodeError:
+                    # sin seguir gastando solicitudes: lo ya recibido quedó en on_result
+                    ex.shutdown(wait=False, cancel_futures=True)
+                    self.stats.elapsed += time.perf_counter() - t0
+                    raise
+                if res is None:
+                    continue
+                results[addr] = res
+                if on_result:
+                    on_result(addr, res)
+        self.stats.elapsed += time.perf_counter() - t0
+        return results
@@ -0,0 +1,123 @@
+# Índice espacial persistente de la red semafórica.
+# El cKDTree se construye una vez desde semaforos_raw.parquet y se guarda (pickle) en
+# data/working junto al sha256 del archivo fuente; mientras la fuente no cambie, las
+# siguientes corridas (y el dashboard) lo cargan en vez de reconstruirlo.
+# Consultas en bloque sobre coordenadas métricas (src.transform.proyeccion; el CRS
+# forma parte de la clave del cache): k vecinos más cercanos, id del más cercano y
+# cantidad de semáforos dentro de un radio o de una caja lon/lat.
+
+import os
+import pickle
+import hashlib
+
+import numpy as np
+import pandas as pd
+from scipy.spatial import cKDTree
+
+from src.transform.proyeccion import CRS_METRICO, a_metros
+
+RAW_SEM = "data/raw/semaforos/semaforos_raw.parquet"
+INDEX_FN = "data/working/semaforos_kdtree.pkl"
+ID_COL = "ID"
+RADIOS = (100, 300)  # metros, para los conteos por defecto
+
+_VERSION = 2  # subir si cambia el formato del pickle
+
+
+def _sha(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+class IndiceSemaforos:
+    def __init__(self, lonlat: np.ndarray, ids: np.ndarray, fuente="", crs=CRS_METRICO):
+        self.lonlat = np.asarray(lonlat, dtype=float)
+        self.ids = np.asarray(ids)
+        self.fuente = fuente  # sha256 del parquet de origen
+        self.crs = crs
+        self.version = _VERSION
+        self.xy = a_metros(self.lonlat[:, 0], self.lonlat[:, 1], crs)
+        self.tree = cKDTree(self.xy)
+
+    def proyectar(self, lon, lat) -> np.ndarray:
+        """lon/lat (4326) → coordenadas del índice."""
+        return a_metros(lon, lat, self.crs)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def k_nearest(self, xy: np.ndarray, k: int = 3):
+        """(distancias, ids) de forma (n, k); sin vecino → (inf, -1)."""
+        dist, pos = self.tree.query(xy, k=k, workers=-1)
+        dist, pos = dist.reshape(len(xy), k), pos.reshape(len(xy), k)
+        ids = np.append(self.ids, -1)[pos]  # pos == len(self) si faltan vecinos
+        return dist, ids
+
+    def nearest(self, xy: np.ndarray):
+        """(distancia, id) del semáforo más cercano a cada punto."""
+        dist, ids = self.k_nearest(xy, k=1)
+        return dist[:, 0], ids[:, 0]
+
+    def nearest_id(self, xy: np.ndarray) -> np.ndarray:
+        return self.nearest(xy)[1]
+
+    def count_within(self, xy: np.ndarray, r: float) -> np.ndarray:
+        return self.tree.query_ball_point(xy, r, return_length=True, workers=-1)
+
+    def en_caja(self, bbox) -> np.ndarray:
+        """Posiciones de los semáforos dentro de (lon_min, lat_min, lon_max, lat_max)."""
+        xmin, ymin, xmax, ymax = bbox
+        esq = self.proyectar([xmin, xmax], [ymin, ymax])
+        # círculo que contiene la caja (con margen por la proyección) → filtro exacto
+        r = np.hypot(*(esq[1] - esq[0])) / 2 * 1.01
+        pos = np.asarray(self.tree.query_ball_point(esq.mean(axis=0), r), dtype=int)
+        lon, lat = self.lonlat[pos, 0], self.lonlat[pos, 1]
+        dentro = (lon >= xmin) & (lon <= xmax) & (lat >= ymin) & (lat <= ymax)
+        return np.sort(pos[dentro])
+
+    def features(self, xy: np.ndarray, radios=RADIOS) -> dict:
+        """Columnas de proximidad para un bloque de puntos en una sola pasada."""
+        dist, ids = self.nearest(xy)
+        out = {"dist_sem_m": dist, "sem_id_cercano": ids}
+        for r in radios:
+            out[f"sem_{r:g}m"] = self.count_within(xy, r).astype(np.int32)
+        return out
+
+
+def construir(path=RAW_SEM, fuente=None, crs=CRS_METRICO) -> IndiceSemaforos:
+    sem = pd.read_parquet(path, columns=[ID_COL, "lon", "lat"]).dropna(
+        subset=["lon", "lat"]
+    )
+    return IndiceSemaforos(
+        sem[["lon", "lat"]].to_numpy(),
+        sem[ID_COL].to_numpy(),
+        fuente or _sha(path),
+        crs,
+    )
+
+
+def cargar_indice(path=RAW_SEM, cache=INDEX_FN, crs=CRS_METRICO) -> IndiceSemaforos:
+    """Índice desde el pickle si corresponde al parquet actual; si no, lo reconstruye."""
+    fuente = _sha(path)
+    try:
+        with open(cache, "rb") as f:
+            idx = pickle.load(f)
+        if (
+            isinstance(idx, IndiceSemaforos)
+            and idx.version == _VERSION
+            and idx.fuente == fuente
+            and idx.crs == crs
+        ):
+            return idx
+    except (OSError, pickle.UnpicklingError, EOFError, AttributeError):
+        pass  # sin cache o de otra versión del módulo
+    idx = construir(path, fuente, crs)
+    os.makedirs(os.path.dirname(cache), exist_ok=True)
+    tmp = f"{cache}.tmp"
+    with open(tmp, "wb") as f:
+        pickle.dump(idx, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp, cache)  # escritura atómica: un corte no deja un pickle roto
+    return idx
@@ -1,25 +1,43 @@
 # Uso: python -m src.transform.join_localidades
-# Asigna LOCALIDAD a comparendos y siniestros por spatial join.
+# Asigna LOCALIDAD a comparendos y siniestros (punto en polígono con el raster de
+# consulta de src.transform.asignador_localidades; exacto, sin sjoin). Las salidas son
+# GeoParquet con la geometría de punto: las etapas siguientes no la reconstruyen.
+# Además escribe el almacén particionado por localidad y mes (src.extract.almacen_eventos)
+# para las lecturas filtradas del dashboard y los análisis.
 
 import os, pandas as pd, geopandas as gpd
 
+from src.extract import almacen_eventos
+from src.extract.geoparquet import write_geoparquet
+from src.transform.asignador_localidades import Asignador, cargar_asignador
+
 RAW_DIR = "data/raw"
 CLEAN_DIR = "data/clean"
 os.makedirs(CLEAN_DIR, exist_ok=True)
 
 IN_COMP = f"{RAW_DIR}/comparendos_2018.parquet"
 IN_SIN = f"{CLEAN_DIR}/siniestralidad_2018_geocoded_google_parallel.parquet"
-GEOLOC = "data/raw/localidades/localidades.geojson"
+GEOLOC = "data/raw/localidades/localidades.parquet"
 
 OUT_COMP = f"{CLEAN_DIR}/comparendos_2018_loc.parquet"
 OUT_SIN = f"{CLEAN_DIR}/siniestralidad_2018_loc.parquet"
-
-
-def _to_points(df, lon_col="lon", lat_col="lat"):
-    gdf = gpd.GeoDataFrame(
-        df, geometry=gpd.points_from_xy(df[lon_col], df[lat_col]), crs=4326
+# datasets Hive; el _metadata resume todos sus archivos (es la salida que se rastrea)
+EVENTOS_COMP = f"{CLEAN_DIR}/eventos/comparendos"
+EVENTOS_SIN = f"{CLEAN_DIR}/eventos/siniestros"
+OUT_EVT_COMP = f"{EVENTOS_COMP}/_metadata"
+OUT_EVT_SIN = f"{EVENTOS_SIN}/_metadata"
+
+INPUTS = [IN_COMP, IN_SIN, GEOLOC]
+OUTPUTS = [OUT_COMP, OUT_SIN, OUT_EVT_COMP, OUT_EVT_SIN]
+ENV_VARS = ["EVENTOS_ROW_GROUP"]
+
+
+def asignar_localidad(df: pd.DataFrame, asig: Asignador) -> gpd.GeoDataFrame:
+    # columna LOCALIDAD_JOIN desde lon/lat (None fuera de las localidades) + punto 4326
+    df["LOCALIDAD_JOIN"] = pd.Series(asig.nombres(df["lon"], df["lat"]), index=df.index)
+    return gpd.GeoDataFrame(
+        df, geometry=gpd.points_from_xy(df["lon"], df["lat"]), crs=4326
     )
-    return gdf
 
 
 def main():
@@ -29,31 +47,17 @@ def main():
     comp = comp.dropna(subset=["lat", "lon"])
     sin = sin.dropna(subset=["lat", "lon"])
 
-    gcomp = _to_points(comp)
-    gsin = _to_points(sin)
-
-    locs = gpd.read_file(GEOLOC).to_crs(4326)
-    name_col = (
-        "LOCALIDAD"
-        if "LOCALIDAD" in locs.columns
-        else [c for c in locs.columns if "LOCAL" in c.upper()][0]
-    )
-    locs[name_col] = locs[name_col].astype(str).str.upper().str.strip()
-
-    jc = gpd.sjoin(
-        gcomp, locs[[name_col, "geometry"]], predicate="within", how="left"
-    ).drop(columns=["index_right"])
-    js = gpd.sjoin(
-        gsin, locs[[name_col, "geometry"]], predicate="within", how="left"
-    ).drop(columns=["index_right"])
-
-    jc = jc.rename(columns={name_col: "LOCALIDAD_JOIN"}).drop(columns=["geometry"])
-    js = js.rename(columns={name_col: "LOCALIDAD_JOIN"}).drop(columns=["geometry"])
+    asig = cargar_asignador(GEOLOC)
+    jc = asignar_localidad(comp, asig)
+    js = asignar_localidad(sin, asig)
 
-    jc.to_parquet(OUT_COMP, index=False)
-    js.to_parquet(OUT_SIN, index=False)
+    write_geoparquet(jc, OUT_COMP)
+    write_geoparquet(js, OUT_SIN)
     print(f"OK → {OUT_COMP} ({len(jc)})")
     print(f"OK → {OUT_SIN} ({len(js)})")
+    for df, root in ((jc, EVENTOS_COMP), (js, EVENTOS_SIN)):
+        n = almacen_eventos.escribir(df, root)
+        print(f"OK → {root}/ ({n} archivos, particionado por localidad y mes)")
 
 
 if __name__ == "__main__":
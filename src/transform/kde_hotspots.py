@@ -0,0 +1,190 @@
+# Uso: python -m src.transform.kde_hotspots
+# Densidad kernel (KDE) de comparendos y siniestros sobre un raster fino en EPSG:3857:
+# los puntos se cuentan por celda (np.bincount) y el raster se convoluciona con el
+# kernel vía FFT (scipy.signal.fftconvolve), así el costo depende del tamaño del raster
+# y no del número de eventos. Exporta el raster (npz, eventos/km²) y polígonos de las
+# zonas de mayor densidad que concentran el 25/50/75 % de la masa (GeoParquet pequeño
+# para el dashboard, en lugar de enviar todos los puntos al HeatMap del navegador).
+
+import os
+
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+import shapely
+from pyproj import Transformer
+from scipy.signal import fftconvolve
+
+from src.extract.geoparquet import write_geoparquet
+from src.transform.geocoding import BBOX
+
+CLEAN = "data/clean"
+ANAL = "data/analytics"
+os.makedirs(ANAL, exist_ok=True)
+
+IN_COMP = f"{CLEAN}/comparendos_2018_loc.parquet"
+IN_SIN = f"{CLEAN}/siniestralidad_2018_loc.parquet"
+OUT_RASTER = f"{ANAL}/kde_densidad.npz"
+OUT_CONTORNOS = f"{ANAL}/kde_contornos.parquet"
+
+INPUTS = [IN_COMP, IN_SIN]
+OUTPUTS = [OUT_RASTER, OUT_CONTORNOS]
+ENV_VARS = ["KDE_CELL_M", "KDE_BANDWIDTH_M", "KDE_KERNEL", "KDE_MASA"]
+
+CELL_M = float(os.getenv("KDE_CELL_M", "50"))
+BANDWIDTH_M = float(os.getenv("KDE_BANDWIDTH_M", "300"))
+KERNEL = os.getenv("KDE_KERNEL", "quartic").strip().lower()
+# fracciones de la masa total que encierra cada contorno (de más a menos intenso)
+MASA = [float(v) for v in os.getenv("KDE_MASA", "0.25,0.5,0.75").split(",")]
+
+# perfil del kernel en función de u = distancia / ancho de banda
+KERNELS = {
+    "gaussian": (3.0, lambda u: np.exp(-0.5 * u**2)),  # soporte truncado en 3σ
+    "quartic": (1.0, lambda u: np.clip(1 - u**2, 0, None) ** 2),
+    "epanechnikov": (1.0, lambda u: np.clip(1 - u**2, 0, None)),
+}
+
+
+def _to_xy(df) -> np.ndarray:
+    t = Transformer.from_crs(4326, 3857, always_xy=True)
+    x, y = t.transform(df["lon"].to_numpy(), df["lat"].to_numpy())
+    return np.c_[x, y]
+
+
+class Raster:
+    """Malla regular en 3857: origen (x0, y0) = esquina inferior izquierda."""
+
+    def __init__(self, cell_m=CELL_M, pad_m=0.0, bbox=BBOX):
+        t = Transformer.from_crs(4326, 3857, always_xy=True)
+        xmin, ymin = t.transform(bbox[0], bbox[1])
+        xmax, ymax = t.transform(bbox[2], bbox[3])
+        self.cell = cell_m
+        self.x0 = np.floor((xmin - pad_m) / cell_m) * cell_m
+        self.y0 = np.floor((ymin - pad_m) / cell_m) * cell_m
+        self.nx = int(np.ceil((xmax + pad_m - self.x0) / cell_m))
+        self.ny = int(np.ceil((ymax + pad_m - self.y0) / cell_m))
+
+    def counts(self, xy: np.ndarray) -> np.ndarray:
+        ix = np.floor((xy[:, 0] - self.x0) / self.cell).astype(np.int64)
+        iy = np.floor((xy[:, 1] - self.y0) / self.cell).astype(np.int64)
+        ok = (ix >= 0) & (ix < self.nx) & (iy >= 0) & (iy < self.ny)
+        flat = np.bincount(iy[ok] * self.nx + ix[ok], minlength=self.nx * self.ny)
+        return flat.reshape(self.ny, self.nx).astype(np.float64)
+
+    def bounds(self):
+        return (
+            self.x0,
+            self.y0,
+            self.x0 + self.nx * self.cell,
+            self.y0 + self.ny * self.cell,
+        )
+
+
+def kernel(bandwidth_m=BANDWIDTH_M, cell_m=CELL_M, name=KERNEL) -> np.ndarray:
+    if name not in KERNELS:
+        raise ValueError(f"Kernel desconocido: {name} (usa {sorted(KERNELS)})")
+    support, f = KERNELS[name]
+    r = int(np.ceil(support * bandwidth_m / cell_m))
+    d = np.arange(-r, r + 1) * cell_m
+    u = np.hypot(*np.meshgrid(d, d)) / bandwidth_m
+    k = f(u) * (u <= support)
+    return k / k.sum()
+
+
+def density(counts: np.ndarray, k: np.ndarray, cell_m=CELL_M) -> np.ndarray:
+    """Eventos/km² suavizados; la masa total se conserva (salvo bordes del raster)."""
+    dens = fftconvolve(counts, k, mode="same")
+    np.clip(dens, 0, None, out=dens)  # ruido numérico de la FFT
+    return dens / (cell_m / 1000) ** 2
+
+
+def umbral_masa(dens: np.ndarray, frac: float) -> float:
+    """Densidad mínima de la región más intensa que reúne `frac` de la masa."""
+    v = np.sort(dens.ravel())[::-1]
+    cum = np.cumsum(v)
+    if cum[-1] <= 0:
+        return np.inf
+    return float(v[min(np.searchsorted(cum, frac * cum[-1]), len(v) - 1)])
+
+
+def mask_polygons(mask: np.ndarray, r: Raster, min_cells=4):
+    """Unión de las celdas True: tramos por fila → rectángulos → coverage union.
+
+    Los bordes en escalera se simplifican a media celda y se descartan las islas de
+    menos de `min_cells` celdas (ruido de la densidad, no zonas).
+    """
+    pad = np.zeros((mask.shape[0], 1), bool)
+    edges = np.diff(np.hstack([pad, mask, pad]).astype(np.int8), axis=1)
+    rows, start = np.nonzero(edges == 1)
+    _, end = np.nonzero(edges == -1)
+    if len(rows) == 0:
+        return None
+    boxes = shapely.box(
+        r.x0 + start * r.cell,
+        r.y0 + rows * r.cell,
+        r.x0 + end * r.cell,
+        r.y0 + (rows + 1) * r.cell,
+    )
+    geom = shapely.coverage_union_all(boxes)
+    # sin preservar topología (mucho más rápido); make_valid repara los toques
+    geom = shapely.make_valid(
+        shapely.simplify(geom, r.cell / 2, preserve_topology=False)
+    )
+    parts = shapely.get_parts(geom)
+    parts = parts[
+        (shapely.get_type_id(parts) == 3)  # Polygon
+        & (shapely.area(parts) >= min_cells * r.cell**2)
+    ]
+    return shapely.multipolygons(parts) if len(parts) else None
+
+
+def kde(pcomp_xy: np.ndarray, psin_xy: np.ndarray):
+    """(capas de densidad {nombre: array}, Raster, GeoDataFrame de contornos en 4326)."""
+    support, _ = KERNELS[KERNEL]
+    r = Raster(CELL_M, pad_m=support * BANDWIDTH_M)
+    k = kernel()
+    layers = {
+        "comparendos": density(r.counts(pcomp_xy), k),
+        "siniestros": density(r.counts(psin_xy), k),
+    }
+    rows = []
+    for capa, dens in layers.items():
+        for frac in sorted(MASA):
+            t = umbral_masa(dens, frac)
+            geom = mask_polygons(dens >= t, r) if np.isfinite(t) else None
+            if geom is not None:
+                rows.append(
+                    {"capa": capa, "masa": frac, "densidad_min": t, "geometry": geom}
+                )
+    cont = gpd.GeoDataFrame(
+        rows, columns=["capa", "masa", "densidad_min", "geometry"], crs=3857
+    )
+    return layers, r, cont.to_crs(4326)
+
+
+def write_raster(layers, r: Raster, path=OUT_RASTER) -> None:
+    np.savez_compressed(
+        path,
+        **{k: v.astype(np.float32) for k, v in layers.items()},
+        bounds_3857=np.array(r.bounds()),
+        cell_m=r.cell,
+        bandwidth_m=BANDWIDTH_M,
+        kernel=KERNEL,
+    )
+
+
+def main():
+    comp = pd.read_parquet(IN_COMP, columns=["lat", "lon"]).dropna()
+    sin = pd.read_parquet(IN_SIN, columns=["lat", "lon"]).dropna()
+    layers, r, cont = kde(_to_xy(comp), _to_xy(sin))
+    write_raster(layers, r)
+    write_geoparquet(cont, OUT_CONTORNOS)
+    print(
+        f"OK → {OUT_RASTER} ({r.ny}x{r.nx} celdas de {r.cell:g} m, "
+        f"kernel {KERNEL} h={BANDWIDTH_M:g} m)"
+    )
+    print(f"OK → {OUT_CONTORNOS} ({len(cont)} contornos)")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,7 @@
 # Uso: python -m src.transform.merge_mortalidad
 # Une mortalidad (OSB) con agregados 2018 por localidad, tolerante a LOCALIDAD_{left,right,JOIN}.
+# Con KPI_ENGINE=duckdb los conteos por localidad salen de SQL sobre los Parquet
+# (src.analytics.motor_duckdb) en vez de cargar las tablas de eventos en pandas.
 
 import os
 import pandas as pd
@@ -9,8 +11,16 @@ CLEAN = "data/clean"
 ANAL = "data/analytics"
 os.makedirs(ANAL, exist_ok=True)
 
+IN_COMP = f"{CLEAN}/comparendos_2018_loc.parquet"
+IN_SIN = f"{CLEAN}/siniestralidad_2018_loc.parquet"
 OUT_PANEL_2018 = f"{ANAL}/panel_localidad_2018.parquet"
 
+INPUTS = [RAW_MORT, IN_COMP, IN_SIN]
+OUTPUTS = [OUT_PANEL_2018]
+ENV_VARS = ["KPI_ENGINE"]
+
+MOTOR = os.getenv("KPI_ENGINE", "pandas").strip().lower()  # pandas | duckdb
+
 
 def _norm_localidad(s):
     return str(s).strip().upper()
@@ -42,8 +52,8 @@ def _ensure_loc_join(df, tag):
         raise KeyError(
             f"No encuentro columna de localidad en {tag}. Columnas: {list(df.columns)[:20]}"
         )
-    if col != "LOCALIDAD_JOIN":
-        df = df.rename(columns={col: "LOCALIDAD_JOIN"})
+    # rename siempre (aunque ya se llame así): no modificar el DataFrame del llamador
+    df = df.rename(columns={col: "LOCALIDAD_JOIN"})
     df["LOCALIDAD_JOIN"] = df["LOCALIDAD_JOIN"].map(_norm_localidad)
     return df
 
@@ -54,9 +64,23 @@ def _group_by_localidad(df, tag):
     return g
 
 
-def main():
+def _group_conteos(n: pd.DataFrame, tag):
+    # conteos ya agregados (LOCALIDAD_JOIN, n) → misma serie que _group_by_localidad
+    n = n.assign(LOCALIDAD_JOIN=n["LOCALIDAD_JOIN"].map(_norm_localidad))
+    return n.groupby("LOCALIDAD_JOIN")["n"].sum().rename(f"{tag}_2018")
+
+
+def build_panel(mort: pd.DataFrame, comp: pd.DataFrame, sin: pd.DataFrame):
+    return panel_desde_conteos(
+        mort,
+        _group_by_localidad(comp, "comparendos"),
+        _group_by_localidad(sin, "siniestros"),
+    )
+
+
+def panel_desde_conteos(mort: pd.DataFrame, comp_g: pd.Series, sin_g: pd.Series):
     # --- Mortalidad ---
-    mort = pd.read_parquet(RAW_MORT).copy()
+    mort = mort.copy()
     mort.columns = [
         c.strip().lower().replace(" ", "_").replace(".", "_") for c in mort.columns
     ]
@@ -76,12 +100,6 @@ def main():
     mort18 = mort[mort["ano"] == 2018].copy()
 
     # --- Agregados por localidad (comparendos/siniestros) ---
-    comp = pd.read_parquet(f"{CLEAN}/comparendos_2018_loc.parquet")
-    sin = pd.read_parquet(f"{CLEAN}/siniestralidad_2018_loc.parquet")
-
-    comp_g = _group_by_localidad(comp, "comparendos")
-    sin_g = _group_by_localidad(sin, "siniestros")
-
     base = pd.concat(
         [comp_g, sin_g], axis=1
     ).reset_index()  # LOCALIDAD_JOIN, comparendos_2018, siniestros_2018
@@ -96,7 +114,27 @@ def main():
     # recalcula tasa si aplica
     if {"casos", "poblacion"}.issubset(panel.columns):
         panel["tasa_x_100k_calc"] = (panel["casos"] / panel["poblacion"]) * 100000
+    return panel
+
 
+def main():
+    mort = pd.read_parquet(RAW_MORT)
+    if MOTOR == "duckdb":
+        from src.analytics import motor_duckdb
+
+        con = motor_duckdb.conectar()
+        panel = panel_desde_conteos(
+            mort,
+            _group_conteos(motor_duckdb.conteos(con, IN_COMP), "comparendos"),
+            _group_conteos(motor_duckdb.conteos(con, IN_SIN), "siniestros"),
+        )
+    else:
+        panel = build_panel(
+            mort,
+            # solo la localidad: sin leer la geometría del GeoParquet
+            pd.read_parquet(IN_COMP, columns=["LOCALIDAD_JOIN"]),
+            pd.read_parquet(IN_SIN, columns=["LOCALIDAD_JOIN"]),
+        )
     panel.to_parquet(OUT_PANEL_2018, index=False)
     print(f"OK → {OUT_PANEL_2018} ({len(panel)})")
 
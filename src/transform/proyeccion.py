@@ -0,0 +1,68 @@
+# Proyección métrica para distancias cortas en Bogotá.
+# EPSG:3857 exagera las distancias en 1/cos(lat) (~0.33 % a 4.6°N). Por defecto se usa
+# una equirectangular local sobre el elipsoide WGS84 centrada en Bogotá: x = N·cosφ0·Δλ,
+# y = M·Δφ, en NumPy puro (sin pyproj) y con error < 0.05 % dentro de la ciudad.
+# Alternativas: MAGNA-SIRGAS Origen Nacional (EPSG:9377) o 3857, vía pyproj con el
+# Transformer cacheado por proceso.
+
+import os
+from functools import lru_cache
+
+import numpy as np
+from pyproj import Geod, Transformer
+
+CRS_METRICO = os.getenv("PROX_CRS", "local").strip().lower()  # local | 9377 | 3857
+CRS_VALIDOS = ("local", "9377", "3857")
+
+# centro aproximado de Bogotá
+LAT0, LON0 = 4.65, -74.1
+# WGS84
+_A, _F = 6378137.0, 1 / 298.257223563
+_E2 = _F * (2 - _F)
+R_MEDIO = 6371008.8  # radio medio (IUGG) para haversine
+
+
+def _radios(lat0=LAT0):
+    s = np.sin(np.radians(lat0))
+    w = 1 - _E2 * s**2
+    n = _A / np.sqrt(w)  # primer vertical
+    m = _A * (1 - _E2) / w**1.5  # meridiano
+    return n, m
+
+
+_N0, _M0 = _radios()
+
+
+@lru_cache(maxsize=None)
+def _transformer(epsg: int) -> Transformer:
+    return Transformer.from_crs(4326, epsg, always_xy=True)
+
+
+def a_metros(lon, lat, crs=CRS_METRICO) -> np.ndarray:
+    """Coordenadas (n, 2) en metros para lon/lat en grados (4326)."""
+    lon, lat = np.asarray(lon, dtype=float), np.asarray(lat, dtype=float)
+    if crs == "local":
+        x = _N0 * np.cos(np.radians(LAT0)) * np.radians(lon - LON0)
+        y = _M0 * np.radians(lat - LAT0)
+        return np.c_[x, y]
+    if crs not in CRS_VALIDOS:
+        raise ValueError(f"CRS métrico desconocido: {crs} (usa {CRS_VALIDOS})")
+    x, y = _transformer(int(crs)).transform(lon, lat)
+    return np.c_[x, y]
+
+
+def haversine_m(lon1, lat1, lon2, lat2) -> np.ndarray:
+    lon1, lat1, lon2, lat2 = (
+        np.radians(np.asarray(v, float)) for v in (lon1, lat1, lon2, lat2)
+    )
+    a = (
+        np.sin((lat2 - lat1) / 2) ** 2
+        + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    )
+    return 2 * R_MEDIO * np.arcsin(np.sqrt(a))
+
+
+def geodesica_m(lon1, lat1, lon2, lat2) -> np.ndarray:
+    # distancia exacta sobre el elipsoide WGS84 (referencia de la validación)
+    _, _, d = Geod(ellps="WGS84").inv(lon1, lat1, lon2, lat2)
+    return np.asarray(d)
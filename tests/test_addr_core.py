@@ -0,0 +1,91 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.transform.geocode_addresses import (
+    BBOX,
+    RAW_IN,
+    _addr_core,
+    _addr_core_vec,
+    _in_bbox,
+    _in_bbox_mask,
+)
+
+# casos borde: None vs NaN vs "", espacios, minúsculas, sin vías (usa "direccion")
+EDGE = pd.DataFrame(
+    {
+        "tipovia1": ["cl", None, "", np.nan, " KR ", None, "AV"],
+        "numerovia1": ["10", None, None, np.nan, "  37 ", "", "AVENIDA  BOYACA"],
+        "letravia1": [None, "A", "A", "B", "a", None, None],
+        "cardinalvia1": ["s", None, "E", "N", None, None, "W"],
+        "tipovia2": ["KR", None, None, None, "cl", None, ""],
+        "numerovia2": ["37", None, None, None, "6", None, None],
+        "letravia2": ["A", None, None, None, None, None, None],
+        "cardinalvia2": [None, None, None, None, "sur", None, None],
+        "direccion": [None, " kr 7 # 72-10 ", 12, None, None, "   ", None],
+        "localidad": ["puente  aranda", None, "", np.nan, "SUBA ", "BOSA", None],
+    }
+)
+
+
+def _diff(ref: pd.Series, vec: pd.Series):
+    # None/NaN cuentan como iguales (df.apply puede convertir None en NaN)
+    return [
+        (i, a, b)
+        for i, a, b in zip(ref.index, ref, vec)
+        if a != b and not (pd.isna(a) and pd.isna(b))
+    ]
+
+
+def _check(df):
+    assert not _diff(df.apply(_addr_core, axis=1), _addr_core_vec(df))
+
+
+def test_addr_core_casos_borde():
+    _check(EDGE)
+
+
+def test_addr_core_columnas_ausentes():
+    # sin vía 2 ni localidad: igual que row.get() → None
+    _check(EDGE[["tipovia1", "numerovia1", "cardinalvia1", "direccion"]])
+    # LOCALIDAD en mayúsculas como respaldo de localidad
+    _check(EDGE.rename(columns={"localidad": "LOCALIDAD"}))
+
+
+def test_addr_core_sin_direccion():
+    # sin vía ni dirección utilizable → None
+    assert _addr_core_vec(EDGE)[5] is None
+    assert _addr_core_vec(EDGE.iloc[[5]]).tolist() == [None]
+
+
+@pytest.mark.skipif(not os.path.exists(RAW_IN), reason=f"falta {RAW_IN}")
+def test_addr_core_filas_reales():
+    raw = pd.read_parquet(RAW_IN)
+    raw.columns = [c.strip().lower() for c in raw.columns]
+    _check(raw)
+
+
+def test_in_bbox_mask():
+    lon0, lat0, lon1, lat1 = BBOX
+    lat = [lat0, lat1, 4.6, 4.6, 4.6, np.nan, 4.6, None, "4.6", 4.0, 5.0]
+    lon = [lon0, lon1, -74.1, lon0 - 1e-9, lon1 + 1e-9, -74.1, np.nan, -74.1]
+    lon += ["-74.1", -74.1, -74.1]
+    pts = pd.DataFrame({"lat": lat, "lon": lon}, dtype=object)
+    ref = [
+        _in_bbox(float(a) if a is not None else a, float(b)) for a, b in zip(lat, lon)
+    ]
+    assert _in_bbox_mask(pts["lat"], pts["lon"]).tolist() == ref
+    dentro = [1, 1, 1, 0, 0, 0, 0, 0, 1, 0, 0]
+    assert ref == [bool(d) for d in dentro]
+
+
+def test_in_bbox_mask_aleatorio():
+    n = 20_000
+    rng = np.random.default_rng(0)
+    lat = pd.Series(rng.uniform(4.3, 5.0, n))
+    lon = pd.Series(rng.uniform(-74.4, -73.8, n))
+    lat[::17] = np.nan
+    ref = [_in_bbox(a, b) for a, b in zip(lat, lon)]
+    assert _in_bbox_mask(lat, lon).tolist() == ref
@@ -0,0 +1,163 @@
+import json
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pyarrow.parquet as pq
+import pytest
+
+from src.extract import arcgis_paginado as ap
+
+N = 237
+
+
+class Capa:
+    """FeatureServer mínimo: anuncia `declarado` como maxRecordCount pero corta en `corte`."""
+
+    def __init__(self, n=N, declarado=50, corte=None):
+        self.n = n
+        self.declarado = declarado
+        self.corte = corte or declarado
+        self.fallar = set()  # offsets que responden 400
+        self.pedidos = []
+        self.lock = threading.Lock()
+
+    def meta(self):
+        return {
+            "objectIdField": "OBJECTID",
+            "maxRecordCount": self.declarado,
+            "fields": [
+                {"name": "OBJECTID", "type": "esriFieldTypeOID"},
+                {"name": "NOMBRE", "type": "esriFieldTypeString"},
+            ],
+        }
+
+    def query(self, q):
+        if q.get("returnCountOnly") == "true":
+            return 200, {"count": self.n}
+        off = int(q["resultOffset"])
+        with self.lock:
+            self.pedidos.append(off)
+        if off in self.fallar:
+            return 400, {}
+        k = min(int(q["resultRecordCount"]), self.corte)
+        ids = range(off + 1, min(off + k, self.n) + 1)
+        feats = [
+            {
+                "attributes": {"OBJECTID": i, "NOMBRE": f"n{i}"},
+                "geometry": {"x": -74 + i / 1e4, "y": 4.6},
+            }
+            for i in ids
+        ]
+        return 200, {
+            "features": feats,
+            "exceededTransferLimit": off + len(feats) < self.n,
+        }
+
+
+@pytest.fixture
+def servidor(tmp_path, monkeypatch):
+    monkeypatch.setattr(ap, "WORK_DIR", str(tmp_path / "arcgis"))
+    capa = Capa()
+
+    class H(BaseHTTPRequestHandler):
+        def do_GET(self):
+            u = urlparse(self.path)
+            q = {k: v[0] for k, v in parse_qs(u.query).items()}
+            if u.path.endswith("/query"):
+                code, body = capa.query(q)
+            else:
+                code, body = 200, capa.meta()
+            raw = json.dumps(body).encode()
+            self.send_response(code)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(raw)))
+            self.end_headers()
+            self.wfile.write(raw)
+
+        def log_message(self, *args):
+            pass
+
+    srv = ThreadingHTTPServer(("127.0.0.1", 0), H)
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{srv.server_port}/arcgis/rest/services/x/FeatureServer/0/query"
+    yield capa, url
+    srv.shutdown()
+    srv.server_close()
+
+
+def _ids(tables):
+    return [i for t in tables for i in t["OBJECTID"].to_pylist()]
+
+
+def test_paginas_en_paralelo_en_orden(servidor):
+    capa, url = servidor
+    tablas = list(ap.iter_pages(url, "capa", page=100, max_workers=4))
+    # page se acota al maxRecordCount declarado
+    assert [t.num_rows for t in tablas] == [50, 50, 50, 50, 37]
+    assert _ids(tablas) == list(range(1, N + 1))
+    assert tablas[0].column_names == ["OBJECTID", "NOMBRE", "lon", "lat"]
+    assert sorted(capa.pedidos) == [0, 50, 100, 150, 200]
+
+
+def test_limit(servidor):
+    _, url = servidor
+    tablas = list(ap.iter_pages(url, "capa", limit=120, page=50, max_workers=3))
+    assert _ids(tablas) == list(range(1, 121))
+
+
+def test_pagina_corta_se_completa(servidor):
+    # el servidor declara 50 pero entrega 30 por respuesta
+    capa, url = servidor
+    capa.corte = 30
+    tablas = list(ap.iter_pages(url, "capa", page=50, max_workers=4))
+    assert [t.num_rows for t in tablas] == [50, 50, 50, 50, 37]
+    assert _ids(tablas) == list(range(1, N + 1))
+    # el resto de cada página se pide desde donde quedó
+    assert sorted(capa.pedidos) == [0, 30, 50, 80, 100, 130, 150, 180, 200, 230]
+
+
+def test_capa_con_menos_filas_que_el_conteo(servidor):
+    capa, url = servidor
+    info = capa.query
+    # el conteo anuncia 10 filas más de las que luego entrega
+    capa.query = lambda q: (
+        (200, {"count": N + 10}) if q.get("returnCountOnly") == "true" else info(q)
+    )
+    with pytest.raises(ValueError, match="offset 200"):
+        list(ap.iter_pages(url, "capa", page=50, max_workers=2))
+    # la página incompleta no quedó como checkpoint
+    assert not os.path.exists(
+        os.path.join(ap.WORK_DIR, "capa", "page_000000200.parquet")
+    )
+
+
+def test_reanuda_desde_checkpoints(servidor):
+    capa, url = servidor
+    capa.fallar = {100}
+    with pytest.raises(Exception):
+        list(ap.iter_pages(url, "capa", page=50, max_workers=4))
+    d = os.path.join(ap.WORK_DIR, "capa")
+    guardadas = {int(f[5:14]) for f in os.listdir(d) if f.startswith("page_")}
+    assert 100 not in guardadas and guardadas
+
+    # un checkpoint incompleto (de una versión anterior) se vuelve a pedir
+    corta = min(guardadas)
+    fn = os.path.join(d, f"page_{corta:09d}.parquet")
+    pq.write_table(pq.read_table(fn).slice(0, 10), fn)
+
+    capa.fallar, capa.pedidos = set(), []
+    tablas = list(ap.iter_pages(url, "capa", page=50, max_workers=4))
+    assert _ids(tablas) == list(range(1, N + 1))
+    assert sorted(capa.pedidos) == sorted({0, 50, 100, 150, 200} - guardadas | {corta})
+
+
+def test_reanudar_no_repite_pedidos(servidor):
+    capa, url = servidor
+    list(ap.iter_pages(url, "capa", page=50, max_workers=4))
+    capa.pedidos = []
+    list(ap.iter_pages(url, "capa", page=50, max_workers=4))
+    assert capa.pedidos == []
+    list(ap.iter_pages(url, "capa", page=50, max_workers=4, resume=False))
+    assert sorted(capa.pedidos) == [0, 50, 100, 150, 200]
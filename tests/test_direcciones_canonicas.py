@@ -0,0 +1,70 @@
+import pytest
+
+from src.transform.direcciones_canonicas import (
+    agrupar_variantes,
+    canonical_key,
+    consulta,
+)
+
+
+@pytest.mark.parametrize(
+    "addr, key",
+    [
+        # cardinal abreviado separado de la letra
+        ("CALLE 10 E", "CALLE 10 ESTE"),
+        ("CALLE 10 S", "CALLE 10 SUR"),
+        ("CALLE 10 E # 5-30", "CALLE 10 ESTE # 5-30"),
+        ("CALLE 10 E 5-30", "CALLE 10 ESTE"),
+        ("CALLE 10 BIS E", "CALLE 10 BIS ESTE"),
+        ("CALLE 10 N", "CALLE 10"),
+        # letra de la vía
+        ("CALLE 10E", "CALLE 10E"),
+        ("CALLE 10E # 5-30", "CALLE 10E # 5-30"),
+        ("CALLE 10 A", "CALLE 10A"),
+        ("CALLE 10 E BIS", "CALLE 10E BIS"),
+        ("CALLE 10 A S", "CALLE 10A SUR"),
+        ("CL 10 B BIS C SUR", "CALLE 10B BIS C SUR"),
+        # abreviaturas, colas y vías con nombre
+        ("AK 30", "CARRERA 30"),
+        ("AVENIDA AVENIDA BOYACA - 2", "AVENIDA BOYACA"),
+        # placa normalizada en una vía sola
+        ("KR 7 # 72-10", "CARRERA 7 # 72-10"),
+        ("KR 7 # 72 - 10", "CARRERA 7 # 72-10"),
+        ("KR 7 NO. 72 A - 10", "CARRERA 7 # 72A-10"),
+        ("KR 7 N° 72", "CARRERA 7 # 72"),
+        ("AVENIDA BOYACA # 12-30", "AVENIDA BOYACA # 12-30"),
+        # en un cruce la placa y las colas se descartan
+        ("CL 10 CON KR 7 # 72-10", "CALLE 10 CON CARRERA 7"),
+        ("CARRERA 37A X CALLE 10 - 2", "CALLE 10 CON CARRERA 37A"),
+    ],
+)
+def test_via(addr, key):
+    assert canonical_key(addr) == key
+
+
+def test_placas_distintas_no_se_agrupan():
+    a, b = "KR 7 # 72-10, CHAPINERO", "KR 7 # 45-10, CHAPINERO"
+    assert canonical_key(a) != canonical_key(b)
+    assert agrupar_variantes([a, b, "CARRERA 7 # 72 - 10, Chapinero"]) == {
+        "CARRERA 7 # 72-10, CHAPINERO": [a, "CARRERA 7 # 72 - 10, Chapinero"],
+        "CARRERA 7 # 45-10, CHAPINERO": [b],
+    }
+
+
+def test_misma_clave_para_variantes():
+    variantes = [
+        "CARRERA 37A CON CALLE 10 - 2, PUENTE ARANDA, BOGOTÁ, COLOMBIA",
+        "CALLE 10 CON KR 37 A, PUENTE ARANDA, BOGOTA, COLOMBIA",
+        "cl 10 x cra 37a, Puente Aranda",
+    ]
+    grupos = agrupar_variantes(variantes + ["CALLE 10 E CON CARRERA 37A"])
+    assert grupos == {
+        "CALLE 10 CON CARRERA 37A, PUENTE ARANDA": variantes,
+        "CALLE 10 ESTE CON CARRERA 37A": ["CALLE 10 E CON CARRERA 37A"],
+    }
+    assert consulta("CALLE 10 ESTE") == "CALLE 10 ESTE, BOGOTÁ, COLOMBIA"
+
+
+@pytest.mark.parametrize("addr", [None, "", "   ", 12])
+def test_sin_direccion(addr):
+    assert canonical_key(addr) is None
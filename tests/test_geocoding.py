@@ -0,0 +1,191 @@
+import time
+
+import pytest
+
+from src.transform.geocoding import (
+    EMPTY,
+    EngineStats,
+    FakeProvider,
+    FatalGeocodeError,
+    GeocodeEngine,
+    GoogleProvider,
+    TokenBucket,
+    TransientGeocodeError,
+)
+
+DIRS = [f"CALLE {i} # {i} - 10" for i in range(60)]
+
+
+class FallaN(FakeProvider):
+    """Falla de forma transitoria las primeras n llamadas de cada dirección."""
+
+    def __init__(self, n, **kw):
+        super().__init__(latency=0, **kw)
+        self.n = n
+        self.llamadas = {}
+
+    def geocode(self, address):
+        with self._lock:
+            k = self.llamadas[address] = self.llamadas.get(address, 0) + 1
+        if k <= self.n:
+            raise TransientGeocodeError("fallo simulado")
+        return super().geocode(address)
+
+
+class Rota(FakeProvider):
+    """Error no recuperable (p. ej. 4xx o JSON inválido) en algunas direcciones."""
+
+    def geocode(self, address):
+        if address.endswith("0 - 10"):
+            raise ValueError("respuesta inválida")
+        return super().geocode(address)
+
+
+def test_token_bucket_ritmo():
+    b = TokenBucket(rate=100, burst=1)
+    t0 = time.monotonic()
+    for _ in range(31):
+        b.acquire()
+    dt = time.monotonic() - t0
+    # el primer token está disponible; los 30 siguientes salen a 100/s
+    assert 0.27 <= dt < 1.0
+
+
+def test_token_bucket_rafaga():
+    b = TokenBucket(rate=1, burst=5)
+    t0 = time.monotonic()
+    for _ in range(5):
+        b.acquire()
+    assert time.monotonic() - t0 < 0.1
+
+
+def test_reintenta_fallas_transitorias():
+    eng = GeocodeEngine(FallaN(2), rps=1000, max_workers=4, retries=3, backoff=0.001)
+    res = eng.run(DIRS)
+    assert len(res) == len(DIRS)
+    assert eng.stats.retries == 2 * len(DIRS)
+    assert eng.stats.failed == 0
+    assert eng.stats.ok == len(DIRS)
+    # una latencia por intento, fallido o no
+    assert len(eng.stats.latencies) == 3 * len(DIRS)
+
+
+def test_agota_reintentos():
+    eng = GeocodeEngine(FallaN(5), rps=1000, max_workers=4, retries=2, backoff=0.001)
+    assert eng.run(DIRS) == {}
+    assert eng.stats.failed == len(DIRS)
+    assert eng.stats.retries == 2 * len(DIRS)
+
+
+def test_fallas_aleatorias_con_backoff():
+    prov = FakeProvider(latency=0, fail_rate=0.3, seed=1)
+    eng = GeocodeEngine(prov, rps=1000, max_workers=4, retries=20, backoff=0.001)
+    res = eng.run(DIRS)
+    assert len(res) == len(DIRS)
+    assert eng.stats.retries > 0
+    assert eng.stats.failed == 0
+
+
+def test_error_inesperado_no_aborta():
+    eng = GeocodeEngine(Rota(latency=0), rps=1000, max_workers=4, backoff=0.001)
+    vistos = []
+    res = eng.run(DIRS, on_result=lambda a, r: vistos.append(a))
+    rotas = [a for a in DIRS if a.endswith("0 - 10")]
+    assert eng.stats.failed == len(rotas)
+    # sin reintentos: el error no es transitorio
+    assert eng.stats.retries == 0
+    assert set(res) == set(DIRS) - set(rotas) == set(vistos)
+    # visible en el reporte por tipo de error
+    assert eng.stats.errors == {"ValueError": len(rotas)}
+    assert f"errores=ValueError×{len(rotas)}" in eng.stats.report()
+
+
+class Denegada(FakeProvider):
+    """Cuenta rechazada desde la décima llamada."""
+
+    def __init__(self, **kw):
+        super().__init__(latency=0.001, **kw)
+        self.n = 0
+
+    def geocode(self, address):
+        with self._lock:
+            self.n += 1
+            n = self.n
+        if n > 10:
+            raise FatalGeocodeError("REQUEST_DENIED")
+        return super().geocode(address)
+
+
+def test_error_fatal_aborta():
+    prov = Denegada()
+    eng = GeocodeEngine(prov, rps=1000, max_workers=2)
+    vistos = []
+    with pytest.raises(FatalGeocodeError):
+        eng.run(DIRS * 5, on_result=lambda a, r: vistos.append(a))
+    # las pendientes se cancelan: no se sigue llamando al proveedor
+    assert prov.n <= 10 + eng.max_workers
+    assert len(vistos) <= 10 and eng.stats.failed == 0
+
+
+class _Cliente:
+    def __init__(self, resp):
+        self.resp = resp
+
+    def geocode(self, address, region=None):
+        if isinstance(self.resp, Exception):
+            raise self.resp
+        return self.resp
+
+
+def _google(resp):
+    prov = GoogleProvider(api_key="x")
+    prov._client = lambda: _Cliente(resp)
+    return prov
+
+
+def test_google_errores_api():
+    gexc = pytest.importorskip("googlemaps.exceptions")
+    # ZERO_RESULTS: el cliente devuelve [] → único caso "sin resultado"
+    assert _google([]).geocode("CALLE 1") == EMPTY
+    with pytest.raises(TransientGeocodeError):
+        _google(gexc.ApiError("OVER_QUERY_LIMIT")).geocode("CALLE 1")
+    with pytest.raises(FatalGeocodeError):
+        _google(gexc.ApiError("REQUEST_DENIED", "clave inválida")).geocode("CALLE 1")
+    # INVALID_REQUEST: fallida (None), no vacía → no se cachea como negativo
+    eng = GeocodeEngine(_google(gexc.ApiError("INVALID_REQUEST")), rps=1000)
+    assert eng.run(["CALLE 1"]) == {}
+    assert (eng.stats.failed, eng.stats.empty, eng.stats.retries) == (1, 0, 0)
+    assert eng.stats.errors == {"ApiError": 1}
+
+
+def test_conteos_ok_vacias():
+    prov = FakeProvider(latency=0, miss_rate=0.4)
+    eng = GeocodeEngine(prov, rps=1000, max_workers=4)
+    res = eng.run(DIRS)
+    vacias = sum(r == EMPTY for r in res.values())
+    assert vacias > 0
+    assert eng.stats.empty == vacias
+    assert eng.stats.ok == len(DIRS) - vacias
+    s = eng.stats.summary()
+    assert s["total"] == len(DIRS)
+    assert (s["ok"], s["sin_resultado"], s["fallidas"]) == (
+        len(DIRS) - vacias,
+        vacias,
+        0,
+    )
+    # deterministas dentro del bbox
+    for lat, lon, _ in (r for r in res.values() if r != EMPTY):
+        assert prov.bbox[1] <= lat <= prov.bbox[3]
+        assert prov.bbox[0] <= lon <= prov.bbox[2]
+
+
+def test_percentiles():
+    st = EngineStats()
+    assert st.percentile(50) == 0.0
+    st.latencies = [i / 1000 for i in range(100, 0, -1)]
+    assert st.percentile(0) == 0.001
+    assert st.percentile(100) == 0.1
+    assert st.percentile(50) == pytest.approx(0.051)
+    assert st.percentile(95) == pytest.approx(0.095)
+    s = st.summary()
+    assert (s["p50_ms"], s["p95_ms"], s["p99_ms"]) == (51.0, 95.0, 99.0)
@@ -0,0 +1,50 @@
+import numpy as np
+import pandas as pd
+
+from src.analytics.hotspots_gi import BLOQUE, area_estudio, nivel, p_permutacion, pesos
+from src.transform.agregacion_hex import cell_id
+
+
+def _celdas(n=300, seed=0):
+    rng = np.random.default_rng(seed)
+    i = rng.integers(0, 40, n)
+    j = rng.integers(0, 40, n)
+    ids, i, j = area_estudio(i, j)
+    x = np.zeros(len(ids))
+    x[: len(ids) // 3] = rng.poisson(3, len(ids) // 3)
+    return x, pesos(i, j)
+
+
+def test_p_no_depende_de_jobs():
+    x, w = _celdas()
+    perms = 2 * BLOQUE + 7  # último bloque incompleto
+    p1 = p_permutacion(x, w, permutaciones=perms, jobs=1, seed=7)
+    p3 = p_permutacion(x, w, permutaciones=perms, jobs=3, seed=7)
+    np.testing.assert_array_equal(p1, p3)
+    # la semilla sí cambia los sorteos
+    assert not np.array_equal(p1, p_permutacion(x, w, permutaciones=perms, seed=8))
+
+
+def test_p_en_rango():
+    x, w = _celdas()
+    perms = 99
+    p = p_permutacion(x, w, permutaciones=perms, jobs=1)
+    assert ((p >= 1 / (perms + 1)) & (p <= 1)).all()
+    # celdas sin vecinos: p = 1
+    k = np.asarray(w.sum(axis=1)).ravel()
+    assert (p[k == 0] == 1).all()
+
+
+def test_nivel_detecta_cluster():
+    # bloque de celdas con muchos eventos rodeado de celdas con pocos
+    i, j = (a.ravel() for a in np.meshgrid(np.arange(20), np.arange(20)))
+    score = np.where((abs(i - 10) <= 1) & (abs(j - 10) <= 1), 50, 1)
+    cells = pd.DataFrame({"i": i, "j": j, "score": score})
+    cells["cell_id"] = cell_id(i, j)
+    res = nivel(cells, permutaciones=199, jobs=1)
+    centro = res[(res["i"] == 10) & (res["j"] == 10)].iloc[0]
+    assert centro["clase"] == "caliente 99%"
+    assert centro["lisa"] == "HH"
+    # calientes solo en el bloque y su primer anillo
+    hot = res[res["clase"].str.startswith("caliente")]
+    assert ((hot["i"] - 10).abs() <= 2).all() and ((hot["j"] - 10).abs() <= 2).all()
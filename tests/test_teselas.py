@@ -0,0 +1,82 @@
+import os
+import threading
+import urllib.error
+import urllib.request
+from http.server import ThreadingHTTPServer
+
+import pandas as pd
+import pytest
+
+from src.dashboard import teselas
+
+
+@pytest.fixture
+def semaforos(tmp_path, monkeypatch):
+    raw = tmp_path / "semaforos_raw.parquet"
+    pd.DataFrame({"lon": [-74.08, -74.1], "lat": [4.6, 4.65]}).to_parquet(raw)
+    monkeypatch.setattr(teselas, "RAW_SEM", str(raw))
+    monkeypatch.setattr(teselas, "CACHE_DIR", str(tmp_path / "teselas"))
+    return raw
+
+
+@pytest.fixture
+def servidor(semaforos):
+    fuentes = {c: teselas.Fuente(c) for c in teselas.CAPAS}
+    srv = ThreadingHTTPServer(("127.0.0.1", 0), teselas._handler(fuentes))
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{srv.server_port}"
+    srv.shutdown()
+    srv.server_close()
+
+
+def _get(url):
+    try:
+        with urllib.request.urlopen(url) as r:
+            return r.status, r.read()
+    except urllib.error.HTTPError as e:
+        return e.code, b""
+
+
+def test_poda_huellas_anteriores(semaforos):
+    viejo = f"{teselas.CACHE_DIR}/semaforos-0000000000000000/10/1/1.pbf"
+    otra_capa = f"{teselas.CACHE_DIR}/siniestros-0000000000000000"
+    os.makedirs(os.path.dirname(viejo))
+    os.makedirs(otra_capa)
+    f = teselas.Fuente("semaforos").actual()
+    h1 = f.huella
+    assert not os.path.exists(f"{teselas.CACHE_DIR}/semaforos-0000000000000000")
+    assert os.path.isdir(otra_capa)
+
+    os.makedirs(f"{teselas.CACHE_DIR}/semaforos-{h1}/10")
+    # la fuente cambia → otra huella; la carpeta anterior se borra
+    pd.DataFrame({"lon": [-74.0], "lat": [4.7]}).to_parquet(semaforos)
+    os.utime(semaforos, ns=(1, 1))
+    assert f.actual().huella != h1
+    assert os.listdir(teselas.CACHE_DIR) == [os.path.basename(otra_capa)]
+    assert not os.path.exists(f"{teselas.CACHE_DIR}/semaforos-{h1}")
+
+
+def test_error_al_generar_da_500(servidor, monkeypatch):
+    def falla(*args):
+        raise ValueError("tesela rota")
+
+    monkeypatch.setattr(teselas, "generar", falla)
+    assert _get(f"{servidor}/semaforos/12/1205/1995.pbf")[0] == 500
+    # el servidor sigue respondiendo
+    assert _get(f"{servidor}/nada/1/1/1.pbf")[0] == 404
+
+
+def test_capa_sin_datos_da_404(servidor, monkeypatch):
+    monkeypatch.setattr(teselas, "RAW_SEM", "/no/existe.parquet")
+    assert _get(f"{servidor}/semaforos/12/1205/1995.pbf")[0] == 404
+
+
+def test_tesela_se_guarda(servidor):
+    pytest.importorskip("mapbox_vector_tile")
+    code, data = _get(f"{servidor}/semaforos/12/1205/1995.pbf")
+    assert code == 200 and data
+    (carpeta,) = os.listdir(teselas.CACHE_DIR)
+    assert carpeta.startswith("semaforos-")
+    fn = f"{teselas.CACHE_DIR}/{carpeta}/12/1205/1995.pbf"
+    with open(fn, "rb") as f:
+        assert f.read() == data